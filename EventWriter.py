@@ -0,0 +1,236 @@
+""" EventWriter
+
+The output of an analysis, as a stream of events.
+
+PingState (and the numpy engine) describe what they find as events,
+plain dicts, and hand them to a writer; the writer turns each one into
+text in a single write() on a buffered stream.  The events are
+    up, down           an Up or Down interval has closed: start and end
+                       sequence numbers, and the last timestamp and the
+                       (~seconds) since it; down also has the
+                       explanation and the RTT of the reply that ended it
+    time_check         two timestamps: delta_r records, delta_t seconds
+    unexpected         a line that could not be classified
+    malformed_gwfailure  a gateway failure block that was not well formed
+    summary            the counters and statistics at the end of a run,
+                       with the probes lost, duplicated and reordered
+
+TextWriter writes the analyzer's traditional report; NdjsonWriter writes
+one JSON object per line, ending with the summary.
+
+PingState makes the intervals adjacent: an Up ends one before its last
+reply, which is where the Down after it starts, and a Down ends one
+before the reply that ends it, where the next Up starts.  In Up 0 - 547,
+Down 548 - 549, Up 550 - ... the replies are 0 - 548 and 550 on, and
+549 alone was lost.  So interval_pings() counts a Down as end - start,
+the probes lost, and an Up as end - start + 2, its replies, and the
+pings of the intervals add up to the probes of the span they cover; at
+a ping a second duration_s is the same number.  The end of an Up is its
+timestamp plus the seconds since it, and the end of a Down a second
+less (interval_end_seconds()).  The '[ n ]' of the text report is, as
+it always has been, end - start - 1.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Events to a text or an NDJSON writer, in place of the
+#                print statements.
+# 2026-10-18 [x] One count convention for the intervals,
+#                interval_pings(), and a duration_s in NDJSON.
+# 2026-10-18 [x] Count a Down as the probes lost, and an Up as its
+#                replies, so that the intervals add up to their span.
+#
+
+import json
+import sys
+
+import TimeStamp as ts
+
+def interval_pings(event):
+    """The probes of an up or down event: a Down's lost, an Up's
+    replies."""
+    if event['event'] == 'down':
+        return event['end'] - event['start']
+    return event['end'] - event['start'] + 2
+
+def interval_end_seconds(event):
+    """The seconds from the timestamp of an up or down event to the
+    end of its interval."""
+    if event['event'] == 'down':
+        return event['plus'] - 1
+    return event['plus']
+
+class EventWriter(object):
+    """EventWriter - base class: write events to a stream."""
+    def __init__(self, stream=None):
+        if stream is None:
+            stream = sys.stdout
+        self.stream = stream
+
+    def emit(self, event):
+        """Write one event."""
+        self.stream.write(self.format(event))
+
+    def format(self, event):
+        """The text for an event."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Push out whatever is buffered."""
+        self.stream.flush()
+
+class TextWriter(EventWriter):
+    """TextWriter - the traditional human readable report."""
+    def format(self, event):
+        kind = event['event']
+        if kind == 'down' or kind == 'up':
+            # [ n ] is the traditional count, not interval_pings()
+            (start, end) = (event['start'], event['end'])
+            if kind == 'down':
+                text = "Down: " + str(start) + " - " + str(end) + "[ " +\
+                        str(end - start - 1) + " ]\n"
+                explanation = event['explanation']
+                if explanation == "RTTTooLong":
+                    explanation += " RTT: " + str(event['rtt'])
+                text += "   explanation: " + explanation + "\n"
+            else:
+                text = "Up:   " + str(start) + " - " + str(end) + " [ " +\
+                        str(end - start - 1) + " ]\n"
+            if event['timestamp'] is not None:
+                text += "   current['time']: " + str(event['timestamp']) +\
+                        "\n   plus (~seconds): " + str(event['plus']) + "\n"
+            return text
+        if kind == 'time_check':
+            return "# time check: delta_r: " + str(event['delta_r']) +\
+                    " delta_t: " + str(event['delta_t']) + "\n"
+        if kind == 'unexpected':
+            # as print "linenumber: ", n and print "Unexpected: '", line, "'"
+            linenumber = str(event['linenumber'])
+            line = event['line']
+            return "linenumber:  " + linenumber + "\n" +\
+                    "Unexpected: ' " + line + " '\n" +\
+                    "Failed to classify:\n" +\
+                    "   kind: " + event['kind'] + "\n" +\
+                    "   linecount: " + linenumber + "\n" +\
+                    "   line: '" + line + "'\n"
+        if kind == 'malformed_gwfailure':
+            return "handle_gateway_failure(): linenumber: " +\
+                    str(event['linenumber']) + "\n"
+        if kind == 'summary':
+            return self.format_summary(event)
+        return json.dumps(event) + "\n"
+
+    def format_summary(self, event):
+        """The end of run summary."""
+        lines = ["linecount " + str(event['linecount'])]
+        for (name, count) in event['counters']:
+            lines.append(name + ": " + str(count))
+        lines.append("sequence_number: " + str(event['sequence_number']))
+        lines.append("sequence_offset: " + str(event['sequence_offset']))
+        lines.append("normal_ping_count: " +\
+                str(event['normal_ping_count']))
+        sequence = event.get('sequence')
+        if sequence is not None:
+            lines.append("Sequence (window " + str(sequence['window']) +\
+                    "): received " + str(sequence['received']) +\
+                    " lost " + str(sequence['lost']) +\
+                    " duplicates " + str(sequence['duplicates']) +\
+                    " reordered " + str(sequence['reordered']) +\
+                    " stale " + str(sequence['stale']) +\
+                    " restarts " + str(sequence['restarts']) +\
+                    " gaps " + str(sequence['gaps']))
+        lines.append("Mean: " + str(event['mean']))
+        lines.append("Mean RTT (two ways): " + str(event['rtt_mean']))
+        lines.append("Variance: " + str(event['variance']))
+        lines.append("Variance RTT (two ways): " +\
+                str(event['rtt_variance']))
+        lines.append("Percentiles RTT " + str(event['percents']) + ": " +\
+                str(event['rtt_percentiles']))
+        lines.append("rtt_stats: " + json.dumps(event['rtt_stats'],\
+                indent=2, separators=(',', ': ')))
+        adaptive = event.get('adaptive')
+        if adaptive is not None:
+            lines.append("Adaptive threshold: " + str(adaptive['factor']) +\
+                    " x median of " + str(adaptive['window']) +\
+                    " replies (fixed " + str(adaptive['fixed']) + ")")
+            lines.append("   threshold at the end: " +\
+                    str(adaptive['threshold']))
+            lines.append("   window: " + str(adaptive['window_n']) +\
+                    " replies, median " + str(adaptive['window_median']) +\
+                    " mean " + str(adaptive['window_mean']))
+            lines.append("   RTTTooLong only by the adaptive threshold: " +\
+                    str(adaptive['too_long']))
+            lines.append("   Normal only by the adaptive threshold: " +\
+                    str(adaptive['normal']))
+        lines.append("checksum: " + str(event['checksum']))
+        return "\n".join(lines) + "\n"
+
+class NdjsonWriter(EventWriter):
+    """NdjsonWriter - one JSON object per event, one per line.
+
+    Interval events also get pings, interval_pings(), and duration_s,
+    the seconds those take at a ping a second, and when there has been
+    a timestamp start_time and end_time, duration_s apart.
+    """
+    def format(self, event):
+        if event['event'] in ('up', 'down'):
+            event = dict(event)
+            event['pings'] = interval_pings(event)
+            event['duration_s'] = event['pings']
+            if event['timestamp'] is not None:
+                end_us = ts.TimeStamp(event['timestamp']).get_epoch_us() +\
+                        interval_end_seconds(event) * 1000000
+                event['end_time'] = ts.format_epoch_us(end_us)
+                event['start_time'] = ts.format_epoch_us(end_us -\
+                        event['duration_s'] * 1000000)
+        elif event['event'] == 'summary':
+            event = dict(event)
+            event['counters'] = dict(event['counters'])
+        return json.dumps(event, sort_keys=True) + "\n"
+
+# --format choices
+WRITERS = {
+    'text': TextWriter,
+    'ndjson': NdjsonWriter,
+    }
+
+def main():
+    """Main routine - just for testing."""
+    events = [
+        {'event': 'down', 'start': 100, 'end': 130,\
+                'explanation': 'RTTTooLong', 'rtt': 23.5,\
+                'timestamp': '2017-12-28T23:59:00.000000', 'plus': 12},
+        {'event': 'up', 'start': 131, 'end': 200, 'timestamp': None,\
+                'plus': 0},
+        {'event': 'time_check', 'delta_r': 64, 'delta_t': 64.02},
+        {'event': 'unexpected', 'linenumber': 7, 'kind': 'Unexpected',\
+                'line': 'what is this?'},
+        ]
+    for name in sorted(WRITERS):
+        print name + ":"
+        writer = WRITERS[name]()
+        for event in events:
+            writer.emit(event)
+        writer.flush()
+
+    # Replies 0 - 548, 549 lost, replies 550 - 600, 601 - 610 lost and
+    # a reply at 611, as PingState reports them: the pings add up to
+    # the probes 0 - 610, and each interval starts as the last ends
+    intervals = [
+        {'event': 'up', 'start': 0, 'end': 547, 'plus': 549},
+        {'event': 'down', 'start': 548, 'end': 549, 'plus': 551},
+        {'event': 'up', 'start': 550, 'end': 599, 'plus': 601},
+        {'event': 'down', 'start': 600, 'end': 610, 'plus': 612},
+        ]
+    ends = [interval_end_seconds(event) for event in intervals]
+    print "pings: " + str([interval_pings(event) for event in intervals]) +\
+            " total " + str(sum(interval_pings(event) for event in\
+            intervals)) + " span " + str(intervals[-1]['end'] -\
+            intervals[0]['start'] + 1)
+    print "adjacent: " + str(all(end - interval_pings(event) == previous\
+            for (event, end, previous) in zip(intervals, ends, [0] + ends)))
+
+if __name__ == '__main__':
+    main()
@@ -8,59 +8,273 @@ to look three lines ahead in order to handle certain ill-formed
 error reports.
 """
 
+import collections
 import datetime as datetime
 import json
+import mmap
+import os
+import re
 import sys
+import time
+
+import LogSegments
 
 #
 # Roadmap
 #
 # 2017-09-10 [X] Make sure that we do the right thing on EOF
 #                Done 2017-10-29
+# 2026-10-18 [X] Replace the list with a deque and refill it from large
+#                block reads instead of one readline() per line.
+# 2026-10-18 [X] MappedLineQueue for scanning a regular file in place.
+# 2026-10-18 [X] MappedLineQueue over a byte range, for chunked analysis.
+# 2026-10-18 [X] read_all() for consumers that want the whole input.
+# 2026-10-18 [X] FollowLineQueue for following a log as it is written.
+# 2026-10-18 [X] Read a log rotated into (compressed) segments as one.
 #
 
+# Splits a block into lines, keeping the newline the way readline() does.
+line_re = re.compile(r'[^\n]*\n')
 
 class LineQueue(object):
-    """LineQueue - buffer for a file descriptor that supports pushback."""
-    def __init__(self, maxDepth=4, filename="stdin"):
+    """LineQueue - buffer for a file descriptor that supports pushback.
+
+    Lines come back exactly as readline() would return them, newline
+    included, and get_line() returns "" forever once the input is
+    exhausted.  Internally the input is read a block at a time and
+    split into lines in bulk.  max_depth is the minimum lookahead that
+    fill_queue() guarantees.  A reader that needs to look further
+    ahead, as handle_gateway_failure() does when timestamps land inside
+    a block, takes lines with get_line() and returns them with
+    push_back(), both O(1) on the deque, so the lookahead is not
+    limited by the depth.  A log that has been rotated into segments
+    (see LogSegments) is read as one stream.
+    """
+    def __init__(self, maxDepth=4, filename="stdin", blockSize=1 << 16):
         self.max_depth = maxDepth
+        self.block_size = blockSize
         self.filename = filename
         self.timestamp = datetime.datetime.isoformat(\
                 datetime.datetime.today())
-        self.version = "1.0"
+        self.version = "1.1"
+        self.segments = 0
         if filename == 'stdin':
             self.file_descriptor = sys.stdin
+        elif LogSegments.is_segmented(filename):
+            self.file_descriptor = LogSegments.SegmentReader(filename)
+            self.segments = len(self.file_descriptor.files)
         else:
             self.file_descriptor = open(filename, 'r')
-        self.line_queue = []
+        # os.read() returns whatever is available, so a live pipe is
+        # not held up waiting for a whole block to arrive.
+        self.fd = None
+        if not self.segments:
+            self.fd = self.file_descriptor.fileno()
+        self.line_queue = collections.deque()
+        self.partial = ""
+        self.eof = False
         self.fill_queue()
 
     def signature(self):
-        result = "# LineQueue.py version 1.0\n"
+        result = "# LineQueue.py version " + self.version + "\n"
         result += "# LineQueue.py self.filename: " + self.filename + "\n"
         result += "# LineQueue.py self.timestamp: " + self.timestamp + "\n"
+        if self.segments:
+            result += "# LineQueue.py self.segments: " +\
+                    str(self.segments) + "\n"
         return result
 
+    def read_bytes(self, size):
+        """Read up to size bytes of the input; "" at the end."""
+        if self.fd is None:
+            return self.file_descriptor.read(size)
+        return os.read(self.fd, size)
+
     def get_line(self):
         """Get a line from self.line_queue."""
-        result = ""
-        if self.line_queue:
-            result = self.line_queue.pop(0)
+        try:
+            return self.line_queue.popleft()
+        except IndexError:
             self.fill_queue()
-        return result
+            if self.line_queue:
+                return self.line_queue.popleft()
+            return ""
+
+    def read_block(self):
+        """Read one block and move the complete lines onto the queue."""
+        block = self.read_bytes(self.block_size)
+        if not block:
+            self.eof = True
+            if self.partial:
+                # last line of the file has no newline
+                self.line_queue.append(self.partial)
+                self.partial = ""
+            return
+        data = self.partial + block
+        end = data.rfind("\n") + 1
+        if end:
+            self.line_queue.extend(line_re.findall(data, 0, end))
+        self.partial = data[end:]
 
     def fill_queue(self):
         """Fill the queue as needed."""
-        while len(self.line_queue) < self.max_depth:
-            line = self.file_descriptor.readline()
-            self.line_queue.append(line)
+        while len(self.line_queue) < self.max_depth and not self.eof:
+            self.read_block()
 
     def push_back(self, line):
         """Push a line back on the line_queue."""
-        self.line_queue.insert(0, line)
+        self.line_queue.appendleft(line)
+
+    def read_all(self):
+        """Consume everything that is left as a single string."""
+        blocks = list(self.line_queue)
+        self.line_queue.clear()
+        blocks.append(self.partial)
+        self.partial = ""
+        while not self.eof:
+            block = self.read_bytes(self.block_size)
+            if not block:
+                self.eof = True
+            blocks.append(block)
+        return "".join(blocks)
 
     def __str__(self):
-        return json.dumps(self.line_queue, indent=2, separators=(',', ': '))
+        return json.dumps(list(self.line_queue),\
+                indent=2, separators=(',', ': '))
+
+
+class MappedLineQueue(object):
+    """MappedLineQueue - a LineQueue over a memory mapped regular file.
+
+    Supports the same get_line() / push_back() / signature() calls, and
+    also exposes the map (mm) and the current byte offset (pos) so that
+    a scanner can match records directly against the mapped bytes and
+    only ask for a line when it needs one.  start and end restrict it to
+    a byte range of the file, which must begin at the start of a line.
+    """
+    def __init__(self, filename, start=0, end=None):
+        self.filename = filename
+        self.timestamp = datetime.datetime.isoformat(\
+                datetime.datetime.today())
+        self.version = "1.1"
+        self.file_descriptor = open(filename, 'rb')
+        self.mm = mmap.mmap(self.file_descriptor.fileno(), 0,\
+                access=mmap.ACCESS_READ)
+        if end is None:
+            end = len(self.mm)
+        self.size = end
+        self.pos = start
+        self.pushed = []
+
+    def signature(self):
+        result = "# LineQueue.py MappedLineQueue version " +\
+                self.version + "\n"
+        result += "# LineQueue.py self.filename: " + self.filename + "\n"
+        result += "# LineQueue.py self.timestamp: " + self.timestamp + "\n"
+        return result
+
+    def get_line(self):
+        """Get the next line, newline included, or "" at EOF."""
+        if self.pushed:
+            return self.pushed.pop()
+        pos = self.pos
+        if pos >= self.size:
+            return ""
+        end = self.mm.find("\n", pos, self.size) + 1
+        if not end:
+            end = self.size
+        self.pos = end
+        return self.mm[pos:end]
+
+    def push_back(self, line):
+        """Push a line back so that get_line() returns it next."""
+        self.pushed.append(line)
+
+
+class FollowLineQueue(LineQueue):
+    """FollowLineQueue - a LineQueue that follows a growing file.
+
+    Like tail -F: at the end of the file get_line() waits for more to be
+    written instead of returning "", and it only ever returns complete
+    lines.  If the name comes to refer to a different file (the log was
+    rotated) the rest of the old file is read first and then the new one
+    from its start; if the file shrinks (it was truncated in place) it
+    is read again from the start.  While waiting it calls idle(), if
+    given, and sleeps interval seconds at a time, so following a quiet
+    log costs next to no CPU.  Ctrl-C while waiting ends the input.
+    """
+    def __init__(self, filename, interval=0.5, idle=None,\
+            maxDepth=4, blockSize=1 << 16):
+        self.interval = interval
+        self.idle = idle
+        self.rotations = 0
+        LineQueue.__init__(self, maxDepth, filename, blockSize)
+
+    def read_block(self):
+        """Read one block and move the complete lines onto the queue.
+        Returns False if nothing new has been written."""
+        block = os.read(self.fd, self.block_size)
+        if not block:
+            return self.check_file()
+        data = self.partial + block
+        end = data.rfind("\n") + 1
+        if end:
+            self.line_queue.extend(line_re.findall(data, 0, end))
+        self.partial = data[end:]
+        return True
+
+    def check_file(self):
+        """At the end of the file: reopen it if it has been rotated, or
+        rewind it if it has been truncated.  Returns True if so."""
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            # between the rename and the creation of the new log
+            return False
+        current = os.fstat(self.fd)
+        if (stat.st_dev, stat.st_ino) != (current.st_dev, current.st_ino):
+            if self.partial:
+                # the old log ended without a newline
+                self.line_queue.append(self.partial)
+                self.partial = ""
+            self.file_descriptor.close()
+            self.file_descriptor = open(self.filename, 'r')
+            self.fd = self.file_descriptor.fileno()
+            self.rotations += 1
+            return True
+        if current.st_size < os.lseek(self.fd, 0, os.SEEK_CUR):
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            self.partial = ""
+            self.rotations += 1
+            return True
+        return False
+
+    def fill_queue(self):
+        """Queue what has been written so far, up to max_depth lines."""
+        while len(self.line_queue) < self.max_depth and not self.eof and\
+                self.read_block():
+            pass
+
+    def wait(self):
+        """Wait for more of the log to be written."""
+        if self.idle is not None:
+            self.idle()
+        try:
+            time.sleep(self.interval)
+        except KeyboardInterrupt:
+            self.eof = True
+
+    def get_line(self):
+        """Get a line, waiting for one if need be.  Returns "" only once
+        the input has been ended with Ctrl-C."""
+        while not self.line_queue and not self.eof:
+            self.fill_queue()
+            if not self.line_queue:
+                self.wait()
+        if self.line_queue:
+            return self.line_queue.popleft()
+        return ""
+
 
 
 def main():
@@ -90,6 +304,12 @@ def main():
     print "line_queue after pushbacks:"
     print str(line_queue)
 
+    # push back more lines than the depth
+    lines = [line_queue.get_line() for j in range(6)]
+    for line in reversed(lines):
+        line_queue.push_back(line)
+    print "pushed back 6, queued: " + str(len(line_queue.line_queue))
+
     # now read to the end of the file
     line = line_queue.get_line()
     while line:
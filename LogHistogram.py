@@ -0,0 +1,261 @@
+""" LogHistogram
+
+A log-linear histogram of reals, such as RTTs, in fixed memory: the
+shape of the distribution and its percentiles, for however many values,
+to a chosen number of significant digits.
+
+"""
+
+# This is the bucketing of HdrHistogram (Gil Tene,
+# http://hdrhistogram.org).  Values are counted in integer units (by
+# default 0.001, a microsecond of RTT in ms).  Up to 2 * half - 1 units
+# each value has a counter of its own; above that each doubling of the
+# value has half counters, of equal width.  With half the power of two
+# at or above 10 ** digits, every counter covers less than 10 ** -digits
+# of its values, so a percentile taken as the middle of its counter is
+# within half that of a value in it.  Values above highest are counted
+# as highest, and values below zero as zero; the minimum and maximum
+# are kept exactly.  The counters are a dict of the ones in use, so a
+# minute of RTTs costs a few dozen of them, and never more than size.
+#
+# Recording a value is a bit_length() and a shift.  Two histograms with
+# the same digits, unit and highest merge exactly, by adding counters,
+# so a day is the merge of its hours whichever order they come in.
+# to_dict() writes the counters as a base64 string of varints, a run of
+# empty counters as one negative number, which for a minute of pings is
+# a few dozen bytes.
+#
+# Roadmap
+#
+# 2026-10-18 [x] Log-linear histogram with record, merge, percentiles
+#                and a compact serialization, for SequenceStats and the
+#                rollups.
+#
+
+import TimeStamp as ts
+
+import base64
+import math
+import numpy as np
+import psutil
+import random
+
+class LogHistogram(object):
+    """Log-linear histogram with fixed memory."""
+    def __init__(self, digits=2, unit=0.001, highest=60000.0):
+        self.digits = int(digits)
+        self.unit = float(unit)
+        self.highest = float(highest)
+        self.half = 1 << int(math.ceil(math.log(10 ** self.digits, 2)))
+        self.magnitude = self.half.bit_length() - 1
+        self.top = int(self.highest / self.unit)
+        self.size = self.index(self.top) + 1
+        self.counts = {}
+        self.n = 0
+        self.minimum = None
+        self.maximum = None
+
+    def index(self, units):
+        """The counter of a value in units (an int, 0 - top)."""
+        shift = units.bit_length() - self.magnitude - 1
+        if shift <= 0:
+            return units
+        return (shift << self.magnitude) + (units >> shift)
+
+    def bounds(self, index):
+        """The lowest value of a counter, and its width, in units."""
+        shift = (index >> self.magnitude) - 1
+        if shift <= 0:
+            return (index, 1)
+        return ((index - (shift << self.magnitude)) << shift, 1 << shift)
+
+    def record(self, value):
+        """Count a value."""
+        units = int(value / self.unit)
+        if units < 0:
+            units = 0
+        elif units > self.top:
+            units = self.top
+        shift = units.bit_length() - self.magnitude - 1
+        if shift > 0:
+            units = (shift << self.magnitude) + (units >> shift)
+        counts = self.counts
+        counts[units] = counts.get(units, 0) + 1
+        self.n += 1
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def record_many(self, values):
+        """Count a sequence (or numpy array) of values in one go."""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        units = np.clip(values / self.unit, 0, self.top).astype(np.int64)
+        # frexp's exponent is the bit length, exactly, below 2 ** 53
+        shift = np.maximum(np.frexp(units)[1] - self.magnitude - 1, 0)
+        (indices, added) = np.unique((shift << self.magnitude) +\
+                (units >> shift), return_counts=True)
+        counts = self.counts
+        for (index, count) in zip(indices.tolist(), added.tolist()):
+            counts[index] = counts.get(index, 0) + count
+        self.n += len(values)
+        self.note_range(float(np.min(values)), float(np.max(values)))
+
+    def note_range(self, minimum, maximum):
+        """Widen the minimum and maximum to take in another range."""
+        if self.minimum is None or minimum < self.minimum:
+            self.minimum = minimum
+        if self.maximum is None or maximum > self.maximum:
+            self.maximum = maximum
+
+    def merge(self, other):
+        """Fold another LogHistogram, of the same shape, into this one."""
+        if (other.digits, other.unit, other.highest) !=\
+                (self.digits, self.unit, self.highest):
+            raise ValueError("can not merge a LogHistogram of digits " +\
+                    str(other.digits) + ", unit " + str(other.unit) +\
+                    ", highest " + str(other.highest) + " into one of " +\
+                    str(self.digits) + ", " + str(self.unit) + ", " +\
+                    str(self.highest))
+        if not other.n:
+            return
+        counts = self.counts
+        for (index, count) in other.counts.iteritems():
+            counts[index] = counts.get(index, 0) + count
+        self.n += other.n
+        self.note_range(other.minimum, other.maximum)
+
+    def quantiles(self, fractions):
+        """Estimate the values at a list of quantiles (0.0 - 1.0)."""
+        if not self.n:
+            return [None for q in fractions]
+        indices = sorted(self.counts)
+        cumulative = np.cumsum([self.counts[index] for index in indices])
+        result = []
+        for q in fractions:
+            rank = max(int(math.ceil(q * self.n)), 1)
+            index = indices[min(int(np.searchsorted(cumulative, rank)),\
+                    len(indices) - 1)]
+            (lowest, width) = self.bounds(index)
+            value = (lowest + width / 2.0) * self.unit
+            result.append(min(max(value, self.minimum), self.maximum))
+        return result
+
+    def percentiles(self, percents):
+        """Estimate the values at a list of percentiles (0 - 100)."""
+        return self.quantiles([p / 100.0 for p in percents])
+
+    def to_dict(self):
+        """The histogram as a dict of plain values, for JSON."""
+        encoded = bytearray()
+        following = 0
+        for index in sorted(self.counts):
+            if index > following:
+                append_varint(encoded, 2 * (index - following) - 1)
+            append_varint(encoded, 2 * self.counts[index])
+            following = index + 1
+        return {
+                'digits': self.digits,
+                'unit': self.unit,
+                'highest': self.highest,
+                'n': self.n,
+                'min': self.minimum,
+                'max': self.maximum,
+                'counts': base64.b64encode(str(encoded))
+                }
+
+    def __str__(self):
+        return "LogHistogram(digits=" + str(self.digits) + ", n=" +\
+                str(self.n) + ", counters=" + str(self.size) +\
+                ", used=" + str(len(self.counts)) + ")"
+
+def append_varint(encoded, value):
+    """Append a non-negative int to a bytearray, 7 bits a byte."""
+    while value >= 0x80:
+        encoded.append(value & 0x7f | 0x80)
+        value >>= 7
+    encoded.append(value)
+
+def from_dict(record):
+    """The LogHistogram that to_dict() made a dict of."""
+    histogram = LogHistogram(record['digits'], record['unit'],\
+            record['highest'])
+    counts = histogram.counts
+    index = 0
+    value = 0
+    shift = 0
+    for byte in bytearray(base64.b64decode(record['counts'])):
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte & 0x80:
+            continue
+        if value & 1:
+            index += (value + 1) >> 1
+        else:
+            counts[index] = value >> 1
+            index += 1
+        value = 0
+        shift = 0
+    histogram.n = record['n']
+    histogram.minimum = record['min']
+    histogram.maximum = record['max']
+    return histogram
+
+def main():
+    """Main routine - just for testing."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# LogHistogram.py"
+    print "# LogHistogram.py: start: timestamp: " + ts0.get_timestamp()
+
+    # RTT-like data: a floor, an exponential body and a long tail
+    generator = random.Random(42)
+    data = [20 + generator.expovariate(1 / 5.0) for j in range(1000000)]
+    data += [generator.uniform(300, 2000) for j in range(2000)]
+    percents = [50, 90, 99, 99.9]
+    exact = list(np.percentile(data, percents, interpolation='higher'))
+
+    histogram = LogHistogram(2)
+    for value in data:
+        histogram.record(value)
+    print str(histogram)
+    print "histogram percentiles: " + str(histogram.percentiles(percents))
+    print "exact percentiles:     " + str(exact)
+    print "relative errors: " + str([abs(h - e) / e for (h, e) in\
+            zip(histogram.percentiles(percents), exact)])
+
+    # Merged halves, one recorded in bulk, are the same histogram
+    left = LogHistogram(2)
+    left.record_many(data[:500000])
+    right = LogHistogram(2)
+    for value in data[500000:]:
+        right.record(value)
+    left.merge(right)
+    print "merged == whole: " + str(left.counts == histogram.counts)
+
+    # and survive a round trip through their serialization
+    record = histogram.to_dict()
+    print "serialized: " + str(len(record['counts'])) + " characters"
+    again = from_dict(record)
+    print "round trip == whole: " + str(again.counts == histogram.counts)
+    try:
+        histogram.merge(LogHistogram(3))
+    except ValueError as error:
+        print "merging another shape: " + str(error)
+
+    cputime_1 = psutil.Process().cpu_times()
+    print
+    ts1 = ts.TimeStamp()
+    print "# LogHistogram.py: end: timestamp: " + ts1.get_timestamp()
+    print "# LogHistogram.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# LogHistogram.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
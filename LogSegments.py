@@ -0,0 +1,223 @@
+""" LogSegments
+
+A ping log that is rotated into segments as it is written, and read
+back as one continuous stream.
+
+The segments of <host>.ping.log are <host>.ping.log.0000, .0001, ... in
+the order they were written.  The writer starts a new segment when the
+current one reaches max_bytes, or when the hour changes, and compresses
+the finished one in the background with gzip (or zstd), so that only
+the segment being written is ever uncompressed.  The reader returns the
+bytes of all of the segments, compressed or not, one after another,
+decompressing as it goes; an unrotated <host>.ping.log comes first if
+there is one.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Rotation by size or by the hour, background compression
+#                and a streaming reader over the segments.
+#
+
+import distutils.spawn
+import gzip
+import os
+import re
+import subprocess
+import time
+
+# Compressors, by name: (file suffix, command that compresses a file in
+# place, command that writes a compressed file to stdout)
+COMPRESSORS = {
+    'gzip': ('.gz', ['gzip', '-q'], None),
+    'zstd': ('.zst', ['zstd', '-q', '--rm'], ['zstd', '-dcq']),
+}
+
+# <base>.NNNN, optionally compressed
+segment_re = re.compile(r'\.(\d+)(\.gz|\.zst)?$')
+
+def available_compressor(name):
+    """The compressor to use for name: zstd falls back to gzip when the
+    zstd program is not installed, and 'none' means None."""
+    if name == 'none':
+        return None
+    if name == 'zstd' and distutils.spawn.find_executable('zstd') is None:
+        return 'gzip'
+    return name
+
+def segment_files(base):
+    """The files of the log base, in order: base itself if it exists,
+    then its segments.  Where a segment is there both compressed and
+    not (it is being compressed), the uncompressed one is used."""
+    directory = os.path.dirname(base) or "."
+    name = os.path.basename(base)
+    segments = {}
+    for entry in os.listdir(directory):
+        if not entry.startswith(name):
+            continue
+        match = segment_re.match(entry, len(name))
+        if match is None:
+            continue
+        number = int(match.group(1))
+        if number not in segments or not match.group(2):
+            segments[number] = os.path.join(directory, entry)
+    result = [segments[number] for number in sorted(segments)]
+    if os.path.isfile(base):
+        result.insert(0, base)
+    return result
+
+def is_segmented(base):
+    """Whether the log base has been rotated into segments."""
+    files = segment_files(base)
+    return len(files) > 1 or (len(files) == 1 and files[0] != base)
+
+class SegmentWriter(object):
+    """SegmentWriter - a log file that rotates itself into segments.
+
+    Writes are buffered; a segment only ever ends with a complete line,
+    as long as each write() ends with one.
+    """
+    def __init__(self, base, max_bytes=0, hourly=False, compressor='gzip',\
+            buffering=1 << 16):
+        self.base = base
+        self.max_bytes = max_bytes
+        self.hourly = hourly
+        self.compressor = available_compressor(compressor)
+        self.buffering = buffering
+        self.compressing = []
+        self.segments = 0
+        # carry on after the segments of an earlier run
+        existing = segment_files(base)
+        self.number = 0
+        if existing and existing[-1] != base:
+            self.number = int(segment_re.search(existing[-1]).group(1)) + 1
+        self.open_segment()
+
+    def segment_name(self):
+        """The name of the current segment."""
+        return self.base + "." + str(self.number).zfill(4)
+
+    def open_segment(self):
+        """Start a new segment."""
+        self.file_descriptor = open(self.segment_name(), 'a', self.buffering)
+        self.size = self.file_descriptor.tell()
+        self.hour = int(time.time() // 3600)
+        self.segments += 1
+
+    def rotate(self):
+        """Close the current segment, compress it, and start the next."""
+        self.file_descriptor.close()
+        if self.compressor is not None:
+            command = COMPRESSORS[self.compressor][1]
+            self.compressing.append(subprocess.Popen(command +\
+                    [self.segment_name()]))
+        self.number += 1
+        self.open_segment()
+        self.reap()
+
+    def write(self, text):
+        """Append text, starting a new segment first if it is time."""
+        if self.size and ((self.max_bytes and\
+                self.size + len(text) > self.max_bytes) or\
+                (self.hourly and int(time.time() // 3600) != self.hour)):
+            self.rotate()
+        self.file_descriptor.write(text)
+        self.size += len(text)
+
+    def flush(self):
+        """Write out what has been buffered."""
+        self.file_descriptor.flush()
+        self.reap()
+
+    def reap(self):
+        """Collect the compressors that have finished."""
+        self.compressing = [process for process in self.compressing\
+                if process.poll() is None]
+
+    def close(self, wait=True):
+        """Close the current segment (it is left uncompressed) and, if
+        wait, let the compressors finish."""
+        self.file_descriptor.close()
+        if wait:
+            for process in self.compressing:
+                process.wait()
+            self.compressing = []
+
+class SegmentReader(object):
+    """SegmentReader - read the segments of a log as one stream."""
+    def __init__(self, base):
+        self.base = base
+        self.files = segment_files(base)
+        self.index = 0
+        self.current = None
+        self.process = None
+
+    def open_next(self):
+        """Open the next segment.  Returns False after the last one."""
+        if self.index >= len(self.files):
+            return False
+        path = self.files[self.index]
+        self.index += 1
+        if path.endswith(COMPRESSORS['gzip'][0]):
+            self.current = gzip.GzipFile(path, 'rb')
+        elif path.endswith(COMPRESSORS['zstd'][0]):
+            self.process = subprocess.Popen(COMPRESSORS['zstd'][2] + [path],\
+                    stdout=subprocess.PIPE)
+            self.current = self.process.stdout
+        else:
+            self.current = open(path, 'rb')
+        return True
+
+    def close_current(self):
+        """Close the segment being read."""
+        self.current.close()
+        self.current = None
+        if self.process is not None:
+            self.process.wait()
+            self.process = None
+
+    def read(self, size):
+        """Read up to size bytes; "" only at the end of the last segment."""
+        while True:
+            if self.current is None and not self.open_next():
+                return ""
+            if self.process is not None:
+                block = os.read(self.current.fileno(), size)
+            else:
+                block = self.current.read(size)
+            if block:
+                return block
+            self.close_current()
+
+    def close(self):
+        """Close whatever is open."""
+        if self.current is not None:
+            self.close_current()
+        self.index = len(self.files)
+
+def main():
+    """Main routine - just for testing."""
+    import tempfile
+    base = os.path.join(tempfile.mkdtemp(), "test.ping.log")
+    writer = SegmentWriter(base, max_bytes=100)
+    for j in range(20):
+        writer.write("64 bytes from 10.0.0.1: icmp_seq=" + str(j) + "\n")
+    writer.close()
+    print "segments: " + str(writer.segments)
+    for path in segment_files(base):
+        print "   " + os.path.basename(path)
+    reader = SegmentReader(base)
+    lines = []
+    block = reader.read(37)
+    while block:
+        lines.append(block)
+        block = reader.read(37)
+    lines = "".join(lines).splitlines()
+    print "lines read back: " + str(len(lines))
+    print "first: " + lines[0]
+    print "last: " + lines[-1]
+
+if __name__ == '__main__':
+    main()
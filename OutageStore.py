@@ -0,0 +1,363 @@
+""" OutageStore
+
+A store, one per host, of the Up and Down intervals analyze_pings.py
+finds, so that a report over weeks or months reads a small file instead
+of analyzing every raw log again.
+
+An interval is its start and end, in epoch microseconds, and its
+explanation (UP for an Up interval).  The times are estimated from the
+last timestamp before the end, at a ping a second, as the NDJSON output
+does.  The intervals are kept sorted and disjoint, and those of a new
+analysis replace the stored ones in the span they cover.  The outages
+have prefix sums of their durations and an ordering by duration, so
+    downtime(start, end)        two binary searches
+    downtime_by(period)         two per hour, day or month
+    overlapping(start, end)     two binary searches
+    longest(n)                  a slice
+    histogram(edges)            a binary search per edge
+    mtbf_mttr(start, end)       the prefix sums of Up and Down time
+and none of them rescans the intervals.  The store of a host is the
+file <directory>/<host>.outages, laid out as PingColumns' cache is.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Keep the intervals of each host in a sorted store with
+#                indexed queries, for the monthly SLA reports.
+# 2026-10-18 [x] An outage is as long as the probes it lost, and the
+#                self-test checks that against analyze_pings' report.
+#
+
+import cStringIO
+import datetime as datetime
+import numpy as np
+import os
+import psutil
+import re
+import sys
+import tempfile
+
+import EventWriter
+import PingColumns
+import TimeStamp as ts
+
+STORE_MAGIC = "PINGOUT1"
+STORE_VERSION = 1
+STORE_SUFFIX = ".outages"
+
+# The explanation code of an Up interval
+UP = -1
+
+HOUR_US = 3600 * 1000000
+DAY_US = 24 * HOUR_US
+PERIODS = ['hour', 'day', 'month']
+
+class OutageStore(object):
+    """The intervals of one host, with the indexes for the queries."""
+    def __init__(self, host):
+        self.host = host
+        # explanation codes index names
+        self.names = []
+        empty = np.zeros(0, dtype=np.int64)
+        self.set_intervals(empty, empty, np.zeros(0, dtype=np.int8))
+
+    def set_intervals(self, start_us, end_us, explanation):
+        """Hold these intervals, sorted and disjoint, and index them."""
+        order = np.argsort(start_us, kind='mergesort')
+        start_us = start_us[order]
+        end_us = end_us[order]
+        explanation = explanation[order]
+        if len(start_us):
+            # The estimates may overlap by a second or so: no interval
+            # starts before the ones before it have ended.
+            start_us = np.maximum(start_us, np.maximum.accumulate(\
+                    np.concatenate(([start_us[0]], end_us[:-1]))))
+        keep = end_us > start_us
+        self.start_us = start_us[keep]
+        self.end_us = end_us[keep]
+        self.explanation = explanation[keep]
+
+        down = self.explanation != UP
+        self.down_start = self.start_us[down]
+        self.down_end = self.end_us[down]
+        self.down_explanation = self.explanation[down]
+        self.duration = self.down_end - self.down_start
+        self.down_total = np.concatenate(([0], np.cumsum(self.duration)))
+        self.by_duration = np.argsort(self.duration, kind='mergesort')
+        self.sorted_duration = self.duration[self.by_duration]
+        self.up_start = self.start_us[~down]
+        self.up_end = self.end_us[~down]
+        self.up_total = np.concatenate(([0],\
+                np.cumsum(self.up_end - self.up_start)))
+
+    def code(self, name):
+        """The explanation code of name (None for Up)."""
+        if name is None:
+            return UP
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+    def add(self, start_us, end_us, explanations):
+        """Put in the intervals of an analysis, explanations being names
+        (None for Up), in place of the stored ones in the span they
+        cover."""
+        if not len(start_us):
+            return
+        codes = np.array([self.code(name) for name in explanations],\
+                dtype=np.int8)
+        keep = (self.end_us <= np.min(start_us)) |\
+                (self.start_us >= np.max(end_us))
+        self.set_intervals(\
+                np.concatenate((self.start_us[keep], start_us)),\
+                np.concatenate((self.end_us[keep], end_us)),\
+                np.concatenate((self.explanation[keep], codes)))
+
+    def span(self, start_us=None, end_us=None):
+        """A window, by default all of the store."""
+        if start_us is None:
+            start_us = int(self.start_us[0]) if len(self.start_us) else 0
+        if end_us is None:
+            end_us = int(self.end_us[-1]) if len(self.end_us) else 0
+        return (start_us, end_us)
+
+    def downtime_before(self, at):
+        """The Down time before each of the times at (an array)."""
+        return cumulative(self.down_start, self.down_end,\
+                self.down_total, at)
+
+    def downtime(self, start_us=None, end_us=None):
+        """Total Down time in a window, in microseconds."""
+        (before, after) = self.downtime_before(\
+                np.array(self.span(start_us, end_us), dtype=np.int64))
+        return int(after - before)
+
+    def downtime_by(self, period, start_us=None, end_us=None):
+        """Down time in each hour, day or month of a window (the first
+        and last cut to it).  Returns (starts, downtime): arrays of the
+        start of each and the Down time in it, in microseconds."""
+        (start_us, end_us) = self.span(start_us, end_us)
+        edges = np.clip(period_edges(period, start_us, end_us), start_us,\
+                max(start_us, end_us))
+        return (edges[:-1], np.diff(self.downtime_before(edges)))
+
+    def outages(self, indices):
+        """The outages at indices, as (start_us, end_us, explanation)."""
+        return [(int(self.down_start[j]), int(self.down_end[j]),\
+                self.names[self.down_explanation[j]]) for j in indices]
+
+    def overlapping(self, start_us, end_us):
+        """The outages that overlap a window, in time order."""
+        first = np.searchsorted(self.down_end, start_us, side='right')
+        last = np.searchsorted(self.down_start, end_us, side='left')
+        return self.outages(range(first, max(first, last)))
+
+    def longest(self, n):
+        """The n longest outages, longest first."""
+        return self.outages(self.by_duration[::-1][:n].tolist())
+
+    def histogram(self, edges_us):
+        """The number of outages lasting from each edge (microseconds)
+        up to the next."""
+        return np.diff(np.searchsorted(self.sorted_duration, edges_us))
+
+    def mtbf_mttr(self, start_us=None, end_us=None):
+        """Mean time between failures (Up time per outage) and mean
+        time to repair (Down time per outage) in a window, in
+        microseconds, or (None, None) if there are no outages in it."""
+        at = np.array(self.span(start_us, end_us), dtype=np.int64)
+        count = np.searchsorted(self.down_start, at[1]) -\
+                np.searchsorted(self.down_end, at[0], side='right')
+        if count <= 0:
+            return (None, None)
+        up = np.diff(cumulative(self.up_start, self.up_end, self.up_total,\
+                at))[0]
+        down = np.diff(self.downtime_before(at))[0]
+        return (up / float(count), down / float(count))
+
+    def save(self, path):
+        """Write the store to path."""
+        header = {
+                'version': STORE_VERSION,
+                'host': self.host,
+                'names': self.names,
+                'intervals': len(self.start_us)
+                }
+        PingColumns.write_arrays(path, STORE_MAGIC, header, [\
+                ('start_us', self.start_us, '<i8'),\
+                ('end_us', self.end_us, '<i8'),\
+                ('explanation', self.explanation, '<i1')])
+
+def cumulative(starts, ends, totals, at):
+    """The time in sorted disjoint intervals (totals being the prefix
+    sums of their lengths) before each of the times at."""
+    started = np.searchsorted(starts, at, side='right')
+    # the last interval started may not be over
+    unfinished = np.maximum(ends[np.maximum(started - 1, 0)] - at, 0) if\
+            len(ends) else 0
+    return totals[started] - np.where(started > 0, unfinished, 0)
+
+def period_edges(period, start_us, end_us):
+    """The starts of the hours, days or months from the one that holds
+    start_us to the one after the one that holds end_us."""
+    if period == 'month':
+        day = datetime.date.fromordinal(ts.EPOCH_ORDINAL +\
+                int(start_us // DAY_US))
+        last = datetime.date.fromordinal(ts.EPOCH_ORDINAL +\
+                int(max(end_us - 1, start_us) // DAY_US))
+        months = range(day.year * 12 + day.month - 1,\
+                last.year * 12 + last.month + 1)
+        years = np.array([m // 12 for m in months])
+        return ts.days_from_civil(years,\
+                np.array([m % 12 + 1 for m in months]), 1) * DAY_US
+    unit = HOUR_US if period == 'hour' else DAY_US
+    first = start_us // unit * unit
+    last = max(end_us - 1, start_us) // unit * unit + unit
+    return np.arange(first, last + 1, unit, dtype=np.int64)
+
+def store_path(directory, host):
+    """The store file of a host."""
+    return os.path.join(directory, host + STORE_SUFFIX)
+
+def load_store(path, host):
+    """The store in path, or an empty one for host if there is none.
+    Returns (store, status)."""
+    (header, arrays, status) = PingColumns.read_arrays(path, STORE_MAGIC,\
+            STORE_VERSION, None)
+    store = OutageStore(host)
+    if header is not None:
+        store.names = header['names']
+        store.set_intervals(arrays['start_us'], arrays['end_us'],\
+                arrays['explanation'])
+    return (store, status)
+
+class IntervalCollector(object):
+    """A writer for PingState that keeps the up and down events for an
+    OutageStore, and passes every event on to another writer."""
+    def __init__(self, writer):
+        self.writer = writer
+        # (timestamp, seconds from it to the end, pings, explanation) of
+        # each interval, as EventWriter.interval_end_seconds() and
+        # interval_pings() have them
+        self.intervals = []
+
+    def emit(self, event):
+        """Keep an interval, and write the event."""
+        if event['event'] in ('up', 'down') and\
+                event['timestamp'] is not None:
+            self.intervals.append((event['timestamp'],\
+                    EventWriter.interval_end_seconds(event),\
+                    EventWriter.interval_pings(event),\
+                    event.get('explanation')))
+        self.writer.emit(event)
+
+    def flush(self):
+        """Flush the writer."""
+        self.writer.flush()
+
+    def arrays(self):
+        """(start_us, end_us, explanations) of the intervals."""
+        if not self.intervals:
+            empty = np.zeros(0, dtype=np.int64)
+            return (empty, empty, [])
+        (timestamps, seconds, pings, explanations) = zip(*self.intervals)
+        # many intervals share a timestamp: parse each once
+        (unique, which) = np.unique(timestamps, return_inverse=True)
+        end_us = ts.parse_many(unique.tolist())[which] +\
+                np.array(seconds, dtype=np.int64) * 1000000
+        start_us = end_us - np.array(pings, dtype=np.int64) * 1000000
+        return (start_us, end_us, list(explanations))
+
+def main():
+    """Main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# OutageStore.py"
+    print "# OutageStore.py: start: timestamp: " + ts0.get_timestamp()
+
+    # A day or so of Up and Down in turn, checked against plain loops
+    np.random.seed(1)
+    first = ts.TimeStamp("2026-01-31T12:00:00").get_epoch_us()
+    bounds = first + np.cumsum(np.random.exponential(600, 201).astype(\
+            np.int64) * 1000000)
+    (start_us, end_us) = (bounds[:-1], bounds[1:])
+    explanations = [None if j % 2 else "Timeout" for j in range(200)]
+    store = OutageStore("example.com")
+    store.add(start_us, end_us, explanations)
+    down = [(s, e) for (s, e, x) in zip(start_us, end_us, explanations) if x]
+    (a, b) = (first + DAY_US // 3, first + DAY_US // 2)
+    expected = sum(max(0, min(e, b) - max(s, a)) for (s, e) in down)
+    print "downtime: " + str(store.downtime(a, b)) + " loops: " +\
+            str(expected)
+    print "overlapping: " + str(len(store.overlapping(a, b))) +\
+            " loops: " + str(sum(1 for (s, e) in down if e > a and s < b))
+    (starts, downtime) = store.downtime_by('day')
+    print "by day: " + str([(ts.format_epoch_us(s)[:10], d // 1000000)\
+            for (s, d) in zip(starts.tolist(), downtime.tolist())])
+    (starts, downtime) = store.downtime_by('month')
+    print "by month: " + str([(ts.format_epoch_us(s)[:7], d // 1000000)\
+            for (s, d) in zip(starts.tolist(), downtime.tolist())])
+    print "total: " + str(store.downtime() // 1000000) + " S"
+    print "longest: " + str([(e - s) // 1000000 for (s, e, x) in\
+            store.longest(3)])
+    print "histogram (0, 1, 10, 60 minutes): " + str(store.histogram(\
+            np.array([0, 60, 600, 3600]) * 1000000).tolist())
+    (mtbf, mttr) = store.mtbf_mttr()
+    print "MTBF: " + str(mtbf / 1e6) + " S MTTR: " + str(mttr / 1e6) + " S"
+
+    # Analyzing a later log replaces the intervals in its span
+    store.add(np.array([end_us[-1] - 1000000]), np.array([end_us[-1] +\
+            60000000]), ["GWFailure"])
+    print "after an overlapping add: " + str(len(store.start_us)) +\
+            " intervals, last " + str(store.outages([-1]))
+
+    # The store of a log (the one named, else a synthetic one) has the
+    # downtime of the Down intervals of analyze_pings' text report.  The
+    # synthetic log has one timestamp, at the start: a timestamp in the
+    # middle of an outage puts the estimates around it a second or so
+    # out, and the store takes out the overlaps.
+    import analyze_pings as ap
+    from LineQueue import MappedLineQueue
+    import PingState as ps
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        import generate_pings
+        (handle, path) = tempfile.mkstemp(suffix='.ping.log')
+        with os.fdopen(handle, 'w') as out:
+            generate_pings.generate(out, 50000, interval=100000,\
+                    outage_rate=20.0)
+    report = cStringIO.StringIO()
+    collector = IntervalCollector(EventWriter.TextWriter(report))
+    state = ps.PingState(writer=collector)
+    state.consume(ap.new_dialect(ap.sniff_dialect(path)).scan_mapped(\
+            MappedLineQueue(path), 250))
+    if len(sys.argv) <= 1:
+        os.remove(path)
+    store = OutageStore("log")
+    store.add(*collector.arrays())
+    down = [int(end) - int(start) for (start, end) in\
+            re.findall(r"^Down: (\d+) - (\d+)", report.getvalue(), re.M)]
+    print "log: " + str(len(down)) + " outages, " + str(sum(down)) +\
+            " probes lost; store: " + str(len(store.down_start)) +\
+            " outages, " + str(store.downtime() // 1000000) + " S"
+    print "log outages == store outages: " + str(sorted(down) ==\
+            sorted(((store.down_end - store.down_start) //\
+            1000000).tolist()))
+
+    cputime_1 = psutil.Process().cpu_times()
+    print
+    ts1 = ts.TimeStamp()
+    print "# OutageStore.py: end: timestamp: " + ts1.get_timestamp()
+    print "# OutageStore.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# OutageStore.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
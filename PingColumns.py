@@ -0,0 +1,887 @@
+""" PingColumns
+
+Vectorized analysis engine for analyze_pings.py.
+
+The log is first parsed into columnar numpy arrays, one entry per
+record (kind code, sequence number, rtt, ttl, line number and the
+index of the nearest preceding timestamp record).  Everything that
+PingState works out one record at a time is then computed with array
+operations: the 65536 rollover is unwrapped with a cumulative sum,
+late and duplicate replies are found by sorting, the Up/Down intervals
+are found with np.diff / np.flatnonzero over the state-changing records
+(and the silent gaps), and the RTT statistics are array reductions.
+
+Only the rare lines (comments, timestamps, multi-line error reports)
+and the output itself are handled in Python.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Columnar parse and vectorized state machine, reporting
+#                through PingState.report().
+# 2026-10-18 [x] Binary columnar cache of a parsed log (<log>.pcol),
+#                written by convert_pings.py.
+# 2026-10-18 [x] Timestamp index (<log>.tsidx) for time window queries.
+# 2026-10-18 [x] SequenceTracker's unwrapping, late and duplicate
+#                replies and silent gaps, as array operations.
+# 2026-10-18 [x] The kinds and PingState from PingState.py, so that they
+#                are the analyzer's own when it runs as a script.
+#
+
+import analyze_pings as ap
+import PingState as ps
+import SequenceStats as ss
+from SequenceTracker import SequenceTracker
+import TimeStamp as ts
+
+import hashlib
+import itertools
+import json
+import mmap
+import numpy as np
+import os
+import re
+import struct
+
+# One match per line.  The groups are:
+#   1 - 4: ip, icmp_seq, ttl and time of a reply line
+#   5:     icmp_seq of a timeout line
+#   6:     any other line, left to classify()
+# The first two only match where classify() would produce exactly the
+# same record.
+line_re = re.compile(r'^(?:64 bytes from (\d+\.\d+\.\d+\.\d+): ' +\
+        r'icmp_seq=(\d+) ttl=(\d+) time=(-?\d+\.?\d*) ms[^\n]*' +\
+        r'|Request timeout for icmp_seq (\d+)[^\S\n]*' +\
+        r'|([^\n]*))$', re.M)
+
+# Kind code for a line not yet classified
+OTHER = -1
+
+# The buffer is parsed in pieces of about this many bytes, to bound the
+# memory used by the intermediate lists of strings.
+PIECE_SIZE = 1 << 24
+
+SENDTO_KINDS = {
+        "ping: sendto: Network is down": ps.DOWN,
+        "ping: sendto: No route to host": ps.ROUTE
+        }
+
+def parse_piece(piece, threshold):
+    """Parse one piece of a log, a whole number of lines, into per line
+    columns.  Returns (kind, seq, ttl, rtt, others), where others maps
+    the index of each line that is neither a reply nor a timeout to its
+    text."""
+    matches = line_re.findall(piece)
+    if piece.endswith("\n"):
+        # the empty match after the last newline is not a line
+        matches.pop()
+    count = len(matches)
+    kind = np.full(count, OTHER, dtype=np.int8)
+    seq = np.full(count, -1, dtype=np.int64)
+    ttl = np.full(count, -1, dtype=np.int32)
+    rtt = np.full(count, -1.0, dtype=np.float64)
+    if not count:
+        return (kind, seq, ttl, rtt, {})
+    (ips, seqs, ttls, times, timeouts, texts) = zip(*matches)
+
+    seqs = np.array(seqs)
+    reply = seqs != ""
+    seq[reply] = seqs[reply].astype(np.int64)
+    ttl[reply] = np.array(ttls)[reply].astype(np.int32)
+    rtt[reply] = np.array(times)[reply].astype(np.float64)
+    kind[reply] = ps.NORMAL
+    kind[reply & (rtt > threshold)] = ps.RTTTOOLONG
+    kind[reply & (rtt < 0)] = ps.NEGATIVERTT
+
+    timeouts = np.array(timeouts)
+    timeout = timeouts != ""
+    seq[timeout] = timeouts[timeout].astype(np.int64)
+    kind[timeout] = ps.TIMEOUT
+
+    others = {}
+    for i in np.flatnonzero(kind == OTHER).tolist():
+        others[i] = texts[i]
+    return (kind, seq, ttl, rtt, others)
+
+def nearest_timestamps(kind):
+    """Index of the last Timestamp record at or before each record."""
+    return np.maximum.accumulate(\
+            np.where(kind == ps.TIMESTAMP, np.arange(len(kind)), -1))
+
+def reclassify(kind, rtt, threshold):
+    """Reclassify the reply records (in place) for a new threshold."""
+    reply = (kind == ps.NORMAL) | (kind == ps.RTTTOOLONG) |\
+            (kind == ps.NEGATIVERTT)
+    kind[reply] = ps.NORMAL
+    kind[reply & (rtt > threshold)] = ps.RTTTOOLONG
+    kind[reply & (rtt < 0)] = ps.NEGATIVERTT
+
+def parse_columns(buf, threshold):
+    """Parse a log (a str or an mmap) into columns, one entry per record.
+
+    Returns a dict of numpy arrays 'kind', 'seq', 'ttl', 'rtt', 'line'
+    (line number in the log) and 'timestamp' (index of the last
+    Timestamp record at or before each record, or -1), plus 'text', a
+    dict from record index to the text of each Timestamp, Unexpected
+    and malformed GWFailure record.  The records are exactly those
+    that classify() produces reading the log line by line.
+    """
+    kinds = []
+    seqs = []
+    ttls = []
+    rtts = []
+    others = {}
+    size = len(buf)
+    pos = 0
+    base = 0
+    while pos < size:
+        end = size
+        if pos + PIECE_SIZE < size:
+            end = buf.rfind("\n", pos, pos + PIECE_SIZE) + 1
+            if not end:
+                end = buf.find("\n", pos + PIECE_SIZE) + 1 or size
+        (kind, seq, ttl, rtt, piece_others) = \
+                parse_piece(buf[pos:end], threshold)
+        kinds.append(kind)
+        seqs.append(seq)
+        ttls.append(ttl)
+        rtts.append(rtt)
+        for (i, text) in piece_others.iteritems():
+            others[base + i] = text
+        base += len(kind)
+        pos = end
+    if kinds:
+        kind = np.concatenate(kinds)
+        seq = np.concatenate(seqs)
+        ttl = np.concatenate(ttls)
+        rtt = np.concatenate(rtts)
+    else:
+        kind = np.zeros(0, dtype=np.int8)
+        seq = np.zeros(0, dtype=np.int64)
+        ttl = np.zeros(0, dtype=np.int32)
+        rtt = np.zeros(0, dtype=np.float64)
+    lines = len(kind)
+
+    # Now the other lines, in order.  This is where the multi-line
+    # reports are put together, the way read_block() does it for
+    # handle_expected_timeout() and handle_gateway_failure(): lines they
+    # swallow are dropped, and the timestamps pushed back from inside a
+    # block are moved to just after it.
+    keep = np.ones(lines, dtype=bool)
+    moved = {}
+    line_text = {}
+
+    def raw(j):
+        """Text of line j, "" past the end, None for a reply/timeout."""
+        if j >= lines:
+            return ""
+        return others.get(j)
+
+    def is_timestamp(j):
+        text = raw(j)
+        return bool(text) and ap.recognize_timestamp(text)
+
+    for i in sorted(others):
+        if not keep[i]:
+            continue
+        line = others[i].strip()
+        if line in SENDTO_KINDS:
+            # the sequence number is on the timeout line that follows
+            kind[i] = SENDTO_KINDS[line]
+            # timestamps in between stay where they are, ahead of the
+            # line after the timeout
+            cursor = i + 1
+            while is_timestamp(cursor):
+                cursor += 1
+            if cursor < lines:
+                keep[cursor] = False
+            second = raw(cursor)
+            if second is None:
+                if kind[cursor] != ps.TIMEOUT:
+                    raise ValueError("line " + str(cursor + 1) +\
+                            ": expected a 'Request timeout' line")
+                seq[i] = seq[cursor]
+            else:
+                (junk, sequence_number) = second.split("icmp_seq ")
+                seq[i] = int(sequence_number)
+        elif line.startswith("92 bytes from "):
+            kind[i] = ps.GWFAILURE
+            block = []
+            stamps = []
+            cursor = i + 1
+            while len(block) < 3 and cursor < lines:
+                if is_timestamp(cursor):
+                    stamps.append(cursor)
+                else:
+                    block.append(cursor)
+                cursor += 1
+            header = raw(block[0]) if block else ""
+            if header is None or header.strip() != ap.GATEWAY_HEADER:
+                line_text[i] = line
+            keep[i + 1:cursor] = False
+            for j in stamps:
+                keep[j] = True
+                moved[j] = cursor - 0.5
+        else:
+            record = ap.classify(None, line, 0, threshold)
+            (kind[i], seq[i], ttl[i], rtt[i]) = record[0:4]
+            if record[0] == ps.TIMESTAMP or record[0] == ps.UNEXPECTED:
+                line_text[i] = record[5]
+
+    order = np.flatnonzero(keep)
+    if moved:
+        keys = order.astype(np.float64)
+        positions = np.searchsorted(order, sorted(moved))
+        keys[positions] = [moved[j] for j in sorted(moved)]
+        order = order[np.argsort(keys, kind='mergesort')]
+    record_of_line = np.empty(lines, dtype=np.int64)
+    record_of_line[order] = np.arange(len(order))
+
+    columns = {}
+    columns['kind'] = kind[order]
+    columns['seq'] = seq[order]
+    columns['ttl'] = ttl[order]
+    columns['rtt'] = rtt[order]
+    columns['line'] = order + 1
+    columns['timestamp'] = nearest_timestamps(columns['kind'])
+    columns['text'] = {}
+    for (j, text) in line_text.iteritems():
+        columns['text'][int(record_of_line[j])] = text
+    return columns
+
+def track_sequence(kind, seq, window=ps.SEQUENCE_WINDOW):
+    """Follow the sequence numbers through the records, as PingState's
+    SequenceTracker does.
+
+    Returns (fresh, sequence_number, sequence_offset, tracker): which
+    records are not late or duplicate replies, the unwrapped sequence
+    number as of each record (that of the last fresh Normal) and its
+    offset, and a SequenceTracker left as PingState's would be.
+    """
+    count = len(kind)
+    index = np.arange(count)
+    replies = np.flatnonzero(np.array(ps.IS_REPLY)[kind])
+    fresh = np.ones(count, dtype=bool)
+    unwrapped = np.full(count, -1, dtype=np.int64)
+    tracker = SequenceTracker(window)
+    if len(replies):
+        raw = seq[replies]
+        # Each reply is unwrapped to the number nearest the one before,
+        # except that a new ping (a header between two replies) carries
+        # on after the highest so far.
+        step = (np.diff(raw) + tracker.half) % tracker.modulus -\
+                tracker.half
+        started = np.cumsum(kind == ps.INITIALIZATION)[replies]
+        restarts = (np.flatnonzero(started[1:] != started[:-1]) + 1).tolist()
+        u = np.empty(len(replies), dtype=np.int64)
+        highest = int(raw[0]) - 1
+        for (a, b) in zip([0] + restarts, restarts + [len(replies)]):
+            u[a] = raw[0] if a == 0 else highest + 1
+            u[a + 1:b] = u[a] + np.cumsum(step[a:b - 1])
+            highest = max(highest, int(u[a:b].max()))
+
+        # new, stale, duplicate or reordered, as SequenceTracker.add()
+        prev_max = np.maximum.accumulate(np.concatenate(([u[0] - 1],\
+                u[:-1])))
+        is_new = u > prev_max
+        base = int(u[0])
+        stale = ~is_new & ((u <= prev_max - window) | (u < base))
+        order = np.argsort(u, kind='mergesort')
+        repeat = np.empty(len(u), dtype=bool)
+        repeat[order] = np.concatenate(([False],\
+                u[order][1:] == u[order][:-1]))
+        duplicate = ~is_new & ~stale & repeat
+        answered = ~stale & ~duplicate
+        fresh[replies] = is_new
+        unwrapped[replies] = u
+
+        tracker.base = base
+        tracker.highest = highest
+        tracker.last = int(u[-1])
+        tracker.last_raw = int(raw[-1])
+        tracker.restarting = \
+                bool(np.sum(kind == ps.INITIALIZATION) > started[-1])
+        seen = np.zeros(window, dtype=np.uint8)
+        seen[u[answered & (u > highest - window)] % window] = 1
+        tracker.seen = bytearray(seen.tostring())
+        tracker.received = int(np.sum(answered))
+        tracker.duplicates = int(np.sum(duplicate))
+        tracker.reordered = int(np.sum(answered & ~is_new))
+        tracker.stale = int(np.sum(stale))
+        tracker.restarts = len(restarts)
+        tracker.lost = highest - base + 1 - tracker.received -\
+                tracker.pending()
+
+    normal = (kind == ps.NORMAL) & fresh
+    last_normal = np.maximum.accumulate(np.where(normal, index, -1))
+    known = last_normal >= 0
+    last_normal = np.maximum(last_normal, 0)
+    sequence_number = np.where(known, unwrapped[last_normal], -1)
+    sequence_offset = np.where(known, (unwrapped - seq)[last_normal], 0)
+    return (fresh, sequence_number, sequence_offset, tracker)
+
+def state_points(kind, fresh, sequence_number):
+    """The points at which the network state is set: the fresh Normal
+    and down records, and a Down before each Normal that is more than
+    one past the Normal before it (a silent gap).
+
+    Returns (record, up, point_sequence, gap): for each point the record
+    it is at (a gap is at the Normal that ends it), whether the network
+    is Up after it, the sequence number as of it, and whether it is a
+    gap.
+    """
+    is_normal = kind == ps.NORMAL
+    state_index = np.flatnonzero(fresh &\
+            (is_normal | np.array(ps.IS_DOWN)[kind]))
+    up = is_normal[state_index]
+    point_sequence = sequence_number[state_index]
+    jumps = np.flatnonzero(up[1:] & up[:-1] &\
+            (point_sequence[1:] > point_sequence[:-1] + 1)) + 1
+    record = np.insert(state_index, jumps, state_index[jumps])
+    gap = np.insert(np.zeros(len(up), dtype=bool), jumps, True)
+    point_sequence = np.insert(point_sequence, jumps,\
+            point_sequence[jumps - 1])
+    up = np.insert(up, jumps, False)
+    return (record, up, point_sequence, gap)
+
+def analyze_columns(columns, sketch_k=0, writer=None, histogram_digits=0):
+    """Run the analysis over parsed columns.
+
+    Writes the same interval and diagnostic events, in the same order, as
+    PingState.consume() (to writer, by default a TextWriter on stdout),
+    and returns a PingState holding the results, ready for report().
+    The RTT moments are array reductions, so the Welford mean and
+    variance agree with the record engine to within floating point
+    rounding.
+    """
+    kind = columns['kind']
+    seq = columns['seq']
+    rtt = columns['rtt']
+    text = columns['text']
+    nearest_timestamp = columns['timestamp']
+    count = len(kind)
+    (fresh, sequence_number, sequence_offset, tracker) = \
+            track_sequence(kind, seq)
+
+    # Up/Down segmentation over the state points
+    (point_record, up, point_sequence, gap) = \
+            state_points(kind, fresh, sequence_number)
+    changes = np.flatnonzero(np.diff(up.astype(np.int8))) + 1
+    run_starts = np.concatenate(([0], changes)).astype(np.int64)
+
+    # Events, as (record, order within record, type, detail).  At a gap
+    # the Up interval it ends comes before the gap's own Down.
+    events = []
+    for (c, first) in zip(changes.tolist(), run_starts[:-1].tolist()):
+        events.append((int(point_record[c]), 1 if gap[c] else 2,\
+                'interval', (first, c)))
+    for r in np.flatnonzero(kind == ps.UNEXPECTED).tolist():
+        events.append((r, 0, 'unexpected', None))
+    for r in np.flatnonzero(kind == ps.GWFAILURE).tolist():
+        if r in text:
+            events.append((r, 0, 'gateway', None))
+    timestamps = np.flatnonzero(kind == ps.TIMESTAMP).tolist()
+    # Seconds between timestamps, the way TimeStamp.minus_small() does it
+    (seconds, microseconds) = np.divmod(\
+            ts.parse_many([text[t] for t in timestamps]), 1000000)
+    delta_t = ((seconds[1:] - seconds[:-1]) +\
+            (microseconds[1:] - microseconds[:-1]) / 1000000.0).tolist()
+    for (previous, r, delta) in zip(timestamps, timestamps[1:], delta_t):
+        events.append((r, 0, 'time check', (previous, delta)))
+    events.sort()
+
+    # The results go in a PingState for reporting
+    state = ps.PingState(sketch_k, writer=writer,\
+            histogram_digits=histogram_digits)
+    emit = state.writer.emit
+    for (r, junk, event, detail) in events:
+        if event == 'interval':
+            (first, c) = detail
+            start = int(point_sequence[first])
+            end = int(point_sequence[c]) - 1
+            interval = {'start': start, 'end': end, 'timestamp': None,\
+                    'plus': 0}
+            t = int(nearest_timestamp[r])
+            if t >= 0:
+                interval['timestamp'] = text[t]
+                interval['plus'] = \
+                        int(point_sequence[c] - sequence_number[t])
+            if up[c]:
+                interval['event'] = 'down'
+                if gap[c - 1]:
+                    interval['explanation'] = "Gap"
+                else:
+                    interval['explanation'] = \
+                            ps.CLASSIFICATIONS[kind[point_record[c - 1]]]
+                interval['rtt'] = float(rtt[r])
+            else:
+                interval['event'] = 'up'
+            emit(interval)
+        elif event == 'time check':
+            (previous, delta_t) = detail
+            delta_r = int(sequence_number[r] - sequence_number[previous])
+            emit({'event': 'time_check', 'delta_r': delta_r,\
+                    'delta_t': delta_t})
+        elif event == 'unexpected':
+            emit({'event': 'unexpected', 'linenumber': r + 1,\
+                    'kind': ps.CLASSIFICATIONS[ps.UNEXPECTED],\
+                    'line': text[r]})
+        else:
+            emit({'event': 'malformed_gwfailure', 'linenumber': r + 1})
+
+    state.linecount = count
+    counters = np.bincount(kind, minlength=len(ps.CLASSIFICATIONS)).tolist()
+    # PingState counts an Unexpected record twice
+    counters[ps.UNEXPECTED] *= 2
+    state.counters = counters
+    if count:
+        state.sequence_number = int(sequence_number[-1])
+        state.sequence_offset = int(sequence_offset[-1])
+    state.tracker = tracker
+    tracker.gaps = int(np.sum(gap))
+    if len(point_record):
+        last_run = run_starts[-1]
+        if up[-1]:
+            state.network_state = "Up"
+            state.up_start = int(point_sequence[last_run])
+            state.up_end = state.sequence_number
+        else:
+            state.network_state = "Down"
+            state.down_start = int(point_sequence[last_run])
+            state.down_end = state.sequence_number
+            state.explanation = ps.CLASSIFICATIONS[kind[point_record[-1]]]
+    if timestamps:
+        t = timestamps[-1]
+        state.current['time'] = text[t]
+        state.current['timestamp'] = ts.TimeStamp(text[t])
+        state.current['sequence'] = int(sequence_number[t])
+        state.current['linenumber'] = t + 1
+
+    rtts = rtt[(kind == ps.NORMAL) & fresh]
+    state.normal_ping_count = len(rtts)
+    if len(rtts):
+        # PingState starts the stats over (counting the first value
+        # twice) after any zero RTT
+        resets = np.flatnonzero(np.concatenate(([True], rtts[:-1] == 0.0)))
+        last_reset = resets[-1]
+        state.rtt_stats = ss.SequenceStats(float(rtts[last_reset]),\
+                sketch_k > 0 or histogram_digits > 0, sketch_k,\
+                histogram_digits)
+        state.rtt_stats.accumulate_array(rtts[last_reset:])
+        state.zrtt = float(rtts[-1])
+        legacy_moments(state, rtts.tolist(), set(resets.tolist()))
+    return state
+
+def legacy_moments(state, rtts, resets):
+    """Replay PingState's own running mean and variance over the RTTs.
+
+    These are defined by a sequential recurrence, with no array form,
+    so this is the one per-record loop left in the engine.
+    """
+    current_mean = state.current['mean']
+    previous_mean = state.previous['mean']
+    current_variance = state.current['variance']
+    previous_variance = state.previous['variance']
+    previous_rtt = state.previous['rtt']
+    n = 0
+    for (j, zrtt) in enumerate(rtts):
+        if j in resets:
+            current_mean = zrtt
+        n += 1
+        if previous_rtt > 0.0:
+            temp = current_mean
+            current_mean += (zrtt - previous_mean) / float(n)
+            previous_mean = temp
+        previous_rtt = zrtt
+        temp = current_variance
+        current_variance = ((n - 1) * previous_variance +\
+                (zrtt - previous_mean) * (zrtt - current_mean)) / n
+        previous_variance = temp
+    state.current['mean'] = current_mean
+    state.previous['mean'] = previous_mean
+    state.current['variance'] = current_variance
+    state.previous['variance'] = previous_variance
+    state.previous['rtt'] = previous_rtt
+    state.current['rtt'] = previous_rtt
+
+def column_records(columns):
+    """Generate the records held in columns, as classify() makes them,
+    for PingState.consume()."""
+    text = columns['text']
+    records = itertools.izip(columns['kind'].tolist(),\
+            columns['seq'].tolist(), columns['ttl'].tolist(),\
+            columns['rtt'].tolist())
+    for (r, (kind, seq, ttl, rtt)) in enumerate(records):
+        yield (kind, seq, ttl, rtt, None, text.get(r))
+
+# The columnar cache
+#
+# convert_pings.py saves the parsed columns of a log next to it, as
+# <log>.pcol, so that analyzing the same log again (with a different
+# threshold, say) does not parse the text again.  The file is
+#   8 bytes   CACHE_MAGIC
+#   8 bytes   length of the header, little endian
+#   header    JSON: the source log's size, mtime and md5, the record
+#             count, and the dtype, offset and length of each column
+#   columns   raw arrays, each starting on an 8 byte boundary
+# All replies are stored as Normal; reclassify() applies the threshold
+# when the cache is loaded.  RTTs are stored as float32 when rounding
+# back to the number of decimals ping printed recovers every one of
+# them exactly, which it does for ordinary logs, else as float64.
+
+CACHE_MAGIC = "PINGCOL1"
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".pcol"
+CACHE_ALIGN = 8
+
+def align(offset):
+    """Round an offset up to the next CACHE_ALIGN boundary."""
+    return (offset + CACHE_ALIGN - 1) // CACHE_ALIGN * CACHE_ALIGN
+
+def file_md5(path):
+    """md5 of a whole file."""
+    md5 = hashlib.md5()
+    source = open(path, 'rb')
+    block = source.read(1 << 20)
+    while block:
+        md5.update(block)
+        block = source.read(1 << 20)
+    source.close()
+    return md5.hexdigest()
+
+def rtt_decimals(rtt):
+    """The fewest decimal places that recover every RTT from float32,
+    or None if there are none."""
+    narrow = rtt.astype(np.float32).astype(np.float64)
+    for places in range(7):
+        if np.array_equal(np.round(narrow, places), rtt):
+            return places
+    return None
+
+def source_header(source):
+    """What a cache records about its log: size, mtime and md5."""
+    stat = os.stat(source)
+    return {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'md5': file_md5(source)
+            }
+
+def write_arrays(path, magic, header, arrays):
+    """Write a header dict and a list of (name, array, dtype) in the
+    layout above.  The column layout is added to the header."""
+    header['columns'] = {}
+    offset = 0
+    for j in range(len(arrays)):
+        (name, array, dtype) = arrays[j]
+        array = np.ascontiguousarray(array, dtype=dtype)
+        header['columns'][name] = [dtype, offset, len(array)]
+        offset = align(offset + array.nbytes)
+        arrays[j] = array
+    header = json.dumps(header, sort_keys=True)
+
+    # Write then rename, so that a reader never sees half a file.
+    temp_path = path + ".tmp"
+    out = open(temp_path, 'wb')
+    out.write(magic + struct.pack('<Q', len(header)) + header)
+    out.write("\0" * (align(out.tell()) - out.tell()))
+    for array in arrays:
+        out.write(array.tostring())
+        out.write("\0" * (align(array.nbytes) - array.nbytes))
+    out.close()
+    os.rename(temp_path, path)
+
+def source_status(header, version, source):
+    """Is a header fresh for the log source?  Returns (fresh, status).
+    The md5 is only checked if the mtime has changed.  A file that is
+    not made from a log (source None) need only be of the version."""
+    if header.get('version') != version:
+        return (False, "old version, ignored")
+    if source is None:
+        return (True, "loaded")
+    stat = os.stat(source)
+    recorded = header['source']
+    if recorded['size'] != stat.st_size:
+        return (False, "stale, ignored")
+    if recorded['mtime'] == stat.st_mtime:
+        return (True, "fresh")
+    if recorded['md5'] == file_md5(source):
+        return (True, "fresh (same contents, new mtime)")
+    return (False, "stale, ignored")
+
+def read_arrays(path, magic, version, source):
+    """Read a file written by write_arrays() for the log source.
+
+    Returns (header, arrays, status), arrays being a dict from name to
+    numpy array, or (None, None, status) if there is no fresh file.
+    """
+    try:
+        in_file = open(path, 'rb')
+    except IOError:
+        return (None, None, "none")
+    try:
+        mm = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (mmap.error, ValueError):
+        in_file.close()
+        return (None, None, "unreadable, ignored")
+    in_file.close()
+    try:
+        if mm[0:len(magic)] != magic:
+            return (None, None, "not the right kind of file, ignored")
+        start = len(magic) + 8
+        (length,) = struct.unpack('<Q', mm[len(magic):start])
+        header = json.loads(mm[start:start + length])
+        (fresh, status) = source_status(header, version, source)
+        if not fresh:
+            return (None, None, status)
+        data_start = align(start + length)
+        arrays = {}
+        for (name, (stored, offset, count)) in header['columns'].items():
+            arrays[name] = np.frombuffer(mm, stored, count,\
+                    data_start + offset).copy()
+    finally:
+        mm.close()
+    return (header, arrays, status)
+
+def save_cache(path, columns, source):
+    """Save the columns parsed from the log source as a cache file."""
+    kind = columns['kind'].copy()
+    reclassify(kind, columns['rtt'], float('inf'))
+    places = rtt_decimals(columns['rtt'])
+    text_records = sorted(columns['text'])
+    texts = [columns['text'][r] for r in text_records]
+    text_offsets = np.cumsum([0] + [len(text) for text in texts])
+    arrays = [
+            ('kind', kind, '<i1'),
+            ('seq', columns['seq'], '<i4'),
+            ('ttl', columns['ttl'], '<i2'),
+            ('rtt', columns['rtt'], '<f8' if places is None else '<f4'),
+            ('line', columns['line'], '<u4'),
+            ('text_record', text_records, '<i4'),
+            ('text_offset', text_offsets, '<i8'),
+            ('text_blob', np.fromstring("".join(texts), np.uint8), '|u1')
+            ]
+    header = {
+            'version': CACHE_VERSION,
+            'source': source_header(source),
+            'records': len(kind),
+            'rtt_decimals': places
+            }
+    write_arrays(path, CACHE_MAGIC, header, arrays)
+
+def load_cache(path, source, threshold):
+    """Load the cache for the log source, if there is a fresh one.
+
+    Returns (columns, status), with columns as parse_columns() would
+    return them for this threshold, or None; status says what happened.
+    """
+    (header, arrays, status) = \
+            read_arrays(path, CACHE_MAGIC, CACHE_VERSION, source)
+    if header is None:
+        return (None, status)
+    columns = {}
+    columns['kind'] = arrays['kind'].astype(np.int8)
+    columns['seq'] = arrays['seq'].astype(np.int64)
+    columns['ttl'] = arrays['ttl'].astype(np.int32)
+    columns['rtt'] = arrays['rtt'].astype(np.float64)
+    columns['line'] = arrays['line'].astype(np.int64)
+    if header['rtt_decimals'] is not None:
+        columns['rtt'] = np.round(columns['rtt'], header['rtt_decimals'])
+    reclassify(columns['kind'], columns['rtt'], threshold)
+    columns['timestamp'] = nearest_timestamps(columns['kind'])
+    text_offsets = arrays['text_offset'].tolist()
+    blob = arrays['text_blob'].tostring()
+    columns['text'] = {}
+    for (j, r) in enumerate(arrays['text_record'].tolist()):
+        columns['text'][r] = blob[text_offsets[j]:text_offsets[j + 1]]
+    return (columns, status)
+
+# The timestamp index
+#
+# <log>.tsidx, in the same layout as the cache, lists the '# timestamp: '
+# lines of a log that are safe places to start analyzing it (see
+# analyze_pings.is_safe_boundary()), sorted by time.  For each it has
+# the time (epoch microseconds), byte offset and line number, and the
+# PingState in force there: the unwrapped sequence number, sequence
+# offset, network state, where the current Up or Down run started and
+# the kind of the last down record.  The state depends on the
+# threshold, which is kept in the header.  analyze_pings.py --from /
+# --to bisects it to find where to start and stop.
+
+INDEX_MAGIC = "PINGTSX1"
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".tsidx"
+
+# network_state codes in the index
+NETWORK_STATES = ["None", "Up", "Down"]
+
+timestamp_line_re = re.compile(r'^# timestamp: ', re.M)
+
+def timestamp_lines(buf):
+    """Map line number to byte offset for each line of a log that starts
+    with '# timestamp: '."""
+    result = {}
+    line = 1
+    last = 0
+    for match in timestamp_line_re.finditer(buf):
+        pos = match.start()
+        line += buf[last:pos].count("\n")
+        last = pos
+        result[line] = pos
+    return result
+
+def build_index(buf, columns):
+    """Build the timestamp index of a log from its parsed columns.
+    Returns a dict of arrays, one entry per safe timestamp, in time order.
+    """
+    kind = columns['kind']
+    index = np.arange(len(kind))
+    (fresh, sequence_number, sequence_offset, tracker) = \
+            track_sequence(kind, columns['seq'])
+    (point_record, up, point_sequence, gap) = \
+            state_points(kind, fresh, sequence_number)
+
+    # The timestamps that are safe places to start
+    offsets = timestamp_lines(buf)
+    entries = []
+    for r in np.flatnonzero(kind == ps.TIMESTAMP).tolist():
+        offset = offsets.get(int(columns['line'][r]))
+        if offset is not None and ap.is_safe_boundary(buf, offset):
+            entries.append((r, offset))
+    records = np.array([r for (r, offset) in entries], dtype=np.int64)
+
+    # The state in force at each: set by the last state point before
+    # it, in a run that started at the first point since the last change
+    changed = np.concatenate(([True], up[1:] != up[:-1]))
+    run_first = np.maximum.accumulate(\
+            np.where(changed, np.arange(len(up)), 0))
+    last_state = np.searchsorted(point_record, records) - 1
+    network_state = np.where(last_state < 0, 0,\
+            np.where(up[np.maximum(last_state, 0)], 1, 2))
+    run_start = np.where(last_state < 0, -1,\
+            point_sequence[run_first[np.maximum(last_state, 0)]])
+    is_down = np.array(ps.IS_DOWN)[kind] & fresh
+    last_down = np.maximum.accumulate(np.where(is_down, index, -1))[records]
+    explanation = np.where(last_down < 0, -1, kind[last_down])
+
+    epoch_us = ts.parse_many([columns['text'][r] for r in records.tolist()])
+    order = np.argsort(epoch_us, kind='mergesort')
+    return {
+            'epoch_us': epoch_us[order],
+            'offset': np.array([o for (r, o) in entries],\
+                    dtype=np.int64)[order],
+            'line': columns['line'][records][order],
+            'sequence_number': sequence_number[records][order],
+            'sequence_offset': sequence_offset[records][order],
+            'network_state': network_state[order],
+            'run_start': run_start[order],
+            'explanation': explanation[order]
+            }
+
+INDEX_COLUMNS = [
+        ('epoch_us', '<i8'),
+        ('offset', '<i8'),
+        ('line', '<i8'),
+        ('sequence_number', '<i8'),
+        ('sequence_offset', '<i8'),
+        ('network_state', '<i1'),
+        ('run_start', '<i8'),
+        ('explanation', '<i1')
+        ]
+
+def save_index(path, time_index, source, threshold):
+    """Save a timestamp index for the log source."""
+    header = {
+            'version': INDEX_VERSION,
+            'source': source_header(source),
+            'threshold': threshold,
+            'entries': len(time_index['offset'])
+            }
+    write_arrays(path, INDEX_MAGIC, header,\
+            [(name, time_index[name], dtype) for (name, dtype) in\
+            INDEX_COLUMNS])
+
+def load_index(path, source, threshold):
+    """Load the timestamp index for the log source, if there is a fresh
+    one for this threshold.  Returns (time_index, status)."""
+    (header, arrays, status) = \
+            read_arrays(path, INDEX_MAGIC, INDEX_VERSION, source)
+    if header is None:
+        return (None, status)
+    if header['threshold'] != threshold:
+        return (None, "built for another threshold, ignored")
+    return (arrays, status)
+
+def index_window(time_index, start_us, end_us, size):
+    """Find the part of a log to analyze for a time window.
+
+    start_us and end_us (either may be None) are epoch microseconds.
+    The window is widened to the timestamps around it: it starts at the
+    last indexed timestamp at or before start_us and stops at the first
+    one after that which is later than end_us.  Returns (entry, start,
+    end), entry being the index entry it starts at (None for the start
+    of the log) and start and end byte offsets.
+    """
+    epoch_us = time_index['epoch_us']
+    offsets = time_index['offset']
+    entry = None
+    start = 0
+    if start_us is not None:
+        j = np.searchsorted(epoch_us, start_us, side='right') - 1
+        if j >= 0:
+            entry = int(j)
+            start = int(offsets[j])
+    end = size
+    if end_us is not None:
+        after = offsets[(epoch_us > end_us) & (offsets > start)]
+        if len(after):
+            end = int(after.min())
+    return (entry, start, end)
+
+def index_state(time_index, entry, sketch_k=0, writer=None,\
+        histogram_digits=0):
+    """A fresh PingState primed with the sequence and network state at an
+    index entry, ready to consume the log from there."""
+    state = ps.PingState(sketch_k, writer=writer,\
+            histogram_digits=histogram_digits)
+    if entry is None:
+        return state
+    state.sequence_number = int(time_index['sequence_number'][entry])
+    state.sequence_offset = int(time_index['sequence_offset'][entry])
+    if state.sequence_number >= 0:
+        state.tracker.resume(state.sequence_number,\
+                state.sequence_number - state.sequence_offset)
+    state.network_state = NETWORK_STATES[time_index['network_state'][entry]]
+    run_start = int(time_index['run_start'][entry])
+    if state.network_state == "Up":
+        (state.up_start, state.up_end) = (run_start, state.sequence_number)
+    elif state.network_state == "Down":
+        (state.down_start, state.down_end) = \
+                (run_start, state.sequence_number)
+    explanation = int(time_index['explanation'][entry])
+    if explanation >= 0:
+        state.explanation = ps.CLASSIFICATIONS[explanation]
+    return state
+
+def main():
+    """Main routine - just for testing."""
+    sample = "PING panix.com (166.84.1.3): 56 data bytes\n" +\
+            "# timestamp: pid-1: 2017-12-28T23:59:58.000001\n" +\
+            "64 bytes from 166.84.1.3: icmp_seq=0 ttl=246 time=23.7 ms\n" +\
+            "Request timeout for icmp_seq 1\n" +\
+            "ping: sendto: Network is down\n" +\
+            "Request timeout for icmp_seq 2\n" +\
+            "# timestamp: pid-1: 2017-12-29T00:00:01.000001\n" +\
+            "64 bytes from 166.84.1.3: icmp_seq=3 ttl=246 time=300.1 ms\n" +\
+            "64 bytes from 166.84.1.3: icmp_seq=4 ttl=246 time=21.2 ms\n"
+    columns = parse_columns(sample, 250)
+    for name in ['kind', 'seq', 'rtt', 'line', 'timestamp']:
+        print name + ": " + str(columns[name].tolist())
+    print "text: " + str(columns['text'])
+    state = analyze_columns(columns)
+    state.report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+""" PingRunner
+
+Run a ping per host from this one process, and write the logs that
+the ping | insert_timestamps.py | tee pipelines used to.
+
+Each ping's output is read as it arrives (the pipes are non-blocking
+and watched with poll()), a timestamp comment is put in front of every
+timer_interval-th line, exactly as insert_timestamps.py does, and the
+lines are appended to <host>.ping.log through a buffered file that is
+flushed at most once per flush_interval.  So a run costs one ping
+process per host plus this one, rather than three processes and two
+pipes per host.  Given max_bytes or hourly, each log is rotated into
+compressed segments instead (see LogSegments).
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Run the pings from a single poll() loop.
+# 2026-10-18 [x] Rotate the logs into segments by size or by the hour.
+#
+
+import datetime as datetime
+import errno
+import fcntl
+import os
+import select
+import shlex
+import signal
+import subprocess
+import time
+
+import LogSegments
+
+# Buffer for each log file
+LOG_BUFFER = 1 << 16
+
+class PingRunner(object):
+    """PingRunner - run and log pings to several hosts."""
+    def __init__(self, hosts, ping_command, directory,\
+            timer_interval=64, flush_interval=1.0, max_bytes=0,\
+            hourly=False, compressor='gzip'):
+        self.hosts = hosts
+        self.ping_command = ping_command
+        self.directory = directory
+        self.timer_interval = timer_interval
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.hourly = hourly
+        self.compressor = compressor
+        # per stream, indexed by file descriptor
+        self.processes = {}
+        self.logs = {}
+        self.partial = {}
+        self.linenumber = {}
+        self.tags = {}
+        self.host = {}
+        # lines logged, by host
+        self.lines = {}
+        self.poller = select.poll()
+
+    def log_file_name(self, host):
+        """Where the log for a host goes."""
+        return os.path.join(self.directory, host + '.ping.log')
+
+    def start(self):
+        """Start a ping for each host."""
+        for host in self.hosts:
+            process = subprocess.Popen(\
+                    shlex.split(self.ping_command) + [host],\
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            fd = process.stdout.fileno()
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            if self.max_bytes or self.hourly:
+                log = LogSegments.SegmentWriter(self.log_file_name(host),\
+                        self.max_bytes, self.hourly, self.compressor,\
+                        LOG_BUFFER)
+            else:
+                log = open(self.log_file_name(host), 'a', LOG_BUFFER)
+            timestamp = datetime.datetime.isoformat(\
+                    datetime.datetime.today())
+            # the same header insert_timestamps.py used to write
+            tag = "pid-" + str(process.pid)
+            log.write("# PingRunner.py\n")
+            log.write("# PingRunner.py: start: timestamp: " + timestamp +\
+                    "\n")
+            log.write("# PingRunner.py: tag: " + tag + "\n")
+            log.write("# PingRunner.py: timer_interval: " +\
+                    str(self.timer_interval) + "\n")
+            self.processes[fd] = process
+            self.logs[fd] = log
+            self.partial[fd] = ""
+            self.linenumber[fd] = 0
+            self.tags[fd] = tag
+            self.host[fd] = host
+            self.lines[host] = 0
+            self.poller.register(fd, select.POLLIN | select.POLLHUP)
+
+    def write_lines(self, fd, data):
+        """Log the complete lines in data, with timestamps."""
+        data = self.partial[fd] + data
+        end = data.rfind("\n") + 1
+        self.partial[fd] = data[end:]
+        if not end:
+            return
+        log = self.logs[fd]
+        linenumber = self.linenumber[fd]
+        for line in data[:end].splitlines():
+            if not linenumber % self.timer_interval:
+                timestamp = datetime.datetime.isoformat(\
+                        datetime.datetime.today())
+                log.write("# timestamp: " + self.tags[fd] + ": " +\
+                        timestamp + "\n")
+            log.write(line.strip() + "\n")
+            linenumber += 1
+        self.lines[self.host[fd]] += linenumber - self.linenumber[fd]
+        self.linenumber[fd] = linenumber
+
+    def finish(self, fd):
+        """A ping has exited: log what is left and close up."""
+        if self.partial[fd]:
+            self.write_lines(fd, "\n")
+        self.poller.unregister(fd)
+        process = self.processes.pop(fd)
+        process.stdout.close()
+        process.wait()
+        log = self.logs.pop(fd)
+        log.write("# PingRunner.py: end: timestamp: " +\
+                datetime.datetime.isoformat(datetime.datetime.today()) +\
+                "\n")
+        log.close()
+
+    def read(self, fd):
+        """Read whatever a ping has written.  Returns False at EOF."""
+        try:
+            data = os.read(fd, LOG_BUFFER)
+        except OSError as error:
+            if error.errno == errno.EAGAIN:
+                return True
+            raise
+        if not data:
+            return False
+        self.write_lines(fd, data)
+        return True
+
+    def stop(self):
+        """Ask the pings to stop; they print their statistics and exit."""
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+
+    def run(self):
+        """Log until every ping has exited.  Ctrl-C stops the pings."""
+        last_flush = time.time()
+        while self.processes:
+            try:
+                events = self.poller.poll(1000 * self.flush_interval)
+            except KeyboardInterrupt:
+                self.stop()
+                continue
+            except select.error as error:
+                if error.args[0] == errno.EINTR:
+                    continue
+                raise
+            for (fd, event) in events:
+                if not self.read(fd):
+                    self.finish(fd)
+            now = time.time()
+            if now - last_flush >= self.flush_interval:
+                for log in self.logs.values():
+                    log.flush()
+                last_flush = now
+
+def main():
+    """Main routine - just for testing."""
+    import tempfile
+    directory = tempfile.mkdtemp()
+    # a stand in for ping that ends by itself: 'seq 3' and 'seq 5'
+    runner = PingRunner(['3', '5'], 'seq', directory, timer_interval=2)
+    runner.start()
+    runner.run()
+    for host in runner.hosts:
+        print "lines: " + host + ": " + str(runner.lines[host])
+        print open(runner.log_file_name(host)).read()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,475 @@
+""" PingState
+
+The record kinds and the analyzer state machine.
+
+A record is a tuple (kind, seq, ttl, rtt, ip, text), as classify() and
+the scanners in analyze_pings.py make them; kind is one of the small
+integer codes below.  PingState runs over the records and reports the
+Up and Down intervals as it goes; AdaptiveThreshold reclassifies the
+replies before it sees them.  They live here, and not in
+analyze_pings.py, so that the modules that make or read records
+(PingColumns.py, Rollup.py, RunCorrelator.py) share one set of kinds
+and one PingState with the analyzer, however it is run.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Move the record kinds and PingState out of
+#                analyze_pings.py: run as a script it was __main__, so
+#                the modules that imported it had a second PingState,
+#                and a checkpoint pickled __main__.PingState.
+#
+
+import psutil
+
+import EventWriter
+import SequenceStats as ss
+from SequenceTracker import SequenceTracker
+import TimeStamp as ts
+from WindowStats import WindowStats
+
+# Record kind codes.  These are small integers so that the counters
+# can live in a list indexed by kind instead of a dict keyed by string.
+# CLASSIFICATIONS is indexed by kind code and is also the order in
+# which the counters are reported.
+COMMENT = 0
+DOWN = 1
+GWFAILURE = 2
+INITIALIZATION = 3
+NEGATIVERTT = 4
+NORMAL = 5
+ROUTE = 6
+RTTTOOLONG = 7
+TIMEOUT = 8
+TIMESTAMP = 9
+UNEXPECTED = 10
+
+CLASSIFICATIONS = [
+                   "Comment",
+                   "Down",
+                   "GWFailure",
+                   "Initialization",
+                   "NegativeRTT",
+                   "Normal",
+                   "Route",
+                   "RTTTooLong",
+                   "Timeout",
+                   "Timestamp",
+                   "Unexpected"]
+
+# IS_DOWN[kind] is True for the kinds that put the network in Down state
+IS_DOWN = [False] * len(CLASSIFICATIONS)
+for _kind in [DOWN, GWFAILURE, NEGATIVERTT, ROUTE, RTTTOOLONG, TIMEOUT]:
+    IS_DOWN[_kind] = True
+
+# IS_REPLY[kind] is True for the kinds that are replies to a probe
+IS_REPLY = [False] * len(CLASSIFICATIONS)
+for _kind in [NEGATIVERTT, NORMAL, RTTTOOLONG]:
+    IS_REPLY[_kind] = True
+
+# Probes in the SequenceTracker window: replies later than this are
+# too late to tell a duplicate from a reordered one
+SEQUENCE_WINDOW = 1024
+
+# The RTT percentiles reported in the summary
+REPORT_PERCENTILES = [50, 90, 99, 99.9]
+
+# --adaptive: replies in the window before the median is trusted, and
+# the least the threshold may be (ms), so that the jitter of a fast
+# LAN is not taken for an outage.
+ADAPTIVE_WARMUP = 16
+ADAPTIVE_FLOOR = 50.0
+
+class AdaptiveThreshold(object):
+    """An RTTTooLong threshold of factor times the median RTT of the
+    last window replies, never less than ADAPTIVE_FLOOR.
+
+    records() reclassifies each reply as Normal or RTTTooLong against
+    the threshold as it stood before that reply, then adds its RTT to
+    the window.  Until the window holds ADAPTIVE_WARMUP replies the
+    fixed threshold is used.
+    """
+    def __init__(self, factor, window, threshold):
+        self.factor = factor
+        self.fixed = threshold
+        self.threshold = threshold
+        self.stats = WindowStats(window)
+        self.too_long = 0
+        self.normal = 0
+
+    def records(self, records):
+        """Generate the records, with the replies reclassified."""
+        stats = self.stats
+        for record in records:
+            kind = record[0]
+            if kind == NORMAL or kind == RTTTOOLONG:
+                rtt = record[3]
+                if rtt > self.threshold:
+                    new_kind = RTTTOOLONG
+                else:
+                    new_kind = NORMAL
+                if new_kind != kind:
+                    if new_kind == RTTTOOLONG:
+                        self.too_long += 1
+                    else:
+                        self.normal += 1
+                    record = (new_kind,) + record[1:]
+                stats.accumulate(rtt)
+                if stats.n >= ADAPTIVE_WARMUP:
+                    self.threshold = max(self.factor * stats.get_median(),\
+                            ADAPTIVE_FLOOR)
+            yield record
+
+    def summary(self):
+        """The summary, for the summary event."""
+        return {
+                'factor': self.factor,
+                'window': self.stats.size,
+                'fixed': self.fixed,
+                'threshold': self.threshold,
+                'window_n': self.stats.get_n(),
+                'window_median': self.stats.get_median(),
+                'window_mean': self.stats.get_mean(),
+                'too_long': self.too_long,
+                'normal': self.normal
+                }
+
+class PingState(object):
+    """The analyzer state machine.
+
+    Feed it records from analyze_pings.py (classify(), via scan_lines()
+    or scan_mapped()) and it tracks the counters, the sequence rollover,
+    the Up/Down network state and the RTT statistics, passing each
+    Up/Down interval to its EventWriter as it closes.
+
+    With sketch_k the RTT statistics are incremental and the percentiles
+    come from a QuantileSketch of that size, so memory stays bounded
+    however long the log; otherwise the full RTT history is kept.  So
+    too with histogram_digits, from a LogHistogram to that many
+    significant digits (the sketch comes first).  With
+    an AdaptiveThreshold the replies are reclassified by it first, and
+    with a RollupBuilder they are tallied in its rollups.
+    The events go to writer, by default a TextWriter on stdout.
+    """
+    def __init__(self, sketch_k=0, adaptive=None, writer=None,\
+            rollups=None, histogram_digits=0):
+        self.sketch_k = sketch_k
+        self.histogram_digits = histogram_digits
+        self.adaptive = adaptive
+        self.rollups = rollups
+        if writer is None:
+            writer = EventWriter.TextWriter()
+        self.writer = writer
+        # Initialize the counters - one slot per kind code
+        self.counters = [0] * len(CLASSIFICATIONS)
+        self.linecount = 0
+
+        # variables used for online mean and standard deviation
+        self.current = {}
+        self.previous = {}
+
+        self.previous['rtt'] = None
+        self.current['rtt'] = None
+
+        self.previous['mean'] = 0.0
+        self.current['mean'] = 0.0
+
+        self.previous['variance'] = 0.0
+        self.current['variance'] = 0.0
+
+        self.normal_ping_count = 0
+
+        self.sequence_number = -1
+        self.sequence_offset = 0
+        # loss, duplicates and reordering, and the unwrapping
+        self.tracker = SequenceTracker(SEQUENCE_WINDOW)
+
+        # duration and state variables
+        self.network_state = "None"
+        self.up_start = -1
+        self.up_end = -1
+        self.down_start = -1
+        self.down_end = -1
+
+        self.previous['time'] = "unknown"
+        self.current['time'] = "unknown"
+
+        self.previous['timestamp'] = None
+        self.current['timestamp'] = None
+
+        self.previous['sequence'] = self.sequence_number
+        self.current['sequence'] = self.sequence_number
+
+        self.current['linenumber'] = self.linecount
+
+        self.rtt_stats = None
+        self.zrtt = None
+
+        self.explanation = ""
+
+    def __getstate__(self):
+        # The writer (and its stream) stays behind in a checkpoint
+        state = self.__dict__.copy()
+        state.pop('writer', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.writer = EventWriter.TextWriter()
+
+    def consume(self, records):
+        """Run the state machine over an iterable of records."""
+        if getattr(self, 'adaptive', None) is not None:
+            records = self.adaptive.records(records)
+        if getattr(self, 'rollups', None) is not None:
+            records = self.rollups.records(records)
+        # The state lives in locals for the duration of the loop, which
+        # is a good deal cheaper than attribute access per record.
+        counters = self.counters
+        current = self.current
+        previous = self.previous
+        linecount = self.linecount
+        normal_ping_count = self.normal_ping_count
+        sequence_number = self.sequence_number
+        sequence_offset = self.sequence_offset
+        network_state = self.network_state
+        up_start = self.up_start
+        up_end = self.up_end
+        down_start = self.down_start
+        down_end = self.down_end
+        rtt_stats = self.rtt_stats
+        zrtt = self.zrtt
+        explanation = self.explanation
+        sketch_k = self.sketch_k
+        histogram_digits = getattr(self, 'histogram_digits', 0)
+        incremental = sketch_k > 0 or histogram_digits > 0
+        emit = self.writer.emit
+        tracker = self.tracker
+        track = tracker.add
+
+        for (kind, seq_num, ttl, rtt, ip, text) in records:
+            linecount += 1
+            counters[kind] += 1
+            if IS_REPLY[kind]:
+                # The sequence number only goes to 65535; the tracker
+                # unwraps it.  A duplicate or late reply is counted,
+                # and otherwise left out.
+                (unwrapped, status) = track(seq_num)
+                if status:
+                    continue
+            if kind == NORMAL:
+                # ping sends pings once per second, so sequence_number
+                # is roughly a count of seconds.
+
+                if not zrtt:
+                    rtt_stats = ss.SequenceStats(rtt, incremental, sketch_k,\
+                            histogram_digits)
+                    current['mean'] = rtt
+                zrtt = rtt
+
+                sequence_number = unwrapped
+                sequence_offset = unwrapped - seq_num
+
+                # Handle network state stuff
+                if network_state == "Up" and sequence_number > up_end + 1:
+                    # A silent gap: no reply and no record for the
+                    # probes in between (Linux ping without -O), taken
+                    # as a Down interval of its own.
+                    tracker.gaps += 1
+                    emit({'event': 'up', 'start': up_start,\
+                            'end': up_end - 1, 'timestamp': current['time']\
+                            if current['time'] != "unknown" else None,\
+                            'plus': up_end - current['sequence']})
+                    emit({'event': 'down', 'start': up_end,\
+                            'end': sequence_number - 1, 'explanation': "Gap",\
+                            'rtt': zrtt, 'timestamp': current['time']\
+                            if current['time'] != "unknown" else None,\
+                            'plus': sequence_number - current['sequence']})
+                    up_start = sequence_number
+                    up_end = sequence_number
+                elif network_state == "None":
+                    up_start = sequence_number
+                    up_end = sequence_number
+                elif network_state == "Down":
+                    down_end = sequence_number - 1
+                    up_start = sequence_number
+                    up_end = sequence_number
+                    #
+                    emit({'event': 'down', 'start': down_start,\
+                            'end': down_end, 'explanation': explanation,\
+                            'rtt': zrtt, 'timestamp': current['time']\
+                            if current['time'] != "unknown" else None,\
+                            'plus': sequence_number - current['sequence']})
+                else:
+                    up_end = sequence_number
+                network_state = "Up"
+
+# We use the online algorithm documented in Wikipedia article:
+# https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
+
+                # Use the new stats class to accumulate the data
+                rtt_stats.accumulate(zrtt)
+
+                normal_ping_count += 1
+                if previous['rtt'] > 0.0:
+                    temp = current['mean']
+                    current['mean'] += \
+                        (zrtt - previous['mean']) /\
+                        float(normal_ping_count)
+                    previous['mean'] = temp
+                previous['rtt'] = zrtt
+                # This works because the first time through 
+                # previous_variance is zero
+                # this is the population variance
+                temp = current['variance']
+                current['variance'] = \
+                    ( (normal_ping_count - 1) * previous['variance'] + \
+                      (zrtt - previous['mean']) * \
+                      (zrtt - current['mean'])
+                    ) / normal_ping_count
+                previous['variance'] = temp
+
+            elif IS_DOWN[kind]:
+                if text is not None:
+                    # a malformed GWFailure block
+                    emit({'event': 'malformed_gwfailure',\
+                            'linenumber': linecount})
+                # Handle network state stuff
+                explanation = CLASSIFICATIONS[kind]
+                if network_state == "None":
+                    down_start = sequence_number
+                    down_end = sequence_number
+                elif network_state == "Up":
+                    up_end = sequence_number - 1
+                    down_start = sequence_number
+                    down_end = sequence_number
+                    #
+                    emit({'event': 'up', 'start': up_start,\
+                            'end': up_end, 'timestamp': current['time']\
+                            if current['time'] != "unknown" else None,\
+                            'plus': sequence_number - current['sequence']})
+                else:
+                    down_end = sequence_number
+                network_state = "Down"
+            elif kind == TIMESTAMP:
+                previous['time'] = current['time']
+                previous['timestamp'] = current['timestamp']
+                previous['sequence'] = current['sequence']
+                # 
+                current['time'] = text
+                current['timestamp'] = ts.TimeStamp(current['time'])
+                current['sequence'] = sequence_number
+                current['linenumber'] = linecount
+                #
+                if previous['time'] != "unknown":
+                    delta_t = current['timestamp'].minus_small(\
+                            previous['timestamp'])
+                    delta_r = current['sequence'] - previous['sequence']
+                    emit({'event': 'time_check', 'delta_r': delta_r,\
+                            'delta_t': delta_t})
+            elif kind == INITIALIZATION:
+                # a new ping numbers its probes from the start again
+                tracker.restart()
+            elif kind == COMMENT:
+                pass
+            else:
+                # Failed to classify:
+                emit({'event': 'unexpected', 'linenumber': linecount,\
+                        'kind': CLASSIFICATIONS[kind], 'line': text})
+                counters[UNEXPECTED] += 1
+
+        self.linecount = linecount
+        self.normal_ping_count = normal_ping_count
+        self.sequence_number = sequence_number
+        self.sequence_offset = sequence_offset
+        self.network_state = network_state
+        self.up_start = up_start
+        self.up_end = up_end
+        self.down_start = down_start
+        self.down_end = down_end
+        self.rtt_stats = rtt_stats
+        self.zrtt = zrtt
+        self.explanation = explanation
+
+    def summary(self):
+        """The end of run summary event."""
+        counters = self.counters
+        summary = {
+                'event': 'summary',
+                'linecount': self.linecount,
+                'counters': [(CLASSIFICATIONS[kind], counters[kind])\
+                        for kind in range(len(CLASSIFICATIONS))],
+                'sequence_number': self.sequence_number,
+                'sequence_offset': self.sequence_offset,
+                'normal_ping_count': self.normal_ping_count,
+                'sequence': self.tracker.summary(),
+                'mean': self.current['mean'],
+                'rtt_mean': self.rtt_stats.get_mean(),
+                'variance': self.current['variance'],
+                'rtt_variance': self.rtt_stats.get_variance(),
+                'percents': REPORT_PERCENTILES,
+                'rtt_percentiles': \
+                        self.rtt_stats.get_percentiles(REPORT_PERCENTILES),
+                'rtt_stats': self.rtt_stats.get_summary(),
+                'checksum': self.linecount - sum(counters)
+                }
+        if getattr(self, 'adaptive', None) is not None:
+            summary['adaptive'] = self.adaptive.summary()
+        return summary
+
+    def report(self):
+        """Write the end of run summary, and flush the writer."""
+        self.writer.emit(self.summary())
+        self.writer.flush()
+
+def main():
+    """Main body."""
+    import cPickle
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# PingState.py"
+    print "# PingState.py: start: timestamp: " + ts0.get_timestamp()
+
+    # Replies 0 - 548, 549 lost, replies 550 - 600, 601 - 610 lost and
+    # a reply at 611
+    records = [(INITIALIZATION, 0, -1, -1.0, None, None),\
+            (TIMESTAMP, -1, -1, -1.0, None, '2026-10-18T12:00:00.000000')]
+    for seq in range(612):
+        if seq == 549 or 601 <= seq <= 610:
+            records.append((TIMEOUT, seq, -1, -1.0, None, None))
+        else:
+            records.append((NORMAL, seq, 64, 20.0 + seq % 5, None, None))
+    state = PingState()
+    state.consume(records)
+    state.report()
+
+    # As a checkpoint saves it, less the writer
+    resumed = cPickle.loads(cPickle.dumps(state, cPickle.HIGHEST_PROTOCOL))
+    print "resumed state: " + resumed.network_state + " at " +\
+            str(resumed.sequence_number)
+
+    # 20 ms replies, then one of 100 ms: too long at 3 times the median
+    adaptive = AdaptiveThreshold(3.0, 32, 250.0)
+    replies = [(NORMAL, seq, 64, 20.0, None, None) for seq in range(20)] +\
+            [(NORMAL, 20, 64, 100.0, None, None)]
+    kinds = [CLASSIFICATIONS[record[0]] for record in\
+            adaptive.records(replies)]
+    print "adaptive: threshold " + str(adaptive.threshold) + " last " +\
+            kinds[-1] + " too long " + str(adaptive.too_long)
+
+    cputime_1 = psutil.Process().cpu_times()
+    print
+    ts1 = ts.TimeStamp()
+    print "# PingState.py: end: timestamp: " + ts1.get_timestamp()
+    print "# PingState.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# PingState.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+""" ProcessProfile
+
+Resource accounting for this process, and timers for the stages of a
+run, reported as a JSON block.
+
+psutil.cpu_times() is the whole machine's; this uses the process's
+own CPU times, peak RSS and I/O counters, so the figures mean something
+on a shared collector.  Stages are timed by wrapping the methods that
+do them (instrument()) or the iterables that feed them (timed()), so
+nothing is timed unless a profile asks for it.  Optionally the run is
+also profiled with cProfile and, where the Python has it, tracemalloc.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Per-process CPU, peak RSS and I/O, stage timers, and
+#                cProfile / tracemalloc, as JSON.
+#
+
+import cProfile
+import json
+import os
+import pstats
+import psutil
+import resource
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 3 only
+    tracemalloc = None
+
+# Functions and allocation sites reported
+PROFILE_TOP = 25
+
+def peak_rss_mb():
+    """Peak RSS of this process so far, in MB (Linux reports KB, macOS
+    bytes)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / float(1 << 20)
+    return peak / 1024.0
+
+class ProcessProfile(object):
+    """ProcessProfile - resources and stage timers for one run.
+
+    profile_calls turns on cProfile, and trace_memory tracemalloc (if
+    there is one), from the moment the profile is made.
+    """
+    def __init__(self, name, profile_calls=False, trace_memory=False):
+        self.name = name
+        self.process = psutil.Process()
+        self.start_wall = time.time()
+        self.start_cpu = self.process.cpu_times()
+        self.start_io = self.io_counters()
+        self.stages = {}
+        self.calls = {}
+        self.profiler = None
+        if profile_calls:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.tracing = trace_memory and tracemalloc is not None
+        if self.tracing:
+            tracemalloc.start()
+
+    def io_counters(self):
+        """Bytes read and written so far, or None where psutil can not
+        tell (macOS)."""
+        try:
+            counters = self.process.io_counters()
+        except (AttributeError, psutil.Error):
+            return None
+        return (counters.read_bytes, counters.write_bytes)
+
+    def cpu(self):
+        """(user, system) CPU seconds of this process since the start."""
+        now = self.process.cpu_times()
+        return (now.user - self.start_cpu.user,\
+                now.system - self.start_cpu.system)
+
+    def add(self, stage, seconds, calls=1):
+        """Charge seconds to a stage."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def instrument(self, owner, name, stage):
+        """Time every call of owner.name (a method or a module function)
+        as stage."""
+        function = getattr(owner, name)
+        profile = self
+        def timed_call(*args, **kwargs):
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.add(stage, time.time() - start)
+        timed_call.__doc__ = function.__doc__
+        setattr(owner, name, timed_call)
+
+    def timed(self, iterable, stage):
+        """Generate the items of iterable, timing the getting of each
+        one as stage."""
+        iterator = iter(iterable)
+        clock = time.time
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                seconds += clock() - start
+                count += 1
+                yield item
+        finally:
+            self.add(stage, seconds, count)
+
+    def report(self, records=0, derived=None):
+        """The profile as a dict; records is how many records the run
+        handled, and derived any further figures to include."""
+        (user, system) = self.cpu()
+        wall = time.time() - self.start_wall
+        result = {
+                'name': self.name,
+                'pid': os.getpid(),
+                'wall_s': wall,
+                'user_s': user,
+                'system_s': system,
+                'rss_peak_mb': peak_rss_mb(),
+                'rss_mb': self.process.memory_info().rss / float(1 << 20),
+                'records': records,
+                'stages': self.stages,
+                'stage_calls': self.calls,
+                }
+        if records:
+            result['user_us_per_record'] = 1e6 * user / records
+            result['system_us_per_record'] = 1e6 * system / records
+        io = self.io_counters()
+        if io is not None and self.start_io is not None:
+            result['read_bytes'] = io[0] - self.start_io[0]
+            result['write_bytes'] = io[1] - self.start_io[1]
+        if derived:
+            result.update(derived)
+        if self.profiler is not None:
+            self.profiler.disable()
+            stats = pstats.Stats(self.profiler).stats
+            functions = []
+            for ((filename, line, function), (primitive, calls, total,\
+                    cumulative, callers)) in stats.items():
+                functions.append({
+                        'function': os.path.basename(filename) + ":" +\
+                                str(line) + "(" + function + ")",
+                        'calls': calls,
+                        'tottime_s': total,
+                        'cumtime_s': cumulative,
+                        })
+            functions.sort(key=lambda f: -f['tottime_s'])
+            result['cprofile'] = functions[:PROFILE_TOP]
+        if self.tracing:
+            snapshot = tracemalloc.take_snapshot()
+            result['tracemalloc'] = [{
+                    'site': str(statistic.traceback),
+                    'size_kb': statistic.size / 1024.0,
+                    'count': statistic.count,
+                    } for statistic in\
+                    snapshot.statistics('lineno')[:PROFILE_TOP]]
+            tracemalloc.stop()
+        return result
+
+    def print_report(self, records=0, derived=None):
+        """Print the profile as a JSON block between comment lines."""
+        print "# " + self.name + ": profile: begin"
+        print json.dumps(self.report(records, derived), indent=2,\
+                separators=(',', ': '), sort_keys=True)
+        print "# " + self.name + ": profile: end"
+
+def main():
+    """Main routine - just for testing."""
+    profile = ProcessProfile("ProcessProfile.py", profile_calls=True,\
+            trace_memory=True)
+
+    class Work(object):
+        """Something to time."""
+        def square(self, value):
+            """Square a value."""
+            return value * value
+
+    profile.instrument(Work, 'square', 'square')
+    work = Work()
+    total = 0
+    for value in profile.timed(xrange(100000), 'count'):
+        total += work.square(value)
+    print "total: " + str(total)
+    profile.print_report(100000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+""" QuantileSketch
+
+A bounded memory, mergeable sketch for estimating quantiles of a
+stream of reals that is too long to keep, such as the RTTs from a
+year of pings.
+
+"""
+
+# This is the KLL sketch:
+#   Karnin, Lang, Liberty, "Optimal Quantile Approximation in Streams"
+#   https://arxiv.org/abs/1603.05346
+# following the reference Python implementation by Edo Liberty
+#   https://github.com/edoliberty/streaming-quantiles
+#
+# The sketch keeps a stack of compactors.  An item at level h stands
+# for 2**h items of the stream.  When the sketch is full the lowest
+# compactor that is over its capacity is sorted and every other item
+# (starting at a random offset) is promoted to the next level, the rest
+# being discarded.  Capacities shrink geometrically (by 2/3) going down
+# from the top level, so the sketch holds at most about 3k items plus
+# two per level, however long the stream.
+#
+# Error bound: the rank of the value returned for a quantile q is
+# within about 1.65 / k ** 0.9 * n of q * n with 99% confidence.  For
+# the default k = 200 that is a rank error of about 1.3%; that is, the
+# value returned for p99 lies between the true p97.7 and p100.
+# Multiplying k by 10 cuts the error by a factor of about 8.
+#
+# Roadmap
+#
+# 2026-10-18 [x] KLL sketch with update, merge and quantiles.
+#
+
+import TimeStamp as ts
+
+import math
+import numpy as np
+import psutil
+import random
+
+class QuantileSketch(object):
+    """KLL quantile sketch with fixed memory."""
+    def __init__(self, k=200, seed=1):
+        self.k = int(k)
+        self.n = 0
+        self.compactors = [[]]
+        # A private generator, seeded, so that reports are repeatable.
+        self.random = random.Random(seed)
+        self.size = 0
+        self.max_size = self.capacity_sum()
+
+    def capacity(self, level):
+        """Capacity of the compactor at a level."""
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def capacity_sum(self):
+        """Total capacity of all of the compactors."""
+        return sum([self.capacity(h) for h in range(len(self.compactors))])
+
+    def update(self, value):
+        """Add one value to the sketch."""
+        self.compactors[0].append(value)
+        self.n += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self.compress()
+
+    def update_many(self, values):
+        """Add a sequence of values to the sketch."""
+        count = len(values)
+        self.compactors[0].extend(values)
+        self.n += count
+        self.size += count
+        while self.size >= self.max_size:
+            self.compress()
+
+    def compress(self):
+        """Compact the lowest compactor that is over its capacity."""
+        for h in range(len(self.compactors)):
+            if len(self.compactors[h]) >= self.capacity(h):
+                if h + 1 == len(self.compactors):
+                    self.compactors.append([])
+                    self.max_size = self.capacity_sum()
+                items = self.compactors[h]
+                items.sort()
+                # With an odd count the largest item stays behind.
+                keep = []
+                if len(items) % 2:
+                    keep.append(items.pop())
+                offset = self.random.randint(0, 1)
+                self.compactors[h + 1].extend(items[offset::2])
+                self.compactors[h] = keep
+                self.size = sum([len(c) for c in self.compactors])
+                return
+
+    def merge(self, other):
+        """Fold another QuantileSketch into this one."""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for h in range(len(other.compactors)):
+            self.compactors[h].extend(other.compactors[h])
+        self.n += other.n
+        self.size = sum([len(c) for c in self.compactors])
+        self.max_size = self.capacity_sum()
+        while self.size >= self.max_size:
+            self.compress()
+
+    def quantiles(self, fractions):
+        """Estimate the values at a list of quantiles (0.0 - 1.0)."""
+        if not self.n:
+            return [None for q in fractions]
+        values = []
+        weights = []
+        for h in range(len(self.compactors)):
+            values.extend(self.compactors[h])
+            weights.extend([1 << h] * len(self.compactors[h]))
+        values = np.array(values)
+        weights = np.array(weights)
+        order = np.argsort(values, kind='mergesort')
+        values = values[order]
+        cumulative = np.cumsum(weights[order])
+        total = cumulative[-1]
+        result = []
+        for q in fractions:
+            idx = np.searchsorted(cumulative, q * total)
+            result.append(float(values[min(idx, len(values) - 1)]))
+        return result
+
+    def percentiles(self, percents):
+        """Estimate the values at a list of percentiles (0 - 100)."""
+        return self.quantiles([p / 100.0 for p in percents])
+
+    def __str__(self):
+        return "QuantileSketch(k=" + str(self.k) + ", n=" + str(self.n) +\
+                ", size=" + str(self.size) + ", levels=" +\
+                str(len(self.compactors)) + ")"
+
+def main():
+    """Main routine - just for testing."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# QuantileSketch.py"
+    print "# QuantileSketch.py: start: timestamp: " + ts0.get_timestamp()
+
+    # RTT-like data: mostly exponential with a long tail
+    generator = random.Random(42)
+    data = [generator.expovariate(1 / 30.0) for j in range(1000000)]
+    percents = [50, 90, 99, 99.9]
+
+    sketch = QuantileSketch(200)
+    for value in data:
+        sketch.update(value)
+    print str(sketch)
+    print "sketch percentiles: " + str(sketch.percentiles(percents))
+    print "exact percentiles:  " + str(list(np.percentile(data, percents)))
+
+    # Two half sketches merged should do as well as one
+    left = QuantileSketch(200)
+    left.update_many(data[:500000])
+    right = QuantileSketch(200)
+    right.update_many(data[500000:])
+    left.merge(right)
+    print str(left)
+    print "merged percentiles: " + str(left.percentiles(percents))
+
+    # rank error of the sketch estimates
+    ordered = np.sort(data)
+    for (p, value) in zip(percents, left.percentiles(percents)):
+        rank = np.searchsorted(ordered, value) / float(len(data))
+        print "p" + str(p) + " rank error: " + str(rank - p / 100.0)
+
+    cputime_1 = psutil.Process().cpu_times()
+    print
+    ts1 = ts.TimeStamp()
+    print "# QuantileSketch.py: end: timestamp: " + ts1.get_timestamp()
+    print "# QuantileSketch.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# QuantileSketch.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,447 @@
+""" Rollup
+
+Per minute and per hour summaries of a ping stream, so that dashboards
+and reports over months need not read the raw logs again.
+
+A Rollup covers one minute (or hour, or day) of one host: the probes
+sent, the replies, the probes lost, late replies and duplicates, the
+records of each kind (the classifications of analyze_pings.py), and
+the count, minimum, mean and maximum of the RTTs, with a LogHistogram
+of them from which the p95 (or any percentile) is taken to within 1%.
+The RTTs are those of the replies that came in order, as in the
+summary of analyze_pings.py: a late reply is counted, and its RTT left
+out.
+Rollups merge exactly, so an hour is the merge of its minutes and a day
+the merge of its hours, without the raw data.
+
+RollupBuilder goes in front of PingState.consume(), as AdaptiveThreshold
+does.  It times each probe from the last timestamp, at a ping a second,
+and appends each rollup to the rollup file, a line of JSON, as its
+period ends; the periods still open are written at the end of a run.
+The time never goes back: when a timestamp puts a probe before the
+open minute (ping fell behind), the probe is counted in that minute,
+so a minute is never written twice in a run.
+A line supersedes any earlier one for the same period and start, so a
+run that reads a log again only writes from where the file ends.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Per minute and per hour rollups, appended to a rollup
+#                file by analyze_pings.py --rollup.
+# 2026-10-18 [x] The RTTs in a LogHistogram, in place of buckets of 1/8
+#                octave.
+# 2026-10-18 [x] Leave the RTTs of late replies out, as PingState does.
+# 2026-10-18 [x] The kinds from PingState.py, not analyze_pings.py.
+#
+
+import json
+import os
+import psutil
+import tempfile
+
+import LogHistogram
+import PingState as ps
+from SequenceTracker import SequenceTracker, NEW, REORDERED, DUPLICATE
+import TimeStamp as ts
+
+ROLLUP_SUFFIX = ".rollup"
+
+PERIOD_US = {
+    'minute': 60 * 1000000,
+    'hour': 3600 * 1000000,
+    'day': 86400 * 1000000,
+    }
+
+# Significant digits of the RTT histograms
+HISTOGRAM_DIGITS = 2
+
+# How much of the end of a rollup file is read for the last periods
+TAIL_BYTES = 1 << 16
+
+# Buffer size of the rollup file
+OUTPUT_BUFFER = 1 << 16
+
+def period_start(epoch_us, period):
+    """The start of the period that epoch_us is in."""
+    return epoch_us - epoch_us % PERIOD_US[period]
+
+class Rollup(object):
+    """The summary of one period of a ping stream."""
+    def __init__(self, period, start_us):
+        self.period = period
+        self.start_us = start_us
+        self.probes = 0
+        self.replies = 0
+        self.late = 0
+        self.duplicates = 0
+        self.kinds = [0] * len(ps.CLASSIFICATIONS)
+        self.total = 0.0
+        self.histogram = LogHistogram.LogHistogram(HISTOGRAM_DIGITS)
+
+    def add_rtt(self, rtt):
+        """Note the RTT of a reply."""
+        self.total += rtt
+        self.histogram.record(rtt)
+
+    def merge(self, other):
+        """Add in another rollup (of a period within this one)."""
+        self.probes += other.probes
+        self.replies += other.replies
+        self.late += other.late
+        self.duplicates += other.duplicates
+        for (kind, count) in enumerate(other.kinds):
+            self.kinds[kind] += count
+        self.total += other.total
+        self.histogram.merge(other.histogram)
+
+    def get_lost(self):
+        """Fetch the probes of the period that had no reply in it."""
+        return max(self.probes - self.replies, 0)
+
+    def get_mean(self):
+        """Fetch the mean RTT, or None."""
+        if not self.histogram.n:
+            return None
+        return self.total / self.histogram.n
+
+    def get_percentile(self, percent):
+        """Approximate a percentile of the RTTs from the histogram."""
+        return self.histogram.percentiles([percent])[0]
+
+    def to_dict(self, host=None):
+        """The rollup as a dict, for a line of the rollup file."""
+        record = {
+                'period': self.period,
+                'start': ts.format_epoch_us(self.start_us),
+                'host': host,
+                'probes': self.probes,
+                'replies': self.replies,
+                'lost': self.get_lost(),
+                'late': self.late,
+                'duplicates': self.duplicates,
+                'kinds': dict((ps.CLASSIFICATIONS[kind], count)\
+                        for (kind, count) in enumerate(self.kinds) if count),
+                'rtt': {
+                        'n': self.histogram.n,
+                        'min': self.histogram.minimum,
+                        'mean': self.get_mean(),
+                        'max': self.histogram.maximum,
+                        'p95': self.get_percentile(95),
+                        'total': self.total
+                        },
+                'histogram': self.histogram.to_dict()
+                }
+        return record
+
+def from_dict(record):
+    """The Rollup of a line of the rollup file."""
+    rollup = Rollup(record['period'],\
+            ts.TimeStamp(record['start']).get_epoch_us())
+    rollup.probes = record['probes']
+    rollup.replies = record['replies']
+    rollup.late = record['late']
+    rollup.duplicates = record['duplicates']
+    for (name, count) in record['kinds'].iteritems():
+        rollup.kinds[ps.CLASSIFICATIONS.index(name)] = count
+    rollup.total = record['rtt']['total']
+    rollup.histogram = LogHistogram.from_dict(record['histogram'])
+    return rollup
+
+def read_rollups(path, period='minute'):
+    """The rollups of a period in a rollup file, in time order, each
+    line superseding any earlier one with the same start."""
+    rollups = {}
+    with open(path) as rollup_file:
+        for line in rollup_file:
+            if not line.endswith("\n"):
+                # cut short by a run that was killed
+                break
+            record = json.loads(line)
+            if record['period'] == period:
+                rollup = from_dict(record)
+                rollups[rollup.start_us] = rollup
+    return [rollups[start] for start in sorted(rollups)]
+
+def derive(rollups, period):
+    """Merge rollups (in time order) into rollups of a longer period."""
+    result = []
+    for rollup in rollups:
+        start = period_start(rollup.start_us, period)
+        if not result or result[-1].start_us != start:
+            result.append(Rollup(period, start))
+        result[-1].merge(rollup)
+    return result
+
+def last_starts(path):
+    """The start of the last rollup of each period at the end of a
+    rollup file."""
+    starts = {}
+    if not os.path.isfile(path):
+        return starts
+    with open(path) as rollup_file:
+        rollup_file.seek(0, os.SEEK_END)
+        size = rollup_file.tell()
+        rollup_file.seek(max(size - TAIL_BYTES, 0))
+        lines = rollup_file.read().split("\n")
+    if size > TAIL_BYTES:
+        # the first line is probably not whole
+        lines = lines[1:]
+    # the last is '' or cut short
+    for line in lines[:-1]:
+        record = json.loads(line)
+        start = ts.TimeStamp(record['start']).get_epoch_us()
+        starts[record['period']] = max(start,\
+                starts.get(record['period'], start))
+    return starts
+
+class RollupBuilder(object):
+    """Build the per minute and per hour rollups of a stream of records
+    and append them to a rollup file."""
+    def __init__(self, path, host=None):
+        self.path = path
+        self.host = host
+        self.tracker = SequenceTracker(ps.SEQUENCE_WINDOW)
+        # the probe (unwrapped) at the last timestamp, and its time
+        self.anchor_us = None
+        self.anchor_probe = None
+        self.highest = None
+        self.minute = None
+        # the last probe of the open minute
+        self.minute_last = None
+        self.hour = None
+        self.untimed = 0
+        self.written = 0
+        self.open_file()
+
+    def open_file(self):
+        """Open the rollup file to append to it."""
+        self.last = last_starts(self.path)
+        self.out = open(self.path, 'a', OUTPUT_BUFFER)
+
+    def __getstate__(self):
+        # The file stays behind in a checkpoint
+        state = self.__dict__.copy()
+        state.pop('out', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.out = None
+
+    def carry_on(self, previous):
+        """Pick up where the builder of an earlier run (from its
+        checkpoint) left off."""
+        if previous is None:
+            return
+        for name in ('tracker', 'anchor_us', 'anchor_probe', 'highest',\
+                'minute', 'minute_last', 'hour', 'untimed'):
+            setattr(self, name, getattr(previous, name))
+
+    def records(self, records):
+        """Generate the records, tallying each in the rollups."""
+        tracker = self.tracker
+        track = tracker.add
+        tally = self.tally
+        is_reply = ps.IS_REPLY
+        # the open minute, and its last probe, as of the last tally()
+        minute = self.minute
+        minute_last = self.minute_last
+        for record in records:
+            kind = record[0]
+            probe = None
+            status = None
+            if is_reply[kind]:
+                (probe, status) = track(record[1])
+                if kind == ps.NORMAL and not status and\
+                        minute_last is not None and probe <= minute_last and\
+                        probe == self.highest + 1:
+                    # the usual case, the next probe in the same minute:
+                    # tally() inline
+                    self.highest = probe
+                    minute.probes += 1
+                    minute.replies += 1
+                    minute.kinds[kind] += 1
+                    minute.total += record[3]
+                    minute.histogram.record(record[3])
+                    yield record
+                    continue
+            elif kind == ps.TIMEOUT and record[1] >= 0:
+                probe = tracker.sent(record[1])
+            elif kind == ps.TIMESTAMP:
+                self.anchor_us = ts.TimeStamp(record[5]).get_epoch_us()
+                self.anchor_probe = self.highest
+            elif kind == ps.INITIALIZATION:
+                tracker.restart()
+            tally(kind, probe, status, record[3])
+            minute = self.minute
+            minute_last = self.minute_last
+            yield record
+
+    def tally(self, kind, probe, status, rtt):
+        """Count a record in the rollup of its minute."""
+        probes = 0
+        if probe is not None:
+            if self.highest is None:
+                probes = 1
+                self.highest = probe
+            elif probe > self.highest:
+                probes = probe - self.highest
+                self.highest = probe
+        if self.anchor_us is None:
+            self.untimed += 1
+            return
+        if self.anchor_probe is None:
+            # a timestamp before any probe: the next one is a second on
+            if self.highest is None:
+                return
+            self.anchor_probe = self.highest - 1
+        time_us = self.anchor_us + (self.highest - self.anchor_probe) *\
+                1000000
+        start = period_start(time_us, 'minute')
+        minute = self.minute
+        if minute is not None and start < minute.start_us:
+            start = minute.start_us
+        if minute is None or minute.start_us != start:
+            self.close_minute()
+            minute = self.minute = Rollup('minute', start)
+        self.minute_last = self.anchor_probe + (start +\
+                PERIOD_US['minute'] - 1 - self.anchor_us) // 1000000
+        minute.probes += probes
+        minute.kinds[kind] += 1
+        if status is not None:
+            if status == NEW:
+                minute.replies += 1
+            elif status == REORDERED:
+                minute.late += 1
+            elif status == DUPLICATE:
+                minute.duplicates += 1
+            if status == NEW and kind != ps.NEGATIVERTT:
+                minute.add_rtt(rtt)
+
+    def write(self, rollup):
+        """Append a rollup to the file, unless the file already has a
+        later one of its period."""
+        if rollup.start_us < self.last.get(rollup.period, rollup.start_us):
+            return
+        # not sort_keys, which would keep json from its C encoder
+        self.out.write(json.dumps(rollup.to_dict(self.host)) + "\n")
+        self.written += 1
+
+    def close_minute(self):
+        """Write the minute, and add it to its hour."""
+        minute = self.minute
+        if minute is None:
+            return
+        self.write(minute)
+        self.minute = None
+        self.minute_last = None
+        start = period_start(minute.start_us, 'hour')
+        if self.hour is not None and self.hour.start_us != start:
+            self.write(self.hour)
+            self.hour = None
+        if self.hour is None:
+            self.hour = Rollup('hour', start)
+        self.hour.merge(minute)
+
+    def flush(self):
+        """Push out the rollups written so far."""
+        self.out.flush()
+
+    def finish(self):
+        """Write the open minute and hour and close the file.  They are
+        left open, so that a checkpointed run carries on with them."""
+        hour = self.hour
+        minute = self.minute
+        if minute is not None:
+            self.write(minute)
+            start = period_start(minute.start_us, 'hour')
+            if hour is not None and hour.start_us != start:
+                self.write(hour)
+                hour = None
+            merged = Rollup('hour', start)
+            if hour is not None:
+                merged.merge(hour)
+            merged.merge(minute)
+            hour = merged
+        if hour is not None:
+            self.write(hour)
+        self.out.close()
+
+def main():
+    """Main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# Rollup.py"
+    print "# Rollup.py: start: timestamp: " + ts0.get_timestamp()
+
+    # Two hours of minutes, merged into hours two ways
+    start_us = ts.TimeStamp("2017-12-28T23:00:00.000000").get_epoch_us()
+    minutes = []
+    for index in range(120):
+        minute = Rollup('minute', start_us + index * PERIOD_US['minute'])
+        for second in range(60):
+            minute.probes += 1
+            if (index + second) % 17:
+                minute.replies += 1
+                minute.kinds[ps.NORMAL] += 1
+                minute.add_rtt(20.0 + (index * 60 + second) % 97 / 4.0)
+            else:
+                minute.kinds[ps.TIMEOUT] += 1
+        minutes.append(minute)
+    hours = derive(minutes, 'hour')
+    for hour in hours:
+        print json.dumps(hour.to_dict('example.com'), sort_keys=True)[:160]
+    rtts = sorted(20.0 + second % 97 / 4.0 for second in range(3600))
+    print "p95: " + str(hours[0].get_percentile(95)) + " exact: " +\
+            str(rtts[int(0.95 * 3600) - 1])
+    day = derive(hours, 'day')[0]
+    again = from_dict(json.loads(json.dumps(day.to_dict())))
+    print "day: probes " + str(again.probes) + " lost " +\
+            str(again.get_lost()) + " mean " + str(again.get_mean()) +\
+            " same: " + str(again.to_dict() == day.to_dict())
+
+    # A builder over three minutes of pings, with a timestamp that pulls
+    # the time back across a minute boundary: no minute is written
+    # twice, and the minutes still add up to the hours
+    (handle, path) = tempfile.mkstemp(ROLLUP_SUFFIX)
+    os.close(handle)
+    builder = RollupBuilder(path, 'example.com')
+    stamps = {0: "2017-12-28T23:58:30.000000",\
+            100: "2017-12-28T23:59:50.000000"}
+    records = []
+    for seq in range(180):
+        if seq in stamps:
+            records.append((ps.TIMESTAMP, -1, -1, 0.0, None, stamps[seq]))
+        records.append((ps.NORMAL, seq, 64, 20.0 + seq % 7, None, None))
+    for record in builder.records(records):
+        pass
+    builder.finish()
+    starts = [json.loads(line)['start'] for line in open(path)\
+            if json.loads(line)['period'] == 'minute']
+    minutes = read_rollups(path)
+    hours = read_rollups(path, 'hour')
+    print "minutes: " + " ".join(start[11:16] for start in starts) +\
+            " written twice: " + str(len(starts) != len(set(starts)))
+    print "probes: minutes " + str(sum(m.probes for m in minutes)) +\
+            " derived hours " +\
+            str(sum(h.probes for h in derive(minutes, 'hour'))) +\
+            " hours " + str(sum(h.probes for h in hours)) + " (180)"
+    os.remove(path)
+
+    cputime_1 = psutil.Process().cpu_times()
+    print
+    ts1 = ts.TimeStamp()
+    print "# Rollup.py: end: timestamp: " + ts1.get_timestamp()
+    print "# Rollup.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# Rollup.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
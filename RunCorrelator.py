@@ -0,0 +1,294 @@
+""" RunCorrelator
+
+Correlate the ping streams of one pinger.py run: the canary outside,
+the ISP's terminal adapter and our own router, as described in the
+README.  The streams are merged on their inserted timestamps, and each
+outage (a period during which any stream is down) is attributed to the
+innermost layer that was down during it:
+
+    LAN        our router did not answer, so everything beyond it failed
+    ISP edge   the router answered but the ISP's terminal adapter did not
+    upstream   only destinations beyond the ISP failed
+
+Every stream is read lazily and the merge holds one event per stream,
+so memory does not grow with the length of the run or with the number
+of streams.  The changes before a stream's first timestamp wait for it,
+up to MAX_PENDING of them.  Past that each outage, a Down and the Up
+after it, is taken out as it ends; it can not be put in time or
+attributed to a layer, but it is reported, with its length in pings,
+as unattributed downtime, as are the outages of a stream that never
+has a timestamp.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] k-way merge of the state changes of the streams, with
+#                outages attributed to LAN, ISP edge or upstream.
+# 2026-10-18 [x] Bound the changes held for a stream's first timestamp.
+# 2026-10-18 [x] Report the outages that can not be timed as
+#                unattributed downtime.
+# 2026-10-18 [x] The kinds from PingState.py, not analyze_pings.py.
+#
+
+import PingState as ps
+import TimeStamp as ts
+
+import heapq
+
+# Layers, innermost first
+LAN = 0
+ISP_EDGE = 1
+UPSTREAM = 2
+LAYERS = ["LAN", "ISP edge", "upstream"]
+
+# Kinds that carry an icmp_seq, and so tell how far along a stream is
+SEQUENCED = [False] * len(ps.CLASSIFICATIONS)
+for _kind in [ps.DOWN, ps.NEGATIVERTT, ps.NORMAL, ps.ROUTE, ps.RTTTOOLONG,\
+        ps.TIMEOUT]:
+    SEQUENCED[_kind] = True
+
+# ping sends one request per second, so between timestamps the time of
+# a record is estimated from how far its icmp_seq is past the last one.
+PING_INTERVAL_US = 1000000
+
+# Changes held for the first timestamp of a stream, at most
+MAX_PENDING = 4096
+
+def time_at(anchor, position):
+    """Estimate the time of a record from its position (unwrapped
+    icmp_seq) and the last timestamp, (epoch_us, position)."""
+    if anchor[1] is None:
+        return anchor[0]
+    return anchor[0] + (position - anchor[1]) * PING_INTERVAL_US
+
+class RunCorrelator(object):
+    """RunCorrelator - merge and correlate the ping streams of a run."""
+    def __init__(self):
+        self.names = []
+        self.layers = []
+        self.sources = []
+        self.records = []
+        self.changes = []
+        self.untimed = []
+        # outages without a time, and their pings, of each stream
+        self.unattributed = []
+        self.unattributed_pings = []
+        self.outages = [0] * len(LAYERS)
+        self.outage_us = [0] * len(LAYERS)
+        self.linecount = 0
+
+    def add_stream(self, name, layer, records):
+        """Add a stream: its name, its layer and an iterable of records
+        (as from analyze_pings.scan_lines() or scan_mapped())."""
+        self.names.append(name)
+        self.layers.append(layer)
+        self.sources.append(records)
+        self.records.append(0)
+        self.changes.append(0)
+        self.untimed.append(0)
+        self.unattributed.append(0)
+        self.unattributed_pings.append(0)
+
+    def stream_events(self, stream):
+        """Generate (epoch_us, stream, up, kind) for each change in the
+        network state of one stream, in time order."""
+        records = 0
+        position = -1
+        offset = 0
+        last_seq = None
+        # (epoch_us, position) of the last timestamp.  The timestamp is
+        # written just before the next record, so its position is that
+        # of the next record with an icmp_seq.
+        anchor = None
+        last_time = None
+        up = None
+        pending = []
+        for (kind, seq, ttl, rtt, ip, text) in self.sources[stream]:
+            records += 1
+            if SEQUENCED[kind]:
+                if last_seq is not None and seq < last_seq - 32768:
+                    # icmp_seq rolled over at 65536
+                    offset += 65536
+                last_seq = seq
+                position = seq + offset
+                if anchor is not None and anchor[1] is None:
+                    anchor = (anchor[0], position)
+                    # changes before the first timestamp are timed from it
+                    for (at, change_up, change_kind) in pending:
+                        last_time = max(time_at(anchor, at), last_time)
+                        yield (last_time, stream, change_up, change_kind)
+                    pending = []
+            if kind == ps.TIMESTAMP:
+                anchor = (ts.TimeStamp(text).get_epoch_us(), None)
+                continue
+            if kind == ps.NORMAL:
+                is_up = True
+            elif ps.IS_DOWN[kind]:
+                is_up = False
+            else:
+                continue
+            if is_up == up:
+                continue
+            up = is_up
+            self.changes[stream] += 1
+            if anchor is None or pending:
+                if len(pending) < MAX_PENDING or not up:
+                    pending.append((position, up, kind))
+                else:
+                    # this Up ends the Down held last: take the outage
+                    # out, and the state is as it was before it
+                    self.unattribute(stream, position - pending.pop()[0])
+                continue
+            # times within a stream never go backwards
+            last_time = max(time_at(anchor, position), last_time)
+            yield (last_time, stream, up, kind)
+        self.records[stream] = records
+        self.linecount += records
+        self.untimed[stream] = len(pending)
+        # with no timestamp at all, the outages held are all unattributed
+        for (j, (at, change_up, change_kind)) in enumerate(pending):
+            if not change_up:
+                end = pending[j + 1][0] if j + 1 < len(pending) else\
+                        position + 1
+                self.unattribute(stream, end - at)
+
+    def unattribute(self, stream, pings):
+        """Count an outage of a stream that can not be timed."""
+        self.unattributed[stream] += 1
+        self.unattributed_pings[stream] += pings
+
+    def stream_list(self, streams):
+        """Names of a set of streams, in order."""
+        return ", ".join([self.names[j] for j in sorted(streams)])
+
+    def report_outage(self, start, end, layers, streams):
+        """Print an outage and count it against the innermost layer."""
+        layer = min(layers)
+        self.outages[layer] += 1
+        print "Outage: " + ts.format_epoch_us(start) + " - " +\
+                ts.format_epoch_us(end) +\
+                " [ " + str((end - start) / 1000000.0) + " ]"
+        print "   layer: " + LAYERS[layer]
+        print "   down: " + self.stream_list(streams)
+        self.outage_us[layer] += end - start
+
+    def run(self):
+        """Merge the streams and print each outage as it ends."""
+        merged = heapq.merge(*[self.stream_events(j) for j in\
+                range(len(self.sources))])
+        down = set()
+        layers = set()
+        streams = set()
+        start = None
+        time = None
+        for (time, stream, up, kind) in merged:
+            if not up:
+                if not down:
+                    start = time
+                    layers = set()
+                    streams = set()
+                down.add(stream)
+                layers.add(self.layers[stream])
+                streams.add(stream)
+            elif stream in down:
+                down.discard(stream)
+                if not down:
+                    self.report_outage(start, time, layers, streams)
+        if down:
+            print "Outage: " + ts.format_epoch_us(start) +\
+                    " - (still down at the end of the logs)"
+            print "   layer: " + LAYERS[min(layers)]
+            print "   down: " + self.stream_list(streams)
+
+    def report(self):
+        """Print the summary."""
+        print "streams " + str(len(self.names))
+        for j in range(len(self.names)):
+            print self.names[j] + ":"
+            print "   layer: " + LAYERS[self.layers[j]]
+            print "   records: " + str(self.records[j])
+            print "   state changes: " + str(self.changes[j])
+            if self.untimed[j]:
+                print "   untimed changes (no timestamps): " +\
+                        str(self.untimed[j])
+            if self.unattributed[j]:
+                print "   unattributed outages (no time for them): " +\
+                        str(self.unattributed[j]) + " [ " +\
+                        str(self.unattributed_pings[j] *\
+                        PING_INTERVAL_US / 1000000.0) + " ]"
+        for layer in range(len(LAYERS)):
+            print "Outages " + LAYERS[layer] + ": " +\
+                    str(self.outages[layer]) + " [ " +\
+                    str(self.outage_us[layer] / 1000000.0) + " ]"
+        # the downtime of each stream on its own: it may overlap the
+        # outages above, and other streams'
+        print "Outages unattributed: " + str(sum(self.unattributed)) +\
+                " [ " + str(sum(self.unattributed_pings) *\
+                PING_INTERVAL_US / 1000000.0) + " ]"
+
+def host_layers(config):
+    """Map host name to layer from the [layers] section of a pinger
+    configuration; hosts that are not listed are upstream."""
+    result = {}
+    for (option, layer) in [('lan', LAN), ('isp_edge', ISP_EDGE)]:
+        if config.has_option('layers', option):
+            for host in config.get('layers', option).split(","):
+                result[host.strip()] = layer
+    return result
+
+def main():
+    """Main routine - just for testing."""
+    import analyze_pings as ap
+
+    def log(name, lost):
+        """A minute of pings, losing the ones in lost."""
+        lines = ["PING " + name + " (10.0.0.1): 56 data bytes"]
+        for j in range(60):
+            if not j % 16:
+                lines.append("# timestamp: pid-1: 2017-12-28T23:59:" +\
+                        str(j).zfill(2) + ".000000")
+            if j in lost:
+                lines.append("Request timeout for icmp_seq " + str(j))
+            else:
+                lines.append("64 bytes from 10.0.0.1: icmp_seq=" + str(j) +\
+                        " ttl=64 time=1.0 ms")
+        return [ap.classify(None, line, 0, 250) for line in lines]
+
+    correlator = RunCorrelator()
+    # the canary loses pings when the ISP does, and once on its own
+    correlator.add_stream("panix.com", UPSTREAM,\
+            log("panix.com", range(10, 14) + range(40, 42)))
+    correlator.add_stream("gateway.donner.lan", ISP_EDGE,\
+            log("gateway.donner.lan", range(11, 13)))
+    correlator.add_stream("192.168.1.1", LAN, log("192.168.1.1", []))
+    correlator.run()
+    correlator.report()
+
+    # A stream that flaps long before its first timestamp holds no more
+    # than MAX_PENDING changes, is down at the end as it should be, and
+    # its outages are either timed or unattributed; a stream with no
+    # timestamp at all has only unattributed ones
+    flapping = [(ps.TIMEOUT if j % 2 else ps.NORMAL, j % 65536, 64, 1.0,\
+            "10.0.0.1", None) for j in range(3 * MAX_PENDING)]
+    correlator = RunCorrelator()
+    correlator.add_stream("flapping", UPSTREAM, flapping + [(ps.TIMESTAMP,\
+            -1, -1, -1.0, None, "2017-12-29T00:00:00.000000"),\
+            (ps.TIMEOUT, 3 * MAX_PENDING, -1, -1.0, None, None)])
+    correlator.add_stream("untimed", UPSTREAM, flapping)
+    events = list(correlator.stream_events(0))
+    list(correlator.stream_events(1))
+    timed = sum(1 for event in events if not event[2])
+    print "flapping: changes " + str(correlator.changes[0]) + " timed " +\
+            str(len(events)) + " down at the end: " +\
+            str(not events[-1][2]) + " outages: timed " + str(timed) +\
+            " + unattributed " + str(correlator.unattributed[0]) + " = " +\
+            str(timed + correlator.unattributed[0]) + " of " +\
+            str(3 * MAX_PENDING // 2)
+    print "untimed: outages " + str(correlator.unattributed[1]) +\
+            " pings " + str(correlator.unattributed_pings[1]) + " of " +\
+            str(3 * MAX_PENDING // 2)
+
+if __name__ == '__main__':
+    main()
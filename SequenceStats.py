@@ -5,8 +5,11 @@ relevant statistics.
 
 """
 
+from LogHistogram import LogHistogram
+from QuantileSketch import QuantileSketch
 import TimeStamp as ts
 
+import array
 import json
 import numpy as np
 import psutil
@@ -16,11 +19,26 @@ import re
 # Roadmap
 # 
 # 2017-12-27 [x] Separate the SequenceStats class into its own module.
+# 2026-10-18 [x] Keep the non-incremental history in an array('d') and
+#                cache the ndarray and its stats until the next value.
+# 2026-10-18 [x] Optional QuantileSketch for percentiles in bounded
+#                memory, usable with incremental mode.
+# 2026-10-18 [x] Optional LogHistogram: the shape of the distribution,
+#                and percentiles, in fixed memory, merging exactly.
 #
 
 class SequenceStats(object):
-    """Accumulate statistics on a sequence of reals."""
-    def __init__(self, value, incremental=True):
+    """Accumulate statistics on a sequence of reals.
+
+    incremental=False keeps the whole history for exact numpy stats.
+    sketch_k > 0 also feeds a QuantileSketch of that size, which gives
+    percentiles in fixed memory even in incremental mode.
+    histogram_digits > 0 also feeds a LogHistogram to that many
+    significant digits, which merges exactly across chunks, files and
+    days; the sketch, if there is one, still gives the percentiles.
+    """
+    def __init__(self, value, incremental=True, sketch_k=0,\
+            histogram_digits=0):
         self.incremental = incremental
         # print "self.incremental: " + str(self.incremental)
         # Initialize stats structure
@@ -36,11 +54,22 @@ class SequenceStats(object):
         self.minimum = float(value)
         self.maximum = float(value)
         # non-Incremental
+        # The history is a packed array of doubles rather than a list of
+        # float objects, which is about a quarter of the memory.  narray
+        # and nstats are a cache, dropped whenever a value is added.
         if not self.incremental:
-            self.history = []
+            self.history = array.array('d')
             self.history.append(float(value))
             self.narray = None
             self.nstats = {}
+        self.sketch = None
+        if sketch_k:
+            self.sketch = QuantileSketch(sketch_k)
+            self.sketch.update(float(value))
+        self.histogram = None
+        if histogram_digits:
+            self.histogram = LogHistogram(histogram_digits)
+            self.histogram.record(float(value))
 
     def accumulate(self, value):
         """Accept a data value and add them to the stats."""
@@ -69,15 +98,116 @@ class SequenceStats(object):
         # non-Incremental here ...
         if not self.incremental:
             self.history.append(value)
+            self.narray = None
+        if self.sketch is not None:
+            self.sketch.update(float(value))
+        if self.histogram is not None:
+            self.histogram.record(float(value))
+
+    def combine(self, n, mean, M2, minimum, maximum):
+        """Fold in the moments of a batch of n values (Chan et al.)."""
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / float(total)
+        self.M2 += M2 + delta * delta * self.n * n / float(total)
+        self.n = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def accumulate_array(self, values):
+        """Accumulate a numpy array of values in one go.
+
+        The moments of the batch are computed with numpy and combined
+        with combine(), so this agrees with accumulating the values one
+        at a time to within floating point rounding.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        mean = float(np.mean(values))
+        self.combine(len(values), mean,\
+                float(np.sum((values - mean) ** 2)),\
+                float(np.min(values)), float(np.max(values)))
+        if not self.incremental:
+            self.history.fromstring(values.tostring())
+            self.narray = None
+        if self.sketch is not None:
+            self.sketch.update_many(values.tolist())
+        if self.histogram is not None:
+            self.histogram.record_many(values)
+
+    def __getstate__(self):
+        """Pickle the history as raw bytes, and without the cache."""
+        state = self.__dict__.copy()
+        if not self.incremental:
+            state['history'] = self.history.tostring()
+            state['narray'] = None
+            state['nstats'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'histogram' not in state:
+            # pickled before the histogram
+            self.histogram = None
+        if not self.incremental:
+            self.history = array.array('d')
+            self.history.fromstring(state['history'])
 
     def build_narray(self):
-        """Construct the numpy array for non-incremental stats."""
-        self.narray = np.array(self.history)
+        """Construct the numpy array for non-incremental stats.
+
+        Does nothing if the cached array is still current.
+        """
+        if self.narray is not None:
+            return
+        # Copy rather than view the history: the array may be
+        # reallocated as it grows.
+        self.narray = np.frombuffer(self.history, dtype=np.float64).copy()
         # While we're at it, calculate the stats.
+        self.nstats = {}
         self.nstats['mean'] = np.mean(self.narray)
         self.nstats['variance'] = np.var(self.narray)
         self.nstats['n'] = len(self.history)
 
+    def get_narray(self):
+        """Fetch the history as a numpy array (non-incremental only)."""
+        if self.incremental:
+            return None
+        self.build_narray()
+        return self.narray
+
+    def get_percentiles(self, percents):
+        """Fetch percentiles (0 - 100), from the sketch if there is one,
+        else the histogram, else the history (non-incremental only)."""
+        if self.sketch is not None:
+            return self.sketch.percentiles(percents)
+        if self.histogram is not None:
+            return self.histogram.percentiles(percents)
+        if self.incremental:
+            return None
+        self.build_narray()
+        return list(np.percentile(self.narray, percents))
+
+    def get_median(self):
+        """Fetch the median of the history (non-incremental only)."""
+        if self.incremental:
+            return None
+        self.build_narray()
+        if 'median' not in self.nstats:
+            self.nstats['median'] = np.median(self.narray)
+        return self.nstats['median']
+
+    def get_mad(self):
+        """Fetch the median absolute deviation from the median
+        (non-incremental only)."""
+        if self.incremental:
+            return None
+        median = self.get_median()
+        if 'mad' not in self.nstats:
+            self.nstats['mad'] = np.median(np.abs(self.narray - median))
+        return self.nstats['mad']
+
     def get_mean(self):
         """Fetch the mean."""
         if not self.incremental:
@@ -93,10 +223,14 @@ class SequenceStats(object):
             return [self.M2 / (self.n - 1), self.nstats['variance']]
         else:
             if self.n < 2:
-                return float(nan)
+                return float('nan')
             else:
                 return self.M2 / (self.n - 1)
 
+    def get_histogram(self):
+        """Fetch the LogHistogram, or None."""
+        return self.histogram
+
     def get_minimum(self):
         """Fetch the minimum."""
         return self.minimum
@@ -105,18 +239,23 @@ class SequenceStats(object):
         """Fetch the maximum."""
         return self.maximum
 
-    def __str__(self):
+    def get_summary(self):
+        """Fetch the statistics as a list of dicts, as __str__ prints
+        them."""
         if self.incremental:
             stats = {
                     "incremental": str(self.incremental),
                     "n": self.n,
-                    "len(history)": len(self.history),
                     "minimum": self.minimum,
-                    "maximum": self.maximum
+                    "maximum": self.maximum,
+                    "mean": self.get_mean(),
+                    "variance": self.get_variance()
                     }
-            return json.dumps(\
-                    [stats, self.current],\
-                    indent=2, separators=(',', ': '))
+            if self.sketch is not None:
+                stats["sketch"] = str(self.sketch)
+            if self.histogram is not None:
+                stats["histogram"] = str(self.histogram)
+            return [stats]
         else:
             stats = {
                     "incremental": str(self.incremental),
@@ -126,15 +265,17 @@ class SequenceStats(object):
                     "mean": self.get_mean(),
                     "variance": self.get_variance()
                     }
-            return json.dumps(\
-                    [stats, self.nstats],\
-                    indent=2, separators=(',', ': '))
+            return [stats, self.nstats]
+
+    def __str__(self):
+        return json.dumps(self.get_summary(), indent=2,\
+                separators=(',', ': '))
 
 def main():
     """Main body."""
 
     # capture timing information
-    cputime_0 = psutil.cpu_times()
+    cputime_0 = psutil.Process().cpu_times()
 
     # Self-identification for the run
     # This gives us YYYY-MM-DDTHH:MM:SS+HH:MM
@@ -213,19 +354,52 @@ def main():
     print "incremental mean2: " + str(ss2.get_mean())
     print "incremental variance2: " + str(ss2.get_variance())
 
-    cputime_1 = psutil.cpu_times()
+    # Non-incremental: the numpy stats come from the history
+    print
+    ss3 = SequenceStats(data2[0], False)
+    for j in range(1,10):
+        ss3.accumulate(data2[j])
+    print "non-incremental mean2: " + str(ss3.get_mean())
+    print "non-incremental variance2: " + str(ss3.get_variance())
+    print "percentiles [50, 90, 99]: " +\
+            str(ss3.get_percentiles([50, 90, 99]))
+    print "median: " + str(ss3.get_median())
+    print "MAD: " + str(ss3.get_mad())
+
+    # Incremental with a quantile sketch
+    print
+    ss4 = SequenceStats(data1[0], True, 200)
+    for j in range(1,124):
+        ss4.accumulate(data1[j])
+    print "sketch percentiles [50, 90, 99]: " +\
+            str(ss4.get_percentiles([50, 90, 99]))
+    print "numpy percentiles [50, 90, 99]: " +\
+            str(list(np.percentile(np_data1, [50, 90, 99])))
+    print "ss4: " + str(ss4)
+
+    # Incremental with a histogram, the second half in one go
+    print
+    ss5 = SequenceStats(data1[0], True, 0, 2)
+    for j in range(1,62):
+        ss5.accumulate(data1[j])
+    ss5.accumulate_array(data1[62:])
+    print "histogram percentiles [50, 90, 99]: " +\
+            str(ss5.get_percentiles([50, 90, 99]))
+    print "ss5: " + str(ss5)
+
+    cputime_1 = psutil.Process().cpu_times()
     print
     # index 0 is user
-    # index 1 is nice
-    # index 2 is system
-    # index 3 is idle
+    # index 1 is system
+    # index 2 is children's user
+    # index 3 is children's system
 
     ts1 = ts.TimeStamp()
     print "# SequenceStats.py: end: timestamp: " + ts1.get_timestamp()
     print "# SequenceStats.py: User time: " +\
             str(cputime_1[0] - cputime_0[0]) + " S"
     print "# SequenceStats.py: System time: " +\
-            str(cputime_1[2] - cputime_0[2]) + " S"
+            str(cputime_1[1] - cputime_0[1]) + " S"
 
 if __name__ == '__main__':
     main()
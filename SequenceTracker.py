@@ -0,0 +1,239 @@
+""" SequenceTracker
+
+Class to follow the 16 bit icmp_seq numbers of a ping stream: unwrap
+them into a count that keeps going past 65535, and count the probes
+lost, duplicated and reordered.
+
+Each sequence number is unwrapped to the value nearest the last one
+seen, so a rollover is noticed even when probe 0 itself is lost.  A
+new ping (a 'PING ' header in the middle of a log) carries on right
+after the highest number so far.  Whether each of the last window
+probes has been answered is kept in a bitmap (a bytearray used as a
+ring), so memory is O(window) however long the stream:
+    new          a number higher than any before
+    reordered    an unanswered number still in the window
+    duplicate    an answered number still in the window
+    stale        a number too old for the window, or from before the
+                 stream started: it can not be told which it is
+A probe is lost if it has not been answered by the time it leaves the
+window (or by the end).
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Unwrap robustly, and count loss, duplicates and
+#                reordering in a sliding bitmap window, for
+#                analyze_pings.py.
+#
+
+import json
+import psutil
+
+import TimeStamp as ts
+
+# What add() says about a reply
+NEW = 0
+REORDERED = 1
+DUPLICATE = 2
+STALE = 3
+
+STATUSES = ["new", "reordered", "duplicate", "stale"]
+
+class SequenceTracker(object):
+    """Follow a stream of sequence numbers modulo modulus, with a bitmap
+    of the last window of them."""
+    def __init__(self, window=1024, modulus=65536):
+        self.window = window
+        self.modulus = modulus
+        self.half = modulus // 2
+        self.seen = bytearray(window)
+        # unwrapped: the first tracked, the highest and the last seen;
+        # and the last as it was seen
+        self.base = None
+        self.highest = None
+        self.last = None
+        self.last_raw = None
+        self.restarting = False
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.stale = 0
+        self.restarts = 0
+        self.gaps = 0
+
+    def restart(self):
+        """A new ping has started: its first number follows on from the
+        highest so far, whatever it is."""
+        if self.last is not None:
+            self.restarting = True
+
+    def resume(self, unwrapped, raw):
+        """Start tracking after unwrapped (raw as seen), as if the stream
+        before it had not been tracked."""
+        self.base = unwrapped + 1
+        self.highest = unwrapped
+        self.last = unwrapped
+        self.last_raw = raw
+        self.seen = bytearray(self.window)
+
+    def unwrap(self, seq):
+        """The unwrapped value of seq, the one nearest the last seen."""
+        if self.last is None:
+            self.base = seq
+            self.highest = seq - 1
+            return seq
+        if self.restarting:
+            self.restarting = False
+            self.restarts += 1
+            return self.highest + 1
+        return self.last +\
+                (seq - self.last_raw + self.half) % self.modulus - self.half
+
+    def add(self, seq):
+        """Note a reply to probe seq.  Returns (unwrapped, status), the
+        status being NEW, REORDERED, DUPLICATE or STALE."""
+        last = self.last
+        if last is None or self.restarting:
+            unwrapped = self.unwrap(seq)
+        else:
+            unwrapped = last +\
+                    (seq - self.last_raw + self.half) % self.modulus -\
+                    self.half
+        self.last = unwrapped
+        self.last_raw = seq
+        if unwrapped == self.highest + 1:
+            # the usual case, the next probe: advance() inline
+            slot = unwrapped % self.window
+            if not self.seen[slot] and unwrapped - self.window >= self.base:
+                self.lost += 1
+            self.seen[slot] = 1
+            self.highest = unwrapped
+            self.received += 1
+            return (unwrapped, NEW)
+        if unwrapped > self.highest:
+            self.advance(unwrapped)
+            self.seen[unwrapped % self.window] = 1
+            self.received += 1
+            return (unwrapped, NEW)
+        if unwrapped <= self.highest - self.window or unwrapped < self.base:
+            self.stale += 1
+            return (unwrapped, STALE)
+        slot = unwrapped % self.window
+        if self.seen[slot]:
+            self.duplicates += 1
+            return (unwrapped, DUPLICATE)
+        self.seen[slot] = 1
+        self.reordered += 1
+        self.received += 1
+        return (unwrapped, REORDERED)
+
+    def sent(self, seq):
+        """Note that probe seq was sent and not answered (a timeout).
+        Returns the unwrapped seq."""
+        unwrapped = self.unwrap(seq)
+        self.last = unwrapped
+        self.last_raw = seq
+        if unwrapped > self.highest:
+            self.advance(unwrapped)
+        return unwrapped
+
+    def advance(self, unwrapped):
+        """Move the window up to unwrapped, counting the probes that
+        leave it unanswered as lost.  The probes coming into it are not
+        answered (yet)."""
+        window = self.window
+        seen = self.seen
+        jump = unwrapped - self.highest
+        if jump >= window:
+            # everything in the window leaves it
+            self.lost += self.pending() + jump - window
+            self.seen = bytearray(window)
+        else:
+            base = self.base
+            for number in xrange(self.highest + 1, unwrapped + 1):
+                slot = number % window
+                if number - window >= base and not seen[slot]:
+                    self.lost += 1
+                seen[slot] = 0
+        self.highest = unwrapped
+
+    def pending(self):
+        """The unanswered probes still in the window."""
+        if self.highest is None:
+            return 0
+        first = max(self.base, self.highest - self.window + 1)
+        if first > self.highest:
+            return 0
+        window = self.window
+        return sum(1 for number in xrange(first, self.highest + 1)\
+                if not self.seen[number % window])
+
+    def get_lost(self):
+        """Fetch the probes lost, counting the unanswered ones in the
+        window as lost."""
+        return self.lost + self.pending()
+
+    def summary(self):
+        """The counts, as a dict."""
+        return {
+                'window': self.window,
+                'received': self.received,
+                'lost': self.get_lost(),
+                'duplicates': self.duplicates,
+                'reordered': self.reordered,
+                'stale': self.stale,
+                'restarts': self.restarts,
+                'gaps': self.gaps
+                }
+
+    def __str__(self):
+        return json.dumps(self.summary(), indent=2, separators=(',', ': '),\
+                sort_keys=True)
+
+def main():
+    """Main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# SequenceTracker.py"
+    print "# SequenceTracker.py: start: timestamp: " + ts0.get_timestamp()
+
+    # Across a rollover with probe 0 lost, 5 and 6 swapped, 9 twice,
+    # 20 - 29 lost, and then a probe far too late
+    tracker = SequenceTracker(8)
+    numbers = range(65530, 65536) + [1, 2, 3, 4, 6, 5, 7, 8, 9, 9] +\
+            range(10, 20) + range(30, 40) + [65533]
+    statuses = []
+    for seq in numbers:
+        (unwrapped, status) = tracker.add(seq)
+        statuses.append(str(unwrapped) + ":" + STATUSES[status])
+    print " ".join(statuses)
+    print "highest: " + str(tracker.highest) + " (65536 + 39)"
+    print "tracker: " + str(tracker)
+
+    # A long run, then a gap longer than the window
+    tracker = SequenceTracker(8)
+    tracker.add(0)
+    for seq in range(1, 1000):
+        tracker.add(seq)
+    print "run to: " + str(tracker.highest) + " lost: " +\
+            str(tracker.get_lost())
+    tracker.add(1100)
+    print "after a gap of 100: lost: " + str(tracker.get_lost())
+
+    cputime_1 = psutil.Process().cpu_times()
+    print
+    ts1 = ts.TimeStamp()
+    print "# SequenceTracker.py: end: timestamp: " + ts1.get_timestamp()
+    print "# SequenceTracker.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# SequenceTracker.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
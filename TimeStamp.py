@@ -11,48 +11,84 @@ that.
 """
 
 # Roadmap
-# 
-# 2017-12-25 [ ] Do the right thing with differences of more than a day
+#
+# 2017-12-25 [x] Do the right thing with differences of more than a day
 #                This involves using my JDN (Julian Day Number) stuff
 #                to get accurate differences between Gregorian dates.
+#                [Done] 2026-10-18 - a TimeStamp is epoch microseconds.
+# 2026-10-18 [x] Compile the patterns once, __slots__, and parse_many()
+#                for a whole column of timestamps at once.
 #
 
 import re
 import datetime as datetime
+import numpy as np
+
+# YYYY-MM-DD
+TIMESTAMP_PATTERN = '(\d{4})-(\d{2})-(\d{2})'
+# Thh:mm:ss
+TIMESTAMP_PATTERN += 'T(\d{2}):(\d{2}):(\d{2})'
+# (microseconds) - isoformat() leaves them out when they are zero
+TIMESTAMP_PATTERN += '(?:\.(\d{1,6}))?'
+timestamp_re = re.compile(TIMESTAMP_PATTERN)
+
+# This is here just for the ping analyzer system
+RECOGNIZER_PATTERN = "# timestamp: \S+: \d{4}-\d{2}-\d{2}"
+RECOGNIZER_PATTERN += "T\d{2}:\d{2}:\d{2}\.\d{6}"
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
 
 class TimeStamp(object):
-    """TimeStamp - timestamp object - various operations."""
+    """TimeStamp - timestamp object - various operations.
+
+    Parsing is lazy.  Once parsed, a TimeStamp also holds epoch_us, the
+    time in integer microseconds since 1970-01-01T00:00:00.  The
+    timestamps carry no zone and none is assumed.
+    """
+    __slots__ = ('timestamp', 'parsed', 'year', 'month', 'day',\
+            'hour', 'minute', 'second', 'microseconds', 'epoch_us')
+
+    pattern = TIMESTAMP_PATTERN
+    re_prefix = RECOGNIZER_PATTERN
 
     def __init__(self, ts='now'):
-        # YYYY-MM-DD
-        self.pattern = '(\d{4})-(\d{2})-(\d{2})'
-        # Thh:mm:ss
-        self.pattern += 'T(\d{2}):(\d{2}):(\d{2})'
-        # (microseconds)
-        self.pattern += '\.(\d{6})'
-        # This is here just for the ping analyzer system
-        self.re_prefix = "# timestamp: \S+: \d{4}-\d{2}-\d{2}"
-        self.re_prefix += "T\d{2}:\d{2}:\d{2}\.\d{6}"
         # initialize with the timestamp passed, or now
-        if ts=='now': 
-            self.timestamp = datetime.datetime.isoformat(\
-                                datetime.datetime.today())
+        if ts=='now':
+            now = datetime.datetime.today()
+            self.timestamp = datetime.datetime.isoformat(now)
+            self.set_parts(now.year, now.month, now.day,\
+                    now.hour, now.minute, now.second, now.microsecond)
         else:
             self.timestamp = ts
-        self.parsed = False
+            self.parsed = False
 
     def get_recognizer_re(self):
         """Give back a recognizer regular expression."""
         return self.re_prefix
 
-    def parse_ts(self):
-        """Pick the timestamp apart into components."""
+    def set_parts(self, year, month, day, hour, minute, second,\
+            microseconds):
+        """Set the seven parts, and epoch_us from them."""
         (self.year, self.month, self.day,\
             self.hour, self.minute, self.second, self.microseconds) = \
-            [int(re.match(self.pattern, self.timestamp).group(k))\
-                for k in range(1,8)]
+            (year, month, day, hour, minute, second, microseconds)
+        days = datetime.date(year, month, day).toordinal() - EPOCH_ORDINAL
+        self.epoch_us = (((days * 24 + hour) * 60 + minute) * 60 +\
+                second) * 1000000 + microseconds
         self.parsed = True
 
+    def parse_ts(self):
+        """Pick the timestamp apart into components."""
+        match = timestamp_re.match(self.timestamp)
+        if match is None:
+            raise ValueError("not a timestamp: '" + self.timestamp + "'")
+        (year, month, day, hour, minute, second, fraction) = match.groups()
+        microseconds = 0
+        if fraction:
+            microseconds = int(fraction.ljust(6, '0'))
+        self.set_parts(int(year), int(month), int(day),\
+                int(hour), int(minute), int(second), microseconds)
+
     def get_parts(self):
         """Return all seven parts in a vector."""
         if not self.parsed:
@@ -65,6 +101,12 @@ class TimeStamp(object):
         """Get the raw timestamp back."""
         return self.timestamp
 
+    def get_epoch_us(self):
+        """Return the time in microseconds since the epoch."""
+        if not self.parsed:
+            self.parse_ts()
+        return self.epoch_us
+
     def get_year(self):
         """Return the year component."""
         if not self.parsed:
@@ -108,23 +150,16 @@ class TimeStamp(object):
         return self.microseconds
 
     def minus_small(self, ts):
-        """Subtract one timestamp from another."""
-        minuend = self.get_parts()
-        subtrahend = ts.get_parts()
-        difference = [minuend[i] - subtrahend[i] for i in range(7)]
-        fail = difference[0] + difference[1] + difference[2]
-        diff = 0
-        if not fail:
-            diff = difference[3]
-            # diff is in hours now
-            diff = 60 * diff + difference[4]
-            # diff is in minutes now
-            diff = 60 * diff + difference[5]
-            # diff is in seconds now
-            diff += difference[6] / 1000000.0
-        else:
-            print "Tell Donner to implement long differences."
-        return diff
+        """Subtract one timestamp from another, giving seconds.
+
+        Good across days, months and years.  Whole seconds and
+        microseconds are subtracted separately, so the result within a
+        day is exactly what it has always been.
+        """
+        (seconds, microseconds) = divmod(self.get_epoch_us(), 1000000)
+        (ts_seconds, ts_microseconds) = divmod(ts.get_epoch_us(), 1000000)
+        return (seconds - ts_seconds) +\
+                (microseconds - ts_microseconds) / 1000000.0
 
     def __str__(self):
         if not self.parsed:
@@ -134,24 +169,108 @@ class TimeStamp(object):
                 self.hour, self.minute, self.second,\
                 self.microseconds])
 
+def format_epoch_us(epoch_us):
+    """The timestamp string for a time in epoch microseconds."""
+    return datetime.datetime.isoformat(datetime.datetime(1970, 1, 1) +\
+            datetime.timedelta(microseconds=epoch_us))
+
+# Character positions of the fields in YYYY-MM-DDThh:mm:ss.uuuuuu
+BULK_WIDTH = 26
+BULK_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18,\
+        20, 21, 22, 23, 24, 25]
+BULK_SEPARATORS = [(4, '-'), (7, '-'), (10, 'T'), (13, ':'), (16, ':'),\
+        (19, '.')]
+
+def days_from_civil(year, month, day):
+    """Days since 1970-01-01 of Gregorian dates, for numpy arrays.
+
+    Howard Hinnant's algorithm: count in 400 year eras, with the year
+    starting in March so that the leap day comes last.
+    """
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 +\
+            day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 -\
+            year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+def parse_many(timestamps):
+    """Parse a sequence of timestamp strings into an int64 numpy array of
+    epoch microseconds, all at once.
+
+    Strings in the usual YYYY-MM-DDThh:mm:ss.uuuuuu form are picked
+    apart as a character matrix; any others are parsed one at a time.
+    Raises ValueError for anything that is not a timestamp.
+    """
+    text = np.array(timestamps, dtype=str)
+    if not len(text):
+        return np.zeros(0, dtype=np.int64)
+    if text.dtype.itemsize != BULK_WIDTH or\
+            (np.char.str_len(text) != BULK_WIDTH).any():
+        return np.array([TimeStamp(t).get_epoch_us() for t in timestamps],\
+                dtype=np.int64)
+    chars = text.view(np.uint8).reshape(len(text), BULK_WIDTH)
+    digits = chars[:, BULK_DIGITS].astype(np.int64) - ord('0')
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    for (position, separator) in BULK_SEPARATORS:
+        valid &= chars[:, position] == ord(separator)
+    weights = 10 ** np.arange(5, -1, -1)
+
+    def field(first, width):
+        return digits[:, first:first + width].dot(weights[6 - width:])
+
+    (year, month, day) = (field(0, 4), field(4, 2), field(6, 2))
+    (hour, minute, second) = (field(8, 2), field(10, 2), field(12, 2))
+    microseconds = field(14, 6)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) &\
+            (hour < 24) & (minute < 60) & (second < 61)
+    days = days_from_civil(year, month, day)
+    # the first of the next month tells how long this one is
+    next_month = days_from_civil(year + (month == 12), month % 12 + 1, 1)
+    valid &= days < next_month
+    if not valid.all():
+        bad = timestamps[int(np.flatnonzero(~valid)[0])]
+        raise ValueError("not a timestamp: '" + bad + "'")
+    return (((days * 24 + hour) * 60 + minute) * 60 + second) * 1000000 +\
+            microseconds
+
 def main():
     """Main routine - just for testing."""
-    
+
     print "TimeStamp Class test...\n"
 
     ts0 = TimeStamp('2017-12-28T12:46:18.734556')
     print "ts0: " + str(ts0)
 
     print "ts0.get_parts(): " + str(ts0.get_parts())
+    print "ts0.get_epoch_us(): " + str(ts0.get_epoch_us())
 
     # Another timestamp - just now
     ts1 = TimeStamp()
     print "ts1: " + str(ts1)
 
-    # Difference in seconds between the two timestamps ...
-    # Only works if they are in the same day
+    # Difference in seconds between the two timestamps
     print "difference ts1 - ts0: " + str(ts1.minus_small(ts0))
 
+    # ... across midnight, and across a leap day and a year end
+    ts2 = TimeStamp('2017-12-29T00:00:01.000001')
+    print "difference ts2 - ts0: " + str(ts2.minus_small(ts0))
+    ts3 = TimeStamp('2019-03-01T00:00:00.000000')
+    ts4 = TimeStamp('2020-03-01T00:00:00.000000')
+    print "difference ts4 - ts3 (days): " +\
+            str(ts4.minus_small(ts3) / 86400)
+
+    # A whole column at once
+    column = [ts0.get_timestamp(), ts2.get_timestamp(),\
+            ts3.get_timestamp(), ts4.get_timestamp()]
+    bulk = parse_many(column)
+    print "parse_many(): " + str(bulk.tolist())
+    print "   agrees: " +\
+            str(bulk.tolist() == [TimeStamp(t).get_epoch_us() for t in column])
+    print "format_epoch_us(): " + format_epoch_us(bulk[1])
+
     # Ping Analyzer timestamp comment
     # this will succeed
     sample_ts = "# timestamp: pid-23118: 2017-12-28T20:53:41.148740"
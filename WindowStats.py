@@ -0,0 +1,197 @@
+""" WindowStats
+
+Class to keep statistics over a sliding window of a series of real
+values: the last size values, or those of the last seconds seconds.
+
+Every statistic is kept up to date as values come and go, so asking
+for one never rescans the window:
+    mean, variance   Welford's update, run backwards to remove a value
+    min, max         monotonic deques of the values that can still be
+                     the min (or max) of some later window
+    median           the window kept sorted, with bisect
+Adding a value (and dropping the one that falls out) is O(1) for the
+moments and the extremes, and an O(log N) search plus a memmove for the
+order statistics.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Sliding window stats for an adaptive RTTTooLong
+#                threshold in analyze_pings.py.
+#
+
+import bisect
+import collections
+import json
+import numpy as np
+import psutil
+
+import TimeStamp as ts
+
+class WindowStats(object):
+    """Statistics over the last size values and/or the last seconds
+    seconds (a value's time is given to accumulate()).  0 means no
+    limit of that kind."""
+    def __init__(self, size=0, seconds=0):
+        self.size = size
+        self.seconds = seconds
+        self.count = 0
+        # (index, value, time) of each value in the window, oldest first
+        self.window = collections.deque()
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        # (index, value), with values increasing (minima) or
+        # decreasing (maxima) from the oldest
+        self.minima = collections.deque()
+        self.maxima = collections.deque()
+        self.ordered = []
+
+    def accumulate(self, value, when=None):
+        """Add a value (at time when), dropping those that fall out."""
+        value = float(value)
+        index = self.count
+        self.count += 1
+        self.window.append((index, value, when))
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.M2 += delta * (value - self.mean)
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((index, value))
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((index, value))
+        bisect.insort(self.ordered, value)
+        if self.size:
+            while self.n > self.size:
+                self.drop()
+        if self.seconds and when is not None:
+            while self.window[0][2] <= when - self.seconds:
+                self.drop()
+
+    def drop(self):
+        """Remove the oldest value."""
+        (index, value, when) = self.window.popleft()
+        self.n -= 1
+        if self.n:
+            delta = value - self.mean
+            self.mean -= delta / self.n
+            self.M2 = max(0.0, self.M2 - delta * (value - self.mean))
+        else:
+            self.mean = 0.0
+            self.M2 = 0.0
+        if self.minima[0][0] == index:
+            self.minima.popleft()
+        if self.maxima[0][0] == index:
+            self.maxima.popleft()
+        del self.ordered[bisect.bisect_left(self.ordered, value)]
+
+    def get_n(self):
+        """Fetch the number of values in the window."""
+        return self.n
+
+    def get_mean(self):
+        """Fetch the mean."""
+        if not self.n:
+            return float('nan')
+        return self.mean
+
+    def get_variance(self):
+        """Fetch the (sample) variance."""
+        if self.n < 2:
+            return float('nan')
+        return self.M2 / (self.n - 1)
+
+    def get_minimum(self):
+        """Fetch the minimum."""
+        if not self.n:
+            return float('nan')
+        return self.minima[0][1]
+
+    def get_maximum(self):
+        """Fetch the maximum."""
+        if not self.n:
+            return float('nan')
+        return self.maxima[0][1]
+
+    def get_percentile(self, percent):
+        """Fetch a percentile (0 - 100), interpolated as numpy does."""
+        if not self.n:
+            return float('nan')
+        rank = (self.n - 1) * percent / 100.0
+        below = int(rank)
+        if below + 1 >= self.n:
+            return self.ordered[below]
+        return self.ordered[below] + (rank - below) *\
+                (self.ordered[below + 1] - self.ordered[below])
+
+    def get_median(self):
+        """Fetch the median."""
+        return self.get_percentile(50)
+
+    def __str__(self):
+        return json.dumps([{
+                "size": self.size,
+                "seconds": self.seconds,
+                "n": self.n,
+                "minimum": self.get_minimum(),
+                "maximum": self.get_maximum(),
+                "mean": self.get_mean(),
+                "variance": self.get_variance(),
+                "median": self.get_median()
+                }], indent=2, separators=(',', ': '))
+
+def main():
+    """Main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# WindowStats.py"
+    print "# WindowStats.py: start: timestamp: " + ts0.get_timestamp()
+
+    # Check against numpy over every window of a random series
+    np.random.seed(1)
+    data = np.random.lognormal(3, 0.5, 2000).round(3)
+    size = 100
+    window = WindowStats(size)
+    worst = 0.0
+    for j in range(len(data)):
+        window.accumulate(data[j])
+        expected = data[max(0, j + 1 - size):j + 1]
+        got = [window.get_mean(), window.get_minimum(),\
+                window.get_maximum(), window.get_median(),\
+                window.get_percentile(90)]
+        want = [np.mean(expected), np.min(expected), np.max(expected),\
+                np.median(expected), np.percentile(expected, 90)]
+        if len(expected) > 1:
+            got.append(window.get_variance())
+            want.append(np.var(expected, ddof=1))
+        worst = max(worst, np.max(np.abs(np.array(got) - np.array(want))))
+    print "by count: largest difference from numpy: " + str(worst)
+
+    # By time: values a second apart, a 30 second window
+    window = WindowStats(0, 30)
+    for j in range(100):
+        window.accumulate(data[j], float(j))
+    print "by time: n: " + str(window.get_n()) + " median: " +\
+            str(window.get_median()) + " numpy: " +\
+            str(np.median(data[70:100]))
+    print "window: " + str(window)
+
+    cputime_1 = psutil.Process().cpu_times()
+    print
+    ts1 = ts.TimeStamp()
+    print "# WindowStats.py: end: timestamp: " + ts1.get_timestamp()
+    print "# WindowStats.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# WindowStats.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
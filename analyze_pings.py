@@ -5,14 +5,29 @@ time and summarize and analyze the various errors.
 
 """
 
-from LineQueue import LineQueue
+import EventWriter
+from LineQueue import FollowLineQueue, LineQueue, MappedLineQueue
+from PingState import AdaptiveThreshold, PingState, COMMENT, DOWN,\
+        GWFAILURE, INITIALIZATION, NEGATIVERTT, NORMAL, ROUTE, RTTTOOLONG,\
+        TIMEOUT, TIMESTAMP, UNEXPECTED
+from ProcessProfile import ProcessProfile
 
 import argparse
+import array
+import ConfigParser
+import cPickle
+import datetime
+import hashlib
+import itertools
 import json
+import LogSegments
+import multiprocessing
 import numpy as np
+import os
 import psutil
 import re
 import SequenceStats as ss
+import sys
 import TimeStamp as ts
 
 #
@@ -30,23 +45,101 @@ import TimeStamp as ts
 #                of the previous record, which is also a Request timeout.
 # 2017-12-26 [x] Keep track of max and min for RTT
 #                [Done] 2017-12-27
-# 2017-12-26 [ ] Adjust the "RTTTooLong" threshold to be some sort of
+# 2017-12-26 [x] Adjust the "RTTTooLong" threshold to be some sort of
 #                multiple of the mean RTT (3x? 4x?).
+#                [Done] 2026-10-18 --adaptive: a multiple of the median
+#                RTT over a sliding window (WindowStats.py).
 # 2017-12-27 [x] Separate the SequenceStats class into its own module.
 #                [Done] 2017-12-29
+# 2026-10-18 [x] Parse each line once: classify() returns the whole
+#                record, patterns are precompiled, and the counters are
+#                a list indexed by small-integer kind codes.
+# 2026-10-18 [x] Map regular files and scan them in place; the state
+#                machine moves into PingState so that both the mapped
+#                and the LineQueue paths feed it.
+# 2026-10-18 [x] Parse runs of Normal lines in one findall() in the
+#                mapped scan.
+# 2026-10-18 [x] -j N: classify chunks of a file in a process pool and
+#                feed the results, in order, to PingState; the runs of
+#                Normal records are expanded again in the parent, so -j
+#                gives exactly what a serial run does.  The state
+#                machine in the parent is about 60% of the serial time,
+#                so the gain is under 2x whatever N.
+# 2026-10-18 [ ] Merge per chunk states (counters, moments, intervals
+#                across the boundaries) to go past that, if the mean
+#                and variance may differ from serial in the last digits.
+# 2026-10-18 [x] RTT percentiles in the summary; --sketch K keeps them
+#                in a bounded QuantileSketch instead of the full history.
+# 2026-10-18 [x] --checkpoint: save the state at the end of a run and
+#                resume from it, reading only what was appended.
+# 2026-10-18 [x] --engine numpy: parse into columns and run the state
+#                machine as array operations (see PingColumns.py).
+# 2026-10-18 [x] Read a fresh columnar cache (from convert_pings.py)
+#                in place of the log.
+# 2026-10-18 [x] --follow: analyze a log as it is written, reporting
+#                each transition as it happens.
+# 2026-10-18 [x] --from / --to: analyze just a time window, found with
+#                a persistent timestamp index.
+# 2026-10-18 [x] --run: correlate all of the streams of a pinger.py run
+#                and attribute each outage to a layer (RunCorrelator.py).
+# 2026-10-18 [x] Read logs that pinger.py -r has rotated into (compressed)
+#                segments, as one stream.
+# 2026-10-18 [x] Per-process times in the footer; -D profiles the stages
+#                (ProcessProfile.py), with cProfile at -D 2.
+# 2026-10-18 [x] --format ndjson: the intervals and the summary as
+#                events, through one buffered writer (EventWriter.py).
+# 2026-10-18 [x] A registry of ping dialects, told by the 'PING ' header:
+#                Linux iputils (-O, -D epochs, any size, DUP!) as well
+#                as macOS; read_block() puts multi-line records together.
+# 2026-10-18 [x] Unwrap icmp_seq without relying on seeing 0, count lost,
+#                duplicate and reordered probes, and report silent gaps
+#                as Down intervals (SequenceTracker.py).
+# 2026-10-18 [x] --store: keep the intervals in a per host outage store
+#                for report_outages.py (OutageStore.py).
+# 2026-10-18 [x] --rollup: per minute and per hour rollups, appended to
+#                a rollup file (Rollup.py).
+# 2026-10-18 [x] --histogram D: RTT percentiles from a log-linear
+#                histogram to D significant digits (LogHistogram.py).
+# 2026-10-18 [x] The record kinds, AdaptiveThreshold and PingState in
+#                PingState.py, shared with the modules that read records.
 #
 
-timestamp_pattern = ""
+# The patterns are compiled once, here, rather than on every line.
+# 64 bytes from 166.84.1.3: icmp_seq=64539 ttl=246 time=23.707 ms
+normal_re = re.compile(r'64 bytes from (\d+\.\d+\.\d+\.\d+): ' +\
+        r'icmp_seq=(\d+) ttl=(\d+) time=(-?\d+\.?\d*) ms')
+timestamp_re = re.compile(ts.TimeStamp().get_recognizer_re())
+
+GATEWAY_HEADER = \
+        "Vr HL TOS  Len   ID Flg  off TTL Pro  cks      Src      Dst"
+TIMEOUT_PREFIX = "Request timeout for icmp_seq "
 
 def recognize_timestamp(line):
     """Handle a timestamp comment line."""
-    # This is a pukey way to handle this imported constant ...
-    # I bet there's a better way.  Figure it out.
-    global timestamp_pattern
-    if re.match(timestamp_pattern, line):
-        return True
-    else:
-        return False
+    return timestamp_re.match(line) is not None
+
+def read_block(line_queue, count):
+    """Read the count lines that continue a multi-line record.
+
+    The timestamp comments of insert_timestamps.py can land inside a
+    record; they are set aside and pushed back afterwards, in order, so
+    that they follow it.  Returns the lines, fewer at the end of the
+    input.
+    """
+    lines = []
+    stamps = []
+    while len(lines) < count:
+        line = line_queue.get_line()
+        if not line:
+            break
+        if recognize_timestamp(line):
+            stamps.append(line)
+        else:
+            lines.append(line)
+    # sweet - LineQueue to the rescue
+    for line in reversed(stamps):
+        line_queue.push_back(line)
+    return lines
 
 def handle_gateway_failure(line_queue, firstline, linenumber):
     """ when a line starts with '92 bytes from ' we have
@@ -54,35 +147,16 @@ def handle_gateway_failure(line_queue, firstline, linenumber):
        'Vr HL TOS  Len   ID Flg  off TTL Pro  cks      Src      Dst'
        (a bunch of numbers and data)
        (a blank line)
+    Returns False if the header line is not what we expect.
     """
-    pattern = "Vr HL TOS  Len   ID Flg  off TTL Pro  cks      Src      Dst"
-    # need to flush three lines here ...
-    secondline = line_queue.get_line()
-    pushback = None
-    if recognize_timestamp(secondline):
-        pushback = secondline
-        secondline = line_queue.get_line()
-    if secondline.strip() != pattern:
-        print "handle_gateway_failure(): linenumber: " + str(linenumber)
-    thirdline = line_queue.get_line()
-    if recognize_timestamp(thirdline):
-        pushback = thirdline
-        thirdline = line_queue.get_line()
-    fourthline = line_queue.get_line()
-    if recognize_timestamp(fourthline):
-        pushback = fourthline
-        fourthline = line_queue.get_line()
-    # sweet - LineQueue to the rescue
-    if pushback:
-        line_queue.push_back(pushback)
+    block = read_block(line_queue, 3)
+    return bool(block) and block[0].strip() == GATEWAY_HEADER
 
 def handle_expected_timeout(line_queue, firstline, linenumber):
     """When we encounter a various messages we can
         expect a 'Request timeout' message to follow immediately."""
-    pattern = "Request timeout for icmp_seq "
-    # need to flush one more line here ...
-    secondline = line_queue.get_line()
-    if not secondline.startswith(pattern):
+    secondline = "".join(read_block(line_queue, 1))
+    if not secondline.startswith(TIMEOUT_PREFIX):
         print "handle_down_network(): linenumber: " + str(linenumber)
     (junk, sequence_number) = secondline.split("icmp_seq ")
     return int(sequence_number)
@@ -91,325 +165,1004 @@ def parse_normal_return(line, linenumber):
     """ Given a normal string, return a tuple containing IP address,
         Sequence number, and RTT.
     """
-    # print "parse_normal_return(): " + line.strip()
     # 64 bytes from 166.84.1.3: icmp_seq=64539 ttl=246 time=23.707 ms
-    pattern = '64 bytes from (\d+\.\d+\.\d+\.\d+): '
-    pattern += 'icmp_seq=(\d+) ttl=(\d+) time=(\d+\.?\d*) ms'
-    (re_ip, re_seq, re_ttl, re_rtt) = \
-        [re.match(pattern, line).group(k) for k in [1,2,3,4]]
+    (re_ip, re_seq, re_ttl, re_rtt) = normal_re.match(line).groups()
     return (re_ip, re_seq, re_rtt)
 
 def classify(line_queue, line, linenumber, threshold):
-    """ Given a line from the pinger output, classify it. """
-    # print "classify(): " + line
-    if line == "ping: sendto: Network is down":
-        """Get sequence number from subsequent line."""
-        seq_num = handle_expected_timeout(line_queue, line, linenumber)
-        return ("Down", seq_num)
+    """ Given a line from the pinger output, classify it.
+
+    Returns a fully parsed record, so that no line has to be looked
+    at twice:
+        (kind, sequence_number, ttl, rtt, ip, text)
+    kind is one of the kind codes above.  text is the timestamp of a
+    Timestamp record, the line itself for an Unexpected one, and the
+    first line for a malformed GWFailure block.  Fields that do not
+    apply to a kind are -1 (numbers) or None (strings).
+
+    The diagnostics for Unexpected and malformed records are printed by
+    PingState, which knows the line number within the whole log.
+    """
+    # Dispatch on the prefix, most frequent kinds first.
+    if line.startswith("64 bytes from "):
+        match = normal_re.match(line)
+        if match:
+            (ip, seq_num, ttl, rtt) = match.groups()
+            rtt = float(rtt)
+            if rtt < 0:
+                kind = NEGATIVERTT
+            elif rtt > threshold:
+                kind = RTTTOOLONG
+            else:
+                kind = NORMAL
+            return (kind, int(seq_num), int(ttl), rtt, ip, None)
     elif line.startswith("#"):
-        """No sequence number."""
         # need to parse timestamp comments
         if line.startswith("# timestamp: "):
-            # this is a timestamp
-            (junk, junk, junk, timestamp) = line.split(" ")
-            return ("Timestamp", timestamp)
-        return ("Comment", 0)
-    elif line.startswith("PING "):
-        """Here is our log of the initial ping commmand"""
-        return ("Initialization", 0)
+            # '# timestamp: <tag>: <time>' or '# timestamp: <time>'
+            timestamp = line.rsplit(" ", 1)[1]
+            return (TIMESTAMP, -1, -1, -1.0, None, timestamp)
+        return (COMMENT, 0, -1, -1.0, None, None)
+    elif line.startswith(TIMEOUT_PREFIX):
+        return (TIMEOUT, int(line[len(TIMEOUT_PREFIX):]), -1, -1.0,\
+                None, None)
+    elif line == "ping: sendto: Network is down":
+        # Get sequence number from subsequent line.
+        seq_num = handle_expected_timeout(line_queue, line, linenumber)
+        return (DOWN, seq_num, -1, -1.0, None, None)
     elif line == "ping: sendto: No route to host":
-        """Get sequence number from subsequent timeout line."""
+        # Get sequence number from subsequent timeout line.
         seq_num = handle_expected_timeout(line_queue, line, linenumber)
-        return ("Route", int(seq_num))
-    elif line.startswith("Request timeout for icmp_seq "):
-        (junk, sequence_number) = line.split("icmp_seq ")
-        return ("Timeout", int(sequence_number))
-    elif line.startswith("64 bytes from "):
-        # might be negative RTT, so parse the line first
-        (junk, seq_num, rtt) = parse_normal_return(line.strip(), linenumber)
-        if float(rtt) < 0:
-            return ("NegativeRTT", int(seq_num))
-        if float(rtt) > threshold:
-            return ("RTTTooLong", int(seq_num))
-        return ("Normal", int(seq_num))
+        return (ROUTE, seq_num, -1, -1.0, None, None)
+    elif line.startswith("PING "):
+        # Here is our log of the initial ping commmand
+        return (INITIALIZATION, 0, -1, -1.0, None, None)
     elif line.startswith("92 bytes from "):
-        handle_gateway_failure(line_queue, line, linenumber)
-        return ("GWFailure", -1)
-    else:
-        # Is there anything other than '64 bytes...'?
-        print "linenumber: ", str(linenumber)
-        print "Unexpected: '", line, "'"
-        return ("Unexpected", -1)
+        if handle_gateway_failure(line_queue, line, linenumber):
+            return (GWFAILURE, -1, -1, -1.0, None, None)
+        return (GWFAILURE, -1, -1, -1.0, None, line)
+    # Is there anything other than '64 bytes...'?
+    return (UNEXPECTED, -1, -1, -1.0, None, line)
+
+# Fast paths for the mapped scan.  Each one matches a whole line, and
+# only when the text path would produce exactly the same record;
+# everything else falls back to classify().
+mapped_normal_re = re.compile(r'64 bytes from (\d+\.\d+\.\d+\.\d+): ' +\
+        r'icmp_seq=(\d+) ttl=(\d+) time=(-?\d+\.?\d*) ms[^\n]*(?:\n|\Z)')
+# A run of up to MAPPED_RUN Normal lines, and the fields of each line of
+# it, all parsed in one findall()
+MAPPED_RUN = 1024
+mapped_run_re = re.compile(r'(?:64 bytes from \d+\.\d+\.\d+\.\d+: ' +\
+        r'icmp_seq=\d+ ttl=\d+ time=-?\d+\.?\d* ms[^\n]*\n){2,' +\
+        str(MAPPED_RUN) + r'}')
+mapped_fields_re = re.compile(r'64 bytes from (\d+\.\d+\.\d+\.\d+): ' +\
+        r'icmp_seq=(\d+) ttl=(\d+) time=(-?\d+\.?\d*) ms[^\n]*\n')
+mapped_timeout_re = re.compile(\
+        r'Request timeout for icmp_seq (\d+)[^\S\n]*(?:\n|\Z)')
+
+def scan_lines(line_queue, threshold, dialect='auto'):
+    """Generate the records for the lines in a LineQueue.  With dialect
+    'auto' the dialect follows the 'PING ' header lines."""
+    parser = new_dialect(dialect)
+    classify_line = parser.classify
+    linecount = 0
+    line = line_queue.get_line()
+    while line:
+        linecount += 1
+        line = line.strip()
+        record = classify_line(line_queue, line, linecount, threshold)
+        if record[0] == INITIALIZATION and dialect == 'auto':
+            name = detect_dialect(line)
+            if name is not None and name != parser.name:
+                parser = new_dialect(name)
+                classify_line = parser.classify
+        yield record
+        line = line_queue.get_line()
+
+def scan_mapped(line_queue, threshold):
+    """Generate the records for a MappedLineQueue.
+
+    The common lines are recognized and parsed by a regular expression
+    applied directly to the mapped bytes, so they are never copied out
+    as line strings.  A run of Normal lines is parsed in one go, and its
+    records built by map() and zip() rather than a line at a time.
+    Anything else, and any line pushed back by handle_gateway_failure(),
+    goes through classify().
+    """
+    mm = line_queue.mm
+    size = line_queue.size
+    run_match = mapped_run_re.match
+    run_fields = mapped_fields_re.findall
+    normal_match = mapped_normal_re.match
+    timeout_match = mapped_timeout_re.match
+    linecount = 0
+    while True:
+        pos = line_queue.pos
+        if not line_queue.pushed:
+            if pos >= size:
+                break
+            match = run_match(mm, pos, size)
+            if match:
+                end = match.end()
+                line_queue.pos = end
+                (ips, seqs, ttls, rtts) = zip(*run_fields(mm, pos, end))
+                count = len(ips)
+                linecount += count
+                rtts = map(float, rtts)
+                if min(rtts) < 0 or max(rtts) > threshold:
+                    kinds = [NEGATIVERTT if rtt < 0 else RTTTOOLONG if\
+                            rtt > threshold else NORMAL for rtt in rtts]
+                else:
+                    kinds = [NORMAL] * count
+                for record in zip(kinds, map(int, seqs), map(int, ttls),\
+                        rtts, ips, [None] * count):
+                    yield record
+                continue
+            match = normal_match(mm, pos, size)
+            if match:
+                linecount += 1
+                line_queue.pos = match.end()
+                (ip, seq_num, ttl, rtt) = match.groups()
+                rtt = float(rtt)
+                if rtt < 0:
+                    kind = NEGATIVERTT
+                elif rtt > threshold:
+                    kind = RTTTOOLONG
+                else:
+                    kind = NORMAL
+                yield (kind, int(seq_num), int(ttl), rtt, ip, None)
+                continue
+            match = timeout_match(mm, pos, size)
+            if match:
+                linecount += 1
+                line_queue.pos = match.end()
+                yield (TIMEOUT, int(match.group(1)), -1, -1.0, None, None)
+                continue
+        line = line_queue.get_line()
+        if not line:
+            break
+        linecount += 1
+        yield classify(line_queue, line.strip(), linecount, threshold)
+
+# Dialects
+#
+# Each ping prints lost pings and errors its own way.  A dialect is a
+# class with a classify() that turns a line of its ping's output into a
+# record, and a scan_mapped() for a whole mapped log; DIALECTS is the
+# registry, by name.  The dialect of a log is told by its 'PING ' header
+# line: detect_dialect() for a stream, which may switch dialect at each
+# header, and sniff_dialect() for the start of a file.
+
+# Bytes at the start of a log searched for its header
+SNIFF_BYTES = 1 << 16
+
+# A Timestamp record is made from the epochs of Linux ping -D every so
+# many seconds, as insert_timestamps.py would have inserted them
+EPOCH_STAMP_SECONDS = 64
+
+class PingDialect(object):
+    """macOS (BSD) ping, the dialect the analyzer started with: 'Request
+    timeout for icmp_seq N' for a lost ping, 'ping: sendto: ...' ahead
+    of one that could not be sent, and a four line block for a gateway
+    failure."""
+    name = 'macos'
+    # PING panix.com (166.84.1.3): 56 data bytes
+    header_re = re.compile(r'PING \S+ \([\d.]+\): \d+ data bytes')
+
+    # The module functions themselves, with no method call in between
+    classify = staticmethod(classify)
+    scan_mapped = staticmethod(scan_mapped)
+
+class LinuxDialect(PingDialect):
+    """Linux (iputils) ping.
+
+    Replies may be of any size, name the host as well as its address and
+    end with '(DUP!)'; a duplicate is a reply like any other, which the
+    SequenceTracker then finds a duplicate and PingState counts as one,
+    leaving it out of the state and the RTTs.  A lost ping is 'no
+    answer yet for icmp_seq=N' (with -O), an error from a gateway a line
+    'From <gateway> icmp_seq=N <message>' (Route for Destination Host
+    Unreachable, GWFailure for the rest) and a ping that could not be
+    sent 'ping: sendmsg: ...' with no sequence number.  With -D every
+    line starts with [epoch]; these take the place of timestamp
+    comments, which are then ignored, and a Timestamp record is made
+    every EPOCH_STAMP_SECONDS.
+    """
+    name = 'linux'
+    # PING panix.com (166.84.1.3) 56(84) bytes of data.
+    header_re = re.compile(r'PING \S+ \([\d.]+\) \d+\(\d+\) bytes of data')
+
+    # [1514505600.123456] 64 bytes from panix.com (166.84.1.3):
+    #     icmp_seq=1 ttl=246 time=23.7 ms (DUP!)
+    reply_re = re.compile(r'(?:\[(\d+\.?\d*)\] )?\d+ bytes from ' +\
+            r'(?:\S+ \()?(\d+\.\d+\.\d+\.\d+)\)?: icmp_[rs]eq=(\d+) ' +\
+            r'ttl=(\d+) time=(-?\d+\.?\d*) ms( \(DUP!\))?[^\S\n]*(?:\n|\Z)')
+    # [1514505600.123456] no answer yet for icmp_seq=2
+    timeout_re = re.compile(r'(?:\[(\d+\.?\d*)\] )?' +\
+            r'no answer yet for icmp_seq=(\d+)[^\S\n]*(?:\n|\Z)')
+    epoch_re = re.compile(r'\[(\d+\.?\d*)\] (.*)$')
+    # From 10.0.0.1 icmp_seq=2 Destination Host Unreachable
+    error_re = re.compile(r'From (?:\S+ \()?\S+?\)? icmp_[rs]eq=(\d+) (.*)$')
+
+    def __init__(self):
+        # the epoch of the last Timestamp record made, and whether the
+        # log has epochs at all
+        self.last_stamp = None
+        self.epochs = False
+
+    def stamp(self, epoch):
+        """A Timestamp record for epoch, if one is due, else None."""
+        self.epochs = True
+        if self.last_stamp is not None and\
+                epoch < self.last_stamp + EPOCH_STAMP_SECONDS:
+            return None
+        self.last_stamp = epoch
+        return (TIMESTAMP, -1, -1, -1.0, None, epoch_timestamp(epoch))
+
+    def reply(self, match, threshold):
+        """The record for a reply_re match."""
+        (epoch, ip, seq_num, ttl, rtt, duplicate) = match.groups()
+        rtt = float(rtt)
+        if rtt < 0:
+            kind = NEGATIVERTT
+        elif rtt > threshold:
+            kind = RTTTOOLONG
+        else:
+            kind = NORMAL
+        return (kind, int(seq_num), int(ttl), rtt, ip, None)
+
+    def classify(self, line_queue, line, linenumber, threshold):
+        """Classify a line, as classify() does."""
+        if line.startswith("["):
+            match = self.epoch_re.match(line)
+            if match:
+                line = match.group(2)
+                record = self.stamp(float(match.group(1)))
+                if record is not None:
+                    # the line itself comes next
+                    line_queue.push_back(line)
+                    return record
+        match = self.reply_re.match(line)
+        if match:
+            return self.reply(match, threshold)
+        match = self.timeout_re.match(line)
+        if match:
+            return (TIMEOUT, int(match.group(2)), -1, -1.0, None, None)
+        if line.startswith("From "):
+            match = self.error_re.match(line)
+            if match:
+                (seq_num, message) = match.groups()
+                if message.startswith("Destination Host Unreachable"):
+                    kind = ROUTE
+                else:
+                    kind = GWFAILURE
+                return (kind, int(seq_num), -1, -1.0, None, None)
+        elif line.startswith("ping: sendmsg: "):
+            if line.endswith("No route to host"):
+                return (ROUTE, -1, -1, -1.0, None, None)
+            return (DOWN, -1, -1, -1.0, None, None)
+        elif line.startswith("# timestamp: ") and self.epochs:
+            return (COMMENT, 0, -1, -1.0, None, None)
+        elif not line or line.startswith("--- ") or\
+                " packets transmitted, " in line or\
+                line.startswith("rtt min/avg/max/mdev = "):
+            # the statistics at the end, after a blank line
+            return (COMMENT, 0, -1, -1.0, None, None)
+        return classify(line_queue, line, linenumber, threshold)
+
+    def scan_mapped(self, line_queue, threshold):
+        """Generate the records for a MappedLineQueue, as scan_mapped()
+        does, with fast paths for the -D forms of the common lines."""
+        mm = line_queue.mm
+        size = line_queue.size
+        reply_match = self.reply_re.match
+        timeout_match = self.timeout_re.match
+        linecount = 0
+        while True:
+            pos = line_queue.pos
+            if not line_queue.pushed:
+                if pos >= size:
+                    break
+                match = reply_match(mm, pos, size)
+                if match:
+                    linecount += 1
+                    line_queue.pos = match.end()
+                    if match.group(1) is not None:
+                        stamp = self.stamp(float(match.group(1)))
+                        if stamp is not None:
+                            yield stamp
+                    yield self.reply(match, threshold)
+                    continue
+                match = timeout_match(mm, pos, size)
+                if match:
+                    linecount += 1
+                    line_queue.pos = match.end()
+                    if match.group(1) is not None:
+                        stamp = self.stamp(float(match.group(1)))
+                        if stamp is not None:
+                            yield stamp
+                    yield (TIMEOUT, int(match.group(2)), -1, -1.0, None,\
+                            None)
+                    continue
+            line = line_queue.get_line()
+            if not line:
+                break
+            linecount += 1
+            yield self.classify(line_queue, line.strip(), linecount,\
+                    threshold)
+
+DIALECTS = {
+    PingDialect.name: PingDialect,
+    LinuxDialect.name: LinuxDialect,
+    }
+
+def epoch_timestamp(epoch):
+    """The timestamp, as insert_timestamps.py writes them, for a time in
+    seconds since the epoch."""
+    return datetime.datetime.fromtimestamp(epoch).strftime(\
+            "%Y-%m-%dT%H:%M:%S.%f")
+
+def detect_dialect(line):
+    """The name of the dialect of a 'PING ' header line, or None."""
+    for name in sorted(DIALECTS):
+        if DIALECTS[name].header_re.match(line):
+            return name
+    return None
+
+def sniff_dialect(path):
+    """The name of the dialect of a log, from its first header line, or
+    'auto' if there is none near the start."""
+    with open(path, 'rb') as log:
+        head = log.read(SNIFF_BYTES)
+    match = re.search(r'^PING .*$', head, re.M)
+    if match is not None:
+        return detect_dialect(match.group(0)) or 'auto'
+    return 'auto'
+
+def new_dialect(name):
+    """A parser for the named dialect; 'auto' starts out as macOS."""
+    return DIALECTS.get(name, PingDialect)()
+
+def is_safe_boundary(mm, pos):
+    """Is the '# timestamp: ' line at pos a safe place to split a log?
+
+    It is if the line before it is a reply or a timeout, since then no
+    multi-line record can be cut in two.  Analyzing the two sides of a
+    safe boundary one after the other gives the same results as
+    analyzing the whole.
+    """
+    line_start = mm.rfind("\n", 0, pos - 1) + 1
+    return mm[line_start:line_start + 14] == "64 bytes from " or\
+            mm[line_start:line_start + len(TIMEOUT_PREFIX)] == TIMEOUT_PREFIX
+
+def find_chunk_boundaries(mm, chunks, start=0, end=None):
+    """Split a mapped log (or the start - end part of it) into about
+    chunks (start, end) byte ranges, split at safe boundaries.
+    """
+    if end is None:
+        end = len(mm)
+    size = end - start
+    starts = [start]
+    for i in range(1, chunks):
+        pos = mm.find("\n# timestamp: ",\
+                max(start + i * size // chunks, starts[-1]), end)
+        while pos >= 0 and not is_safe_boundary(mm, pos + 1):
+            pos = mm.find("\n# timestamp: ", pos + 1, end)
+        if pos < 0:
+            break
+        starts.append(pos + 1)
+    return zip(starts, starts[1:] + [end])
+
+def find_resume_point(mm, start, end):
+    """Find the last safe boundary between start and end, or start if
+    there is none.  This is where a checkpoint is taken."""
+    pos = mm.rfind("\n# timestamp: ", start, end)
+    while pos >= start:
+        if is_safe_boundary(mm, pos + 1):
+            return pos + 1
+        pos = mm.rfind("\n# timestamp: ", start, pos)
+    return start
+
+def parse_window_time(text):
+    """Epoch microseconds of a --from / --to time.  The seconds, or the
+    whole time of day, may be left off: 2026-10-01T02:00, 2026-10-01."""
+    template = "0000-01-01T00:00:00.000000"
+    return ts.TimeStamp(text + template[len(text):]).get_epoch_us()
+
+def mapped_records(line_queue, start, end, threshold, pool=None, jobs=1,\
+        dialect='auto'):
+    """Generate the records for the start - end part of a mapped log,
+    in a process pool if there is one (macOS logs only)."""
+    if start >= end:
+        return []
+    filename = line_queue.filename
+    if pool is None:
+        return new_dialect(dialect).scan_mapped(\
+                MappedLineQueue(filename, start, end), threshold)
+    # Classify the chunks in a pool; the summarized records come
+    # back in order and are expanded into the records a serial scan
+    # would have made.
+    tasks = [(filename, chunk_start, chunk_end, threshold) for\
+            (chunk_start, chunk_end) in\
+            find_chunk_boundaries(line_queue.mm, 4 * jobs, start, end)]
+    return expand_runs(itertools.chain.from_iterable(\
+            pool.imap(summarize_chunk, tasks)))
+
+# Checkpoints
+#
+# A checkpoint is a pickled dict saved next to the log.  It holds the
+# pickled PingState as it was at a safe boundary, the byte offset of
+# that boundary, the settings the state was built with, and enough
+# about the log to tell if it has since been truncated or replaced:
+# the device and inode, and a digest of the first block and of the
+# block just before the offset.
+#
+# The version goes up whenever what PingState keeps changes, so that an
+# older checkpoint starts over rather than resuming with part of the
+# state missing.  2: the SequenceTracker, the rollups and the histogram.
+# 3: PingState (and AdaptiveThreshold) pickled from PingState.py.
+
+CHECKPOINT_VERSION = 3
+DIGEST_BLOCK = 4096
+
+# What a corrupt checkpoint, or one naming classes that have since moved
+# or changed, raises when it is unpickled
+UNPICKLING_ERRORS = (cPickle.UnpicklingError, EOFError, AttributeError,\
+        ImportError, IndexError, KeyError, TypeError, ValueError)
+
+def file_digest(mm, offset):
+    """Fingerprint the start of a mapped log and the bytes before offset."""
+    md5 = hashlib.md5()
+    md5.update(mm[0:DIGEST_BLOCK])
+    md5.update(mm[max(0, offset - DIGEST_BLOCK):offset])
+    return md5.hexdigest()
+
+def load_checkpoint(path, line_queue, settings):
+    """Load the checkpoint for a mapped log.
+
+    Returns (offset, state, status).  If there is no usable checkpoint
+    offset is 0 and state is None; status says what happened.
+    """
+    try:
+        checkpoint_file = open(path, 'rb')
+    except IOError:
+        return (0, None, "none")
+    try:
+        checkpoint = cPickle.load(checkpoint_file)
+    except UNPICKLING_ERRORS:
+        return (0, None, "unreadable, starting over")
+    finally:
+        checkpoint_file.close()
+    stat = os.fstat(line_queue.file_descriptor.fileno())
+    offset = checkpoint.get('offset', 0)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        return (0, None, "old version, starting over")
+    if checkpoint['settings'] != settings:
+        return (0, None, "settings changed, starting over")
+    if checkpoint['file'] != (stat.st_dev, stat.st_ino):
+        return (0, None, "file replaced, starting over")
+    if offset > len(line_queue.mm):
+        return (0, None, "file truncated, starting over")
+    if checkpoint['digest'] != file_digest(line_queue.mm, offset):
+        return (0, None, "file contents changed, starting over")
+    try:
+        state = cPickle.loads(checkpoint['state'])
+    except UNPICKLING_ERRORS:
+        return (0, None, "unreadable, starting over")
+    return (offset, state, "resuming at byte " + str(offset))
+
+def save_checkpoint(path, line_queue, offset, settings, state_pickle):
+    """Save a checkpoint for a mapped log.  state_pickle is the pickled
+    PingState as of offset."""
+    stat = os.fstat(line_queue.file_descriptor.fileno())
+    checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'offset': offset,
+            'settings': settings,
+            'file': (stat.st_dev, stat.st_ino),
+            'digest': file_digest(line_queue.mm, offset),
+            'state': state_pickle
+            }
+    # Write then rename, so that a reader never sees half a checkpoint.
+    temp_path = path + ".tmp"
+    checkpoint_file = open(temp_path, 'wb')
+    cPickle.dump(checkpoint, checkpoint_file, 2)
+    checkpoint_file.close()
+    os.rename(temp_path, path)
+
+class NormalRun(object):
+    """A run of Normal records, as summarize_chunk() sends it back:
+    the first sequence number, the ttl and ip they share, and the RTTs
+    in order."""
+    __slots__ = ('seq', 'ttl', 'ip', 'rtts')
+
+    def __init__(self, record):
+        (kind, self.seq, self.ttl, rtt, self.ip, text) = record
+        self.rtts = array.array('d', [rtt])
+
+def summarize_chunk(task):
+    """Classify one chunk of a log.  This runs in a worker process.
+
+    task is (filename, start, end, threshold).  Returns the records for
+    the chunk, except that each run of Normal records with consecutive
+    sequence numbers and the same ttl and ip is sent back as a
+    NormalRun, which is much cheaper to pickle.  A run ends at any
+    other kind of record, at a gap or a step back in the sequence
+    numbers, and at a change of ttl or ip.
+    """
+    (filename, start, end, threshold) = task
+    line_queue = MappedLineQueue(filename, start, end)
+    result = []
+    run = None
+    last_seq = -1
+    for record in scan_mapped(line_queue, threshold):
+        if record[0] != NORMAL:
+            run = None
+            result.append(record)
+            continue
+        if run is not None and record[1] == (last_seq + 1) % 65536 and\
+                record[2] == run.ttl and record[4] == run.ip:
+            run.rtts.append(record[3])
+        else:
+            run = NormalRun(record)
+            result.append(run)
+        last_seq = record[1]
+    return result
+
+def expand_runs(results):
+    """Generate the records of summarize_chunk() results, each
+    NormalRun expanded back into its Normal records."""
+    for result in results:
+        if type(result) is not NormalRun:
+            yield result
+            continue
+        (seq, ttl, ip) = (result.seq, result.ttl, result.ip)
+        for rtt in result.rtts:
+            yield (NORMAL, seq, ttl, rtt, ip, None)
+            seq = (seq + 1) % 65536
+
+# pinger.py names the logs in a run directory <host>.ping.log, or
+# <host>.ping.log.NNNN[.gz|.zst] when it rotates them into segments
+RUN_LOG_SUFFIX = ".ping.log"
+run_log_re = re.compile(r'(.+)\.ping\.log(\.\d+(\.gz|\.zst)?)?$')
+
+def log_host(path):
+    """The host a log is of: <host> of <host>.ping.log, else the host in
+    its first 'PING ' header, else None."""
+    match = run_log_re.match(os.path.basename(path))
+    if match is not None:
+        return match.group(1)
+    if os.path.isfile(path):
+        with open(path, 'rb') as log:
+            head = log.read(SNIFF_BYTES)
+        match = re.search(r'^PING (\S+)', head, re.M)
+        if match is not None:
+            return match.group(1)
+    return None
+
+# Seconds --follow sleeps between looks at a quiet log
+FOLLOW_INTERVAL = 0.5
+
+# Buffer size of an --output file
+OUTPUT_BUFFER = 1 << 16
+
+def profile_stages(profile):
+    """Time the stages of an analysis in profile (for -D).
+
+    The raw stages are: read (LineQueue reads), scan (getting records
+    from the scanner, which includes read, and on the mapped path the
+    page faults), consume (PingState.consume(), which includes scan and
+    stats), stats (SequenceStats), output (the report) and, for the
+    columnar paths, cache, parse and analyze.  Returns a function that
+    works out read, classify, state machine, stats and output from them.
+    """
+    import PingColumns
+    profile.instrument(LineQueue, 'read_bytes', 'read')
+    profile.instrument(ss.SequenceStats, 'accumulate', 'stats')
+    profile.instrument(ss.SequenceStats, 'accumulate_array', 'stats')
+    consume = PingState.consume
+
+    def scanned_consume(self, records):
+        """Run the state machine, timing the scan separately."""
+        consume(self, profile.timed(records, 'scan'))
+
+    PingState.consume = scanned_consume
+    profile.instrument(PingState, 'report', 'output')
+    profile.instrument(PingState, 'consume', 'consume')
+    profile.instrument(PingColumns, 'load_cache', 'cache')
+    profile.instrument(PingColumns, 'parse_columns', 'parse')
+    profile.instrument(PingColumns, 'analyze_columns', 'analyze')
+
+    def breakdown():
+        """The five stages, in seconds."""
+        stages = profile.stages
+        read = stages.get('read', 0.0)
+        scan = stages.get('scan', 0.0)
+        stats = stages.get('stats', 0.0)
+        return {'stage_breakdown': {
+                'read': read + stages.get('cache', 0.0),
+                'classify': max(0.0, scan - read) + stages.get('parse', 0.0),
+                'state_machine': max(0.0, stages.get('consume', 0.0) +\
+                        stages.get('analyze', 0.0) - scan - stats),
+                'stats': stats,
+                'output': stages.get('output', 0.0),
+                }}
+    return breakdown
 
 def main():
     """Main body."""
-    global timestamp_pattern
-
-    # capture timing information
-    cputime_0 = psutil.cpu_times()
+    # capture timing information: this process only
+    cputime_0 = psutil.Process().cpu_times()
 
     # Self-identification for the run
     # This gives us YYYY-MM-DDTHH:MM:SS+HH:MM
     ts0 = ts.TimeStamp()
-    timestamp_pattern = ts0.get_recognizer_re()
-
-    print "# analyze_pings.py"
-    print "# analyze_pings.py: start: timestamp: " + ts0.get_timestamp()
 
     parser = argparse.ArgumentParser(description='Analyze a ping log')
     parser.add_argument('-f', nargs='?',\
             default='stdin', help="input file name")
+    parser.add_argument('--run', nargs='?', default=None,\
+            help="a pinger.py run directory: correlate all of its " +\
+            "<host>.ping.log streams")
+    parser.add_argument('-c', nargs='?', default='./pinger.cfg',\
+            help="configuration file naming the LAN and ISP edge " +\
+            "hosts, for --run")
+    parser.add_argument('--no-mmap', action='store_true',\
+            help="read a regular file line by line instead of mapping it")
+    parser.add_argument('--no-cache', action='store_true',\
+            help="parse the log even if it has a fresh columnar cache")
+    parser.add_argument('--follow', action='store_true',\
+            help="keep following the log as it grows (and is rotated) " +\
+            "until interrupted with Ctrl-C, then report")
+    parser.add_argument('--from', dest='from_time', type=parse_window_time,\
+            default=None, help="analyze from this time on " +\
+            "(YYYY-MM-DDThh:mm[:ss], widened to the timestamp before it)")
+    parser.add_argument('--to', dest='to_time', type=parse_window_time,\
+            default=None, help="analyze up to this time " +\
+            "(widened to the timestamp after it)")
+    parser.add_argument('--adaptive', type=float, nargs='?', default=0,\
+            help="RTTTooLong threshold as this multiple of the median " +\
+            "RTT over a sliding window, instead of a fixed 250 ms")
+    parser.add_argument('--window', type=int, nargs='?', default=300,\
+            help="replies in the --adaptive window (int: default 300)")
+    parser.add_argument('--sketch', type=int, nargs='?', default=0,\
+            help="size (k) of a quantile sketch to use for RTT " +\
+            "percentiles instead of keeping every RTT (int: default 0)")
+    parser.add_argument('--histogram', type=int, nargs='?', default=0,\
+            help="significant digits of a log-linear histogram to use " +\
+            "for RTT percentiles instead of keeping every RTT " +\
+            "(int: default 0)")
+    parser.add_argument('--checkpoint', nargs='?', const='', default=None,\
+            help="resume from, and save, a checkpoint for a regular " +\
+            "file (default checkpoint file: <file>.ckpt)")
+    parser.add_argument('-j', type=int, nargs='?', default=1,\
+            help="worker processes to classify a regular file; the " +\
+            "state machine stays in one process, so this is at best " +\
+            "about 1.5 - 2 times as fast, and no faster with one CPU " +\
+            "(int: default to 1)")
+    parser.add_argument('--engine', choices=['records', 'numpy'],\
+            default='records', help="analyze record by record, or " +\
+            "with numpy over columnar arrays (default records)")
+    parser.add_argument('--dialect', choices=['auto'] + sorted(DIALECTS),\
+            default='auto', help="the ping that wrote the log, or auto " +\
+            "to tell from its 'PING ' header (default auto)")
+    parser.add_argument('--format', choices=sorted(EventWriter.WRITERS),\
+            default='text', help="the intervals and summary as text, or " +\
+            "as one JSON object per line (default text)")
+    parser.add_argument('-o', '--output', nargs='?', default=None,\
+            help="write the intervals and summary to this file " +\
+            "(default stdout)")
+    parser.add_argument('--store', nargs='?', default=None,\
+            help="also put the intervals in the outage store of the " +\
+            "host in this directory (see report_outages.py)")
+    parser.add_argument('--rollup', nargs='?', const='', default=None,\
+            help="append per minute and per hour rollups to this file " +\
+            "(default rollup file: <file>.rollup)")
+    parser.add_argument('--host', nargs='?', default=None,\
+            help="the host of the log, for --store and --rollup " +\
+            "(default: from its name, <host>.ping.log, or its 'PING ' " +\
+            "header)")
     parser.add_argument('-v', nargs='?', default='command line',\
             help="git information about build state")
     parser.add_argument('-D', type=int, nargs='?',\
-            default=0, help="Debug flag (int: default to 0)")
+            default=0, help="Debug flag: 1 prints a JSON profile of the " +\
+            "stages, 2 adds cProfile, 3 tracemalloc (int: default to 0)")
     args = parser.parse_args()
+
+    # The events go through one buffered writer.  When they are JSON on
+    # stdout, the commentary goes to stderr, out of their way.
+    if args.output is None:
+        events = sys.stdout
+        if args.format != 'text':
+            sys.stdout = sys.stderr
+    else:
+        events = open(args.output, 'w', OUTPUT_BUFFER)
+    writer = EventWriter.WRITERS[args.format](events)
+    # --store: the intervals are collected on their way to the writer
+    collector = None
+    if args.store is not None:
+        import OutageStore
+        collector = OutageStore.IntervalCollector(writer)
+        writer = collector
+
+    print "# analyze_pings.py"
+    print "# analyze_pings.py: start: timestamp: " + ts0.get_timestamp()
+
+    profile = None
+    if args.D:
+        profile = ProcessProfile("analyze_pings.py", args.D >= 2,\
+                args.D >= 3)
+        breakdown = profile_stages(profile)
+    if args.engine == 'numpy' and (args.j > 1 or args.checkpoint is not None):
+        parser.error("--engine numpy does not support -j or --checkpoint")
+    if args.follow and (args.f == 'stdin' or args.j > 1 or\
+            args.checkpoint is not None or args.engine == 'numpy'):
+        parser.error("--follow needs -f, and does not support -j, " +\
+                "--checkpoint or --engine numpy")
+    window = args.from_time is not None or args.to_time is not None
+    # A log rotated into segments can only be read as a stream
+    segmented = args.f != 'stdin' and LogSegments.is_segmented(args.f)
+    if segmented and (args.follow or window or args.j > 1 or\
+            args.checkpoint is not None):
+        parser.error("a log rotated into segments does not support " +\
+                "--follow, --from, --to, -j or --checkpoint")
+    if window and (not os.path.isfile(args.f) or\
+            not os.path.getsize(args.f) or args.no_mmap or args.follow or\
+            args.checkpoint is not None or args.engine == 'numpy'):
+        parser.error("--from and --to need -f with a non-empty log, and " +\
+                "do not support --no-mmap, --follow, --checkpoint or " +\
+                "--engine numpy")
+    if args.run is not None and (not os.path.isdir(args.run) or\
+            args.f != 'stdin' or args.follow or window or args.j > 1 or\
+            args.checkpoint is not None or args.engine == 'numpy'):
+        parser.error("--run needs a directory, and does not go with -f, " +\
+                "--follow, --from, --to, -j, --checkpoint or --engine numpy")
+    if args.run is not None and (args.format != 'text' or\
+            args.output is not None or args.store is not None or\
+            args.rollup is not None):
+        parser.error("--run does not support --format, --output, --store " +\
+                "or --rollup")
+    if args.rollup is not None and args.engine == 'numpy':
+        parser.error("--rollup does not support --engine numpy")
+    if args.rollup == '' and args.f == 'stdin':
+        parser.error("--rollup needs a file name for stdin")
+    host = args.host
+    if host is None and args.f != 'stdin' and\
+            (args.store is not None or args.rollup is not None):
+        host = log_host(args.f)
+    if args.store is not None:
+        if not os.path.isdir(args.store):
+            parser.error("--store needs a directory")
+        if host is None:
+            parser.error("--store needs --host for this log")
+    if args.adaptive and (args.run is not None or window or args.j > 1 or\
+            args.engine == 'numpy'):
+        parser.error("--adaptive does not support --run, --from, --to, " +\
+                "-j or --engine numpy")
+    # The dialect of a regular file is told by its header; a stream
+    # follows its headers as they come.
+    dialect = args.dialect
+    if dialect == 'auto' and args.f != 'stdin' and os.path.isfile(args.f):
+        dialect = sniff_dialect(args.f)
+    if dialect not in ('auto', 'macos') and (window or args.j > 1 or\
+            args.checkpoint is not None or args.engine == 'numpy'):
+        parser.error("a " + dialect + " log does not support --from, " +\
+                "--to, -j, --checkpoint or --engine numpy")
     input_file_name = args.f
     build_version = args.v
 
     print "# analyze_pings.py: build version:" + build_version
     print "# analyze_pings.py: input_file_name: " + input_file_name
+    if dialect != 'auto':
+        print "# analyze_pings.py: dialect: " + dialect
 
-    line_queue = LineQueue(4, input_file_name)
-    # LineQueue returns a comment-structured self identification
-    print line_queue.signature()
-
-    # Initialize the counters
-    classifications = [
-                       "Comment",
-                       "Down",
-                       "GWFailure",
-                       "Initialization",
-                       "NegativeRTT",
-                       "Normal",
-                       "Route",
-                       "RTTTooLong",
-                       "Timeout",
-                       "Timestamp",
-                       "Unexpected"]
-
-    down_classifications = [
-                       "Down",
-                       "GWFailure",
-                       "NegativeRTT",
-                       "Route",
-                       "RTTTooLong",
-                       "Timeout"
-                       ]
-    counters = {}
-    for key in classifications:
-        counters[key] = 0
-
-    linecount = 0
-    
-    line = line_queue.get_line()
-    recent_num = 0
-
-    # variables used for online mean and standard deviation
-    current = {}
-    previous = {}
-    
-    previous['rtt'] = None
-    current['rtt'] = None
-
-    previous['mean'] = 0.0
-    current['mean'] = 0.0
+    # The fixed threshold; --adaptive derives one from the RTTs
+    threshold = 250
+    adaptive = None
+    if args.adaptive:
+        adaptive = AdaptiveThreshold(args.adaptive, args.window, threshold)
+    rollups = None
+    if args.rollup is not None:
+        import Rollup
+        rollup_file_name = args.rollup or input_file_name +\
+                Rollup.ROLLUP_SUFFIX
+        rollups = Rollup.RollupBuilder(rollup_file_name, host)
 
-    previous['variance'] = 0.0
-    current['variance'] = 0.0
+    # A fresh cache from convert_pings.py saves parsing the log again.
+    columns = None
+    if not args.no_cache and not args.follow and not window and\
+            not segmented and args.j == 1 and args.checkpoint is None and\
+            dialect in ('auto', 'macos') and\
+            input_file_name != 'stdin' and os.path.isfile(input_file_name):
+        import PingColumns
+        cache_file_name = input_file_name + PingColumns.CACHE_SUFFIX
+        (columns, status) = PingColumns.load_cache(cache_file_name,\
+                input_file_name, threshold)
+        if status != "none":
+            print "# analyze_pings.py: cache: " + cache_file_name +\
+                    ": " + status
 
-    normal_ping_count = 0
-
-    sequence_number = -1
-    sequence_offset = 0
-
-    # duration and state variables
-    network_state = "None"
-    up_start = -1
-    up_end = -1
-    down_start = -1
-    down_end = -1
-
-    previous['time'] = "unknown"
-    current['time'] = "unknown"
-
-    previous['timestamp'] = None
-    current['timestamp'] = None
-
-    previous['sequence'] = sequence_number
-    current['sequence'] = sequence_number
-
-    current['linenumber'] = linecount
-
-    # reference_linenumber = linecount
-    
-    rtt_stats = None
-    zrtt = None
-
-    explanation = ""
-    while line:
-        linecount += 1
-        # print "linecount: '" + str(linecount)
-        # print "line: '" + line.strip() + "'"
-        # TODO threshold should be dynamically calculated
-        (kind, seq_num) = classify(line_queue, line.strip(), linecount, 250)
-        # print "   kind: " + kind
-        if kind:
-            counters[kind] += 1
-            if kind == "Timestamp":
-                # oops - seq_num is not a number, it's a string!
-                previous['time'] = current['time']
-                previous['timestamp'] = current['timestamp']
-                previous['sequence'] = current['sequence']
-                # 
-                current['time'] = seq_num
-                current['timestamp'] = ts.TimeStamp(current['time'])
-                current['sequence'] = sequence_number
-                current['linenumber'] = linecount
-                #
-                # if previous_time != "unknown":
-                if previous['time'] != "unknown":
-                    delta_t = current['timestamp'].minus_small(\
-                            previous['timestamp'])
-                    delta_r = current['sequence'] - previous['sequence']
-                    print "# time check: delta_r: " + str(delta_r) +\
-                           " delta_t: " + str(delta_t)
-            elif kind == "Initialization":
-                pass
-            elif kind == "Normal":
-                (ip, num, rtt) = \
-                        parse_normal_return(line.strip(), linecount)
-
-                # result is a tuple of strings:
-                #     (ip_address, sequence_number, rtt)
-                # ping sends pings once per second, so sequence_number
-                # is roughly a count of seconds.
-
-                if not zrtt:
-                    rtt_stats = ss.SequenceStats(float(rtt), False)
-                    current['mean'] = float(rtt)
-                zrtt = float(rtt)
-
-                inum = int(num)
-                if inum == 0 and network_state != "None":
-                    # The sequence number only goes to 65535, so we
-                    # will keep track of the rolls
-                    sequence_offset += 65536
-                sequence_number = inum + sequence_offset
-
-                # Handle network state stuff
-                if network_state == "None":
-                    up_start = sequence_number
-                    up_end = sequence_number
-                    # print "Network state initialization: Up"
-                    # print "   sequence_number: " + str(sequence_number)
-                elif network_state == "Down":
-                    down_end = sequence_number - 1
-                    up_start = sequence_number
-                    up_end = sequence_number
-                    #
-                    print "Down: " + str(down_start) +\
-                            " - " + str(down_end) + \
-                            "[ " + str(down_end - down_start - 1) + " ]"
-                    if explanation == "RTTTooLong":
-                        explanation += " RTT: " + str(zrtt)
-                    print "   explanation: " + explanation
-                    if current['time'] != "unknown":
-                        print "   current['time']: " +\
-                            str(current['time'])
-                        print "   plus (~seconds): " +\
-                            str(sequence_number - current['sequence'])
-                    # print "linecount: " + str(linecount)
-                else:
-                    up_end = sequence_number
-                network_state = "Up"
-
-# We use the online algorithm documented in Wikipedia article:
-# https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
-
-                # Use the new stats class to accumulate the data
-                rtt_stats.accumulate(zrtt)
-
-                normal_ping_count += 1
-                if previous['rtt'] > 0.0:
-                    temp = current['mean']
-                    current['mean'] += \
-                        (zrtt - previous['mean']) /\
-                        float(normal_ping_count)
-                    previous['mean'] = temp
-                previous['rtt'] = zrtt
-                # previous_rtt = zrtt
-                # This works because the first time through 
-                # previous_variance is zero
-                # this is the population variance
-                temp = current['variance']
-                current['variance'] = \
-                    ( (normal_ping_count - 1) * previous['variance'] + \
-                      (zrtt - previous['mean']) * \
-                      (zrtt - current['mean'])
-                    ) / normal_ping_count
-                previous['variance'] = temp
-
-            elif kind in down_classifications:
-                # Handle network state stuff
-                explanation = kind
-                if network_state == "None":
-                    down_start = sequence_number
-                    down_end = sequence_number
-                    # print "Network state initialization: Down"
-                    # print "   sequence_number: " + str(sequence_number)
-                elif network_state == "Up":
-                    up_end = sequence_number - 1
-                    down_start = sequence_number
-                    down_end = sequence_number
-                    #
-                    print "Up:   " + str(up_start) +\
-                            " - " + str(up_end) + \
-                            " [ " + str(up_end - up_start - 1) + " ]"
-                    if current['time'] != "unknown":
-                        print "   current['time']: " +\
-                            str(current['time'])
-                        print "   plus (~seconds): " +\
-                            str(sequence_number - current['sequence'])
-                else:
-                    down_end = sequence_number
-                network_state = "Down"
-                # print "kind: " + kind
-            elif kind == "Comment":
-                pass
+    # Regular files are mapped and scanned in place; pipes (and empty
+    # files, which can not be mapped) are read through a LineQueue.
+    if args.run is not None:
+        import RunCorrelator as rc
+        config = ConfigParser.ConfigParser()
+        config.read(os.path.expanduser(args.c))
+        layers = rc.host_layers(config)
+        print "# analyze_pings.py: run: " + args.run
+        state = rc.RunCorrelator()
+        hosts = set()
+        for name in os.listdir(args.run):
+            match = run_log_re.match(name)
+            if match is not None:
+                hosts.add(match.group(1))
+        for host in sorted(hosts):
+            path = os.path.join(args.run, host + RUN_LOG_SUFFIX)
+            if LogSegments.is_segmented(path):
+                line_queue = LineQueue(4, path)
+                records = scan_lines(line_queue, threshold)
+            elif os.path.getsize(path):
+                line_queue = MappedLineQueue(path)
+                records = new_dialect(sniff_dialect(path)).scan_mapped(\
+                        line_queue, threshold)
             else:
-                # Failed to classify:
-                print "Failed to classify:"
-                print "   kind: " + kind
-                print "   linecount: " + str(linecount)
-                print "   line: '" + line.strip() + "'"
-                counters["Unexpected"] += 1
-        line = line_queue.get_line()
+                continue
+            print line_queue.signature()
+            state.add_stream(host, layers.get(host, rc.UPSTREAM), records)
+        state.run()
+    elif window:
+        import PingColumns
+        line_queue = MappedLineQueue(input_file_name)
+        print line_queue.signature()
+        index_file_name = input_file_name + PingColumns.INDEX_SUFFIX
+        (time_index, status) = PingColumns.load_index(index_file_name,\
+                input_file_name, threshold)
+        print "# analyze_pings.py: index: " + index_file_name + ": " + status
+        if time_index is None:
+            # Built from the columnar cache if there is a fresh one
+            (columns, status) = PingColumns.load_cache(input_file_name +\
+                    PingColumns.CACHE_SUFFIX, input_file_name, threshold)
+            if columns is None:
+                columns = PingColumns.parse_columns(line_queue.mm, threshold)
+            time_index = PingColumns.build_index(line_queue.mm, columns)
+            PingColumns.save_index(index_file_name, time_index,\
+                    input_file_name, threshold)
+            print "# analyze_pings.py: index: built, " +\
+                    str(len(time_index['offset'])) + " entries"
+        (entry, start, end) = PingColumns.index_window(time_index,\
+                args.from_time, args.to_time, line_queue.size)
+        print "# analyze_pings.py: window: bytes " + str(start) + " - " +\
+                str(end)
+        state = PingColumns.index_state(time_index, entry, args.sketch,\
+                writer, args.histogram)
+        state.rollups = rollups
+        pool = None
+        if args.j > 1:
+            pool = multiprocessing.Pool(args.j)
+        state.consume(mapped_records(line_queue, start, end,\
+                threshold, pool, args.j, dialect))
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elif columns is not None:
+        line_queue = MappedLineQueue(input_file_name)
+        # LineQueue returns a comment-structured self identification
+        print line_queue.signature()
+        if args.engine == 'numpy':
+            state = PingColumns.analyze_columns(columns, args.sketch,\
+                    writer, args.histogram)
+        else:
+            state = PingState(args.sketch, adaptive, writer, rollups,\
+                    args.histogram)
+            state.consume(PingColumns.column_records(columns))
+    elif args.follow:
+        # Output is flushed whenever the log goes quiet, so that each
+        # transition shows up as soon as it has been decided.
+        def flush_output():
+            """Flush the events and the commentary."""
+            writer.flush()
+            if rollups is not None:
+                rollups.flush()
+            sys.stdout.flush()
+        line_queue = FollowLineQueue(input_file_name, FOLLOW_INTERVAL,\
+                flush_output)
+        print line_queue.signature()
+        state = PingState(args.sketch, adaptive, writer, rollups,\
+                args.histogram)
+        state.consume(scan_lines(line_queue, threshold, dialect))
+    elif args.engine == 'numpy':
+        import PingColumns
+        if input_file_name != 'stdin' and not args.no_mmap and\
+                not segmented and\
+                os.path.isfile(input_file_name) and\
+                os.path.getsize(input_file_name) > 0:
+            line_queue = MappedLineQueue(input_file_name)
+            buf = line_queue.mm
+        else:
+            line_queue = LineQueue(0, input_file_name)
+            buf = line_queue.read_all()
+        print line_queue.signature()
+        state = PingColumns.analyze_columns(\
+                PingColumns.parse_columns(buf, threshold), args.sketch,\
+                writer, args.histogram)
+    elif input_file_name != 'stdin' and not args.no_mmap and\
+            not segmented and os.path.isfile(input_file_name) and\
+            os.path.getsize(input_file_name) > 0:
+        line_queue = MappedLineQueue(input_file_name)
+        # LineQueue returns a comment-structured self identification
+        print line_queue.signature()
+        mm = line_queue.mm
+        state = None
+        start = 0
+        end = line_queue.size
+        resume = end
+        if args.checkpoint is not None:
+            checkpoint_path = args.checkpoint or input_file_name + ".ckpt"
+            settings = {'threshold': threshold, 'sketch': args.sketch}
+            if adaptive is not None:
+                settings['adaptive'] = [args.adaptive, args.window]
+            if args.histogram:
+                settings['histogram'] = args.histogram
+            (start, state, status) = \
+                    load_checkpoint(checkpoint_path, line_queue, settings)
+            print "# analyze_pings.py: checkpoint: " + checkpoint_path +\
+                    ": " + status
+            # The log may still be being written: leave any incomplete
+            # last line for the next run.
+            end = mm.rfind("\n") + 1
+            resume = find_resume_point(mm, start, end)
+        if state is None:
+            state = PingState(args.sketch, adaptive, writer, rollups,\
+                    args.histogram)
+        else:
+            state.writer = writer
+            if rollups is not None:
+                rollups.carry_on(getattr(state, 'rollups', None))
+            state.rollups = rollups
+        pool = None
+        if args.j > 1:
+            pool = multiprocessing.Pool(args.j)
+        state.consume(mapped_records(line_queue, start, resume,\
+                threshold, pool, args.j, dialect))
+        if args.checkpoint is not None:
+            state_pickle = cPickle.dumps(state, 2)
+        state.consume(mapped_records(line_queue, resume, end,\
+                threshold, pool, args.j, dialect))
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if args.checkpoint is not None:
+            save_checkpoint(checkpoint_path, line_queue, resume,\
+                    settings, state_pickle)
+    else:
+        line_queue = LineQueue(4, input_file_name)
+        # LineQueue returns a comment-structured self identification
+        print line_queue.signature()
+        state = PingState(args.sketch, adaptive, writer, rollups,\
+                args.histogram)
+        state.consume(scan_lines(line_queue, threshold, dialect))
+    state.report()
+    linecount = state.linecount
+    if rollups is not None:
+        rollups.finish()
+        print "# analyze_pings.py: rollup: " + rollup_file_name + ": " +\
+                str(rollups.written) + " rollups written"
+    if collector is not None:
+        store_file_name = OutageStore.store_path(args.store, host)
+        (store, status) = OutageStore.load_store(store_file_name, host)
+        (start_us, end_us, explanations) = collector.arrays()
+        store.add(start_us, end_us, explanations)
+        store.save(store_file_name)
+        print "# analyze_pings.py: store: " + store_file_name + ": " +\
+                status + ": " + str(len(start_us)) + " intervals added, " +\
+                str(len(store.start_us)) + " stored"
 
-    print "linecount", linecount
-    for key in classifications:
-        print key + ": " + str(counters[key])
-
-    print "sequence_number: " + str(sequence_number)
-    print "sequence_offset: " + str(sequence_offset)
-    print "normal_ping_count: " + str(normal_ping_count)
-    print "Mean: " + str(current['mean'])
-    print "Mean RTT (two ways): " + str(rtt_stats.get_mean())
-    print "Variance: " + str(current['variance'])
-    print "Variance RTT (two ways): " + str(rtt_stats.get_variance())
-    print "rtt_stats: " + str(rtt_stats)
-
-    checksum = linecount
-    for key in classifications:
-        checksum -= counters[key]
-    print "checksum: " + str(checksum)
-
-    cputime_1 = psutil.cpu_times()
+    cputime_1 = psutil.Process().cpu_times()
     print
     # index 0 is user
-    # index 1 is nice
-    # index 2 is system
-    # index 3 is idle
+    # index 1 is system
+    # index 2 is children's user
+    # index 3 is children's system
 
     ts1 = ts.TimeStamp()
     print "# analyze_pings.py: end: timestamp: " + ts1.get_timestamp()
@@ -419,10 +1172,12 @@ def main():
             str(1e6 * (cputime_1[0] - cputime_0[0]) / linecount) +\
             " uS"
     print "# analyze_pings.py: System time: " +\
-            str(cputime_1[2] - cputime_0[2]) + " S"
+            str(cputime_1[1] - cputime_0[1]) + " S"
     print "# analyze_pings.py: System time per record: " +\
-            str(1e6 * (cputime_1[2] - cputime_0[2]) / linecount) +\
+            str(1e6 * (cputime_1[1] - cputime_0[1]) / linecount) +\
             " uS"
+    if profile is not None:
+        profile.print_report(linecount, breakdown())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,292 @@
+""" benchmark_pings.py
+
+Benchmark the parts of the analyzer on a synthetic log (from
+generate_pings.py), and compare the results with a stored baseline.
+
+Each benchmark runs in a process of its own, so that the peak RSS it
+reports is its own.  Rates are records (lines, values or timestamps)
+per second of elapsed time.  The log is streamed, as analyze_pings.py
+reads it, so the memory does not grow with it; the benchmarks of values
+and timestamps take at most MAX_VALUES of them, however long the log.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] records/sec and peak RSS for LineQueue, classify,
+#                SequenceStats, TimeStamp and analyze_pings, against a
+#                baseline.
+# 2026-10-18 [x] Benchmark the scans analyze_pings.py uses, streaming,
+#                in place of classify() over a log held in the queue.
+#
+
+import argparse
+import datetime as datetime
+import json
+import multiprocessing
+import os
+import psutil
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import analyze_pings as ap
+import generate_pings
+from LineQueue import LineQueue, MappedLineQueue
+import SequenceStats as ss
+import TimeStamp as ts
+
+# Slower than the baseline by more than this fraction is a regression
+TOLERANCE = 0.10
+
+# Values (RTTs, timestamps) for the benchmarks that are not of the log
+MAX_VALUES = 1000000
+
+def peak_rss_mb(usage):
+    """Peak RSS from a getrusage() result, in MB (Linux reports KB,
+    macOS bytes)."""
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss / float(1 << 20)
+    return usage.ru_maxrss / 1024.0
+
+def bench_linequeue(log):
+    """Read every line through a LineQueue."""
+    line_queue = LineQueue(4, log)
+    count = 0
+    start = time.time()
+    line = line_queue.get_line()
+    while line:
+        count += 1
+        line = line_queue.get_line()
+    return (count, time.time() - start)
+
+def bench_scan_lines(log):
+    """scan_lines(), which classify()s every line of a LineQueue, as
+    analyze_pings.py --no-mmap and stdin do."""
+    count = 0
+    start = time.time()
+    for record in ap.scan_lines(LineQueue(4, log), 250):
+        count += 1
+    return (count, time.time() - start)
+
+def bench_scan_mapped(log):
+    """scan_mapped() of the mapped log, as analyze_pings.py -f does."""
+    scan = ap.new_dialect(ap.sniff_dialect(log)).scan_mapped
+    count = 0
+    start = time.time()
+    for record in scan(MappedLineQueue(log), 250):
+        count += 1
+    return (count, time.time() - start)
+
+def rtt_values(count):
+    """count RTTs, the same every time."""
+    rng = random.Random(1)
+    return [20 + rng.expovariate(1 / 5.0) for j in xrange(count)]
+
+def bench_accumulate(count):
+    """SequenceStats.accumulate(), incremental."""
+    values = rtt_values(count)
+    start = time.time()
+    stats = ss.SequenceStats(values[0])
+    accumulate = stats.accumulate
+    for value in values:
+        accumulate(value)
+    return (count, time.time() - start)
+
+def bench_accumulate_history(count):
+    """SequenceStats.accumulate(), keeping the history."""
+    values = rtt_values(count)
+    start = time.time()
+    stats = ss.SequenceStats(values[0], False)
+    accumulate = stats.accumulate
+    for value in values:
+        accumulate(value)
+    stats.get_mean()
+    return (count, time.time() - start)
+
+def timestamp_values(count):
+    """count timestamps a second apart, across midnight."""
+    first = datetime.datetime(2017, 12, 28, 23, 50, 0, 123456)
+    return [(first + datetime.timedelta(seconds=j)).isoformat()\
+            for j in xrange(count)]
+
+def bench_timestamp(count):
+    """Parse timestamps one at a time with TimeStamp."""
+    values = timestamp_values(count)
+    start = time.time()
+    for value in values:
+        ts.TimeStamp(value).get_epoch_us()
+    return (count, time.time() - start)
+
+def bench_parse_many(count):
+    """Parse timestamps all at once with parse_many()."""
+    values = timestamp_values(count)
+    start = time.time()
+    ts.parse_many(values)
+    return (count, time.time() - start)
+
+def bench_analyze(log, *options):
+    """Run analyze_pings.py on the log, as a command."""
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        process = subprocess.Popen([sys.executable, 'analyze_pings.py',\
+                '-f', log] + list(options), stdout=devnull,\
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+        (pid, status, usage) = os.wait4(process.pid, 0)
+    return (sum(1 for line in open(log)), time.time() - start,\
+            peak_rss_mb(usage))
+
+# (name, function, whether it takes the log or a count, more arguments)
+BENCHMARKS = [
+    ('LineQueue', bench_linequeue, 'log', ()),
+    ('scan_lines (classify)', bench_scan_lines, 'log', ()),
+    ('scan_mapped', bench_scan_mapped, 'log', ()),
+    ('SequenceStats.accumulate', bench_accumulate, 'count', ()),
+    ('SequenceStats.accumulate (history)', bench_accumulate_history,\
+            'count', ()),
+    ('TimeStamp', bench_timestamp, 'count', ()),
+    ('TimeStamp.parse_many', bench_parse_many, 'count', ()),
+    ('analyze_pings', bench_analyze, 'log', ('--no-cache',)),
+    ('analyze_pings --no-mmap', bench_analyze, 'log',\
+            ('--no-cache', '--no-mmap')),
+    ('analyze_pings --engine numpy', bench_analyze, 'log',\
+            ('--no-cache', '--engine', 'numpy')),
+    ]
+
+def run_one(task):
+    """Run one benchmark (in a worker process of its own).  task is
+    (index in BENCHMARKS, argument).  Returns (records, seconds, peak RSS
+    MB)."""
+    (index, argument) = task
+    (name, function, takes, options) = BENCHMARKS[index]
+    result = function(argument, *options)
+    if len(result) == 3:
+        return result
+    return result + (peak_rss_mb(resource.getrusage(resource.RUSAGE_SELF)),)
+
+def run_benchmarks(log, count, names=None):
+    """Run the benchmarks (or those named), each in a fresh process.
+    Returns {name: {'records', 'seconds', 'rate', 'rss_mb'}}."""
+    results = {}
+    for (index, (name, function, takes, options)) in enumerate(BENCHMARKS):
+        if names and name not in names:
+            continue
+        argument = log if takes == 'log' else min(count, MAX_VALUES)
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        (records, seconds, rss) = pool.apply(run_one, ((index, argument),))
+        pool.close()
+        pool.join()
+        results[name] = {
+                'records': records,
+                'seconds': seconds,
+                'rate': records / max(seconds, 1e-9),
+                'rss_mb': rss,
+                }
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print the results next to the baseline.  Returns the names of the
+    benchmarks that are slower than it by more than tolerance."""
+    slower = []
+    print "%-36s %12s %9s %9s %s" % ("benchmark", "records/s", "RSS MB",\
+            "baseline", "change")
+    for (name, function, takes, options) in BENCHMARKS:
+        if name not in results:
+            continue
+        result = results[name]
+        line = "%-36s %12.0f %9.1f" % (name, result['rate'],\
+                result['rss_mb'])
+        if name in baseline:
+            change = result['rate'] / baseline[name]['rate'] - 1
+            line += " %9.0f %+6.1f%%" % (baseline[name]['rate'],\
+                    100 * change)
+            if change < -tolerance:
+                line += " SLOWER"
+                slower.append(name)
+        print line
+    return slower
+
+def main():
+    """main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    timestamp = datetime.datetime.isoformat(datetime.datetime.today())
+    print "# benchmark_pings.py"
+    print "# benchmark_pings.py: start: timestamp: " + timestamp
+
+    parser = argparse.ArgumentParser(\
+            description='Benchmark the ping analyzer.')
+    parser.add_argument('-n', type=int, nargs='?', default=200000,\
+            help="lines of synthetic log (int: default 200000)")
+    parser.add_argument('-f', nargs='?', default=None,\
+            help="benchmark this log instead of a synthetic one")
+    parser.add_argument('--dialect', choices=['linux', 'macos'],\
+            default='macos', help="dialect of the synthetic log")
+    parser.add_argument('--only', action='append', default=None,\
+            help="run just this benchmark (may be repeated)")
+    parser.add_argument('--baseline', nargs='?',\
+            default='./benchmark_baseline.json',\
+            help="baseline file (default ./benchmark_baseline.json)")
+    parser.add_argument('--save', action='store_true',\
+            help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, nargs='?',\
+            default=TOLERANCE, help="slowdown that counts as a " +\
+            "regression (float: default 0.10)")
+    parser.add_argument('-D', type=int, nargs='?',\
+            default=0, help="Debug flag (int: default to 0)")
+    args = parser.parse_args()
+
+    log = args.f
+    if log is None:
+        (handle, log) = tempfile.mkstemp(suffix='.ping.log')
+        with os.fdopen(handle, 'w') as out:
+            lines = generate_pings.generate(out, args.n, args.dialect)
+        print "# benchmark_pings.py: synthetic log: " + args.dialect +\
+                ": " + str(lines) + " lines"
+    else:
+        print "# benchmark_pings.py: log: " + log
+
+    results = run_benchmarks(log, args.n, args.only)
+    if args.f is None:
+        os.remove(log)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as source:
+            baseline = json.load(source)['results']
+        print "# benchmark_pings.py: baseline: " + args.baseline
+    elif not args.save:
+        print "# benchmark_pings.py: no baseline at " + args.baseline +\
+                ": --save (make baseline) stores one"
+    slower = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.baseline, 'w') as out:
+            json.dump({'timestamp': timestamp, 'lines': args.n,\
+                    'log': args.f, 'results': results}, out,\
+                    indent=2, separators=(',', ': '), sort_keys=True)
+            out.write("\n")
+        print "# benchmark_pings.py: saved baseline: " + args.baseline
+
+    # capture timing information
+    cputime_1 = psutil.Process().cpu_times()
+
+    timestamp = datetime.datetime.isoformat(datetime.datetime.today())
+    print "# benchmark_pings.py: end: timestamp: " + timestamp
+    print "# benchmark_pings.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# benchmark_pings.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+    if slower:
+        print "# benchmark_pings.py: slower than the baseline: " +\
+                ", ".join(slower)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+""" convert_pings.py
+
+Parse a ping log once and save the result as a binary columnar cache
+(<log>.pcol) next to it.  analyze_pings.py uses the cache in place of
+the text whenever it is fresh, whatever threshold it is run with.
+
+"""
+
+from LineQueue import MappedLineQueue
+
+import analyze_pings as ap
+import argparse
+import os
+import PingColumns
+import psutil
+import TimeStamp as ts
+
+def main():
+    """main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# convert_pings.py"
+    print "# convert_pings.py: start: timestamp: " + ts0.get_timestamp()
+
+    parser = argparse.ArgumentParser(\
+            description='Convert a ping log to a columnar cache.')
+    parser.add_argument('-f', nargs='?', required=True,\
+            help="input file name")
+    parser.add_argument('-o', nargs='?', default=None,\
+            help="cache file name (default: <input>" +\
+            PingColumns.CACHE_SUFFIX + ")")
+    parser.add_argument('-D', type=int, nargs='?',\
+                    default=0, help="Debug flag (int: default to 0)")
+    args = parser.parse_args()
+    input_file_name = args.f
+    cache_file_name = args.o or input_file_name + PingColumns.CACHE_SUFFIX
+
+    print "# convert_pings.py: input_file_name: " + input_file_name
+    print "# convert_pings.py: cache_file_name: " + cache_file_name
+
+    if not os.path.isfile(input_file_name) or\
+            not os.path.getsize(input_file_name):
+        parser.error(input_file_name + " is not a non-empty regular file")
+    # The columnar parser knows macOS ping only
+    dialect = ap.sniff_dialect(input_file_name)
+    if dialect not in ('auto', 'macos'):
+        parser.error(input_file_name + " is a " + dialect + " log; only " +\
+                "macOS logs can be cached")
+
+    line_queue = MappedLineQueue(input_file_name)
+    print line_queue.signature()
+    # The threshold does not matter: the cache holds the RTTs, and
+    # analyze_pings.py classifies them when it loads it.
+    columns = PingColumns.parse_columns(line_queue.mm, 250)
+    PingColumns.save_cache(cache_file_name, columns, input_file_name)
+
+    print "# convert_pings.py: records: " + str(len(columns['kind']))
+    print "# convert_pings.py: log bytes: " +\
+            str(os.path.getsize(input_file_name))
+    print "# convert_pings.py: cache bytes: " +\
+            str(os.path.getsize(cache_file_name))
+
+    # capture timing information
+    cputime_1 = psutil.Process().cpu_times()
+
+    ts1 = ts.TimeStamp()
+    print "# convert_pings.py: end: timestamp: " + ts1.get_timestamp()
+    print "# convert_pings.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# convert_pings.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+""" generate_pings.py
+
+Write a synthetic ping log, for testing and benchmarking without a
+private log.  The same arguments always give the same log.
+
+The log is what ping (in the macOS or the Linux dialect) piped through
+insert_timestamps.py would have written: a reply a second, timestamp
+comments every interval pings, icmp_seq rolling over at 65536, and now
+and then an outage - a stretch of timeouts, 'Network is down', 'No
+route to host' or gateway failures (the 92 byte blocks on macOS) - and
+RTTs that are too long.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] Deterministic generator for both dialects, with every
+#                kind of record the analyzer knows about.
+# 2026-10-18 [x] --epochs: Linux ping -D lines, [epoch] first, in place
+#                of the timestamp comments.
+#
+
+import argparse
+import datetime as datetime
+import psutil
+import random
+import sys
+
+# Kinds of outage, and their relative frequencies
+OUTAGE_KINDS = ['timeout', 'down', 'route', 'gateway']
+OUTAGE_WEIGHTS = [0.6, 0.2, 0.1, 0.1]
+
+# The lines of each dialect.  %(seq)d, %(ip)s, %(rtt)s and so on are
+# filled in as each line is written.
+DIALECTS = {
+    'macos': {
+        'header': "PING %(host)s (%(ip)s): 56 data bytes\n",
+        'reply': "64 bytes from %(ip)s: icmp_seq=%(seq)d ttl=%(ttl)d " +\
+                "time=%(rtt)s ms\n",
+        'timeout': "Request timeout for icmp_seq %(seq)d\n",
+        'down': "ping: sendto: Network is down\n" +\
+                "Request timeout for icmp_seq %(seq)d\n",
+        'route': "ping: sendto: No route to host\n" +\
+                "Request timeout for icmp_seq %(seq)d\n",
+        'gateway': "92 bytes from %(gateway)s: Destination Host " +\
+                "Unreachable\n" +\
+                "Vr HL TOS  Len   ID Flg  off TTL Pro  cks      Src" +\
+                "      Dst\n" +\
+                " 4  5  00 5400 %(id)04x   0 0000  40  01 5b6c " +\
+                "%(source)s  %(ip)s \n\n",
+        'first_seq': 0,
+        },
+    'linux': {
+        'header': "PING %(host)s (%(ip)s) 56(84) bytes of data.\n",
+        'reply': "64 bytes from %(ip)s: icmp_seq=%(seq)d ttl=%(ttl)d " +\
+                "time=%(rtt)s ms\n",
+        'timeout': "no answer yet for icmp_seq=%(seq)d\n",
+        'down': "ping: sendmsg: Network is unreachable\n",
+        'route': "From %(gateway)s icmp_seq=%(seq)d Destination Host " +\
+                "Unreachable\n",
+        'gateway': "From %(gateway)s icmp_seq=%(seq)d Destination Net " +\
+                "Unreachable\n",
+        'first_seq': 1,
+        },
+    }
+
+def format_rtt(rtt, dialect):
+    """An RTT as ping prints it: three decimals on macOS, three
+    significant digits on Linux."""
+    if dialect == 'macos':
+        return "%.3f" % rtt
+    if rtt >= 100:
+        return "%.0f" % rtt
+    if rtt >= 10:
+        return "%.1f" % rtt
+    return "%.2f" % rtt
+
+def generate(out, lines, dialect='macos', seed=1, seq=None,\
+        start=datetime.datetime(2017, 12, 28, 23, 50, 0, 123456),\
+        interval=64, outage_rate=5.0, host='panix.com', ip='166.84.1.3',\
+        epochs=False):
+    """Write about lines lines of log to out (a file).
+
+    seq is the first icmp_seq (default: where the dialect starts), start
+    the time of the first ping, interval the pings between timestamp
+    comments and outage_rate the outages per 10000 pings.  With epochs
+    each line starts with the time as [seconds since the epoch], as
+    Linux ping -D writes it, and there are no timestamp comments.
+    Returns the number of lines written; a multi-line record at the end
+    may take it a little past lines.
+    """
+    formats = DIALECTS[dialect]
+    rng = random.Random(seed)
+    if seq is None:
+        seq = formats['first_seq']
+    fields = {
+            'host': host,
+            'ip': ip,
+            'gateway': '10.0.0.1',
+            'source': '192.168.1.2',
+            'ttl': 246,
+            }
+    timestamp_format = "# timestamp: pid-" + str(rng.randint(1000, 65535)) +\
+            ": %s\n"
+    reply = formats['reply']
+    outage_probability = outage_rate / 10000.0
+    # a typical RTT for this run, and the chance of a long one
+    base_rtt = rng.uniform(10, 40)
+    too_long = 0.002
+    block = [formats['header'] % fields]
+    written = 1
+    outage = None
+    remaining = 0
+    ping = 0
+    first_epoch = (start - datetime.datetime(1970, 1, 1)).total_seconds()
+    while written < lines:
+        if epochs:
+            prefix = "[%.6f] " % (first_epoch + ping)
+        elif not ping % interval:
+            timestamp = start + datetime.timedelta(seconds=ping)
+            block.append(timestamp_format % timestamp.isoformat())
+            written += 1
+        fields['seq'] = seq % 65536
+        if outage is None and rng.random() < outage_probability:
+            outage = weighted_choice(rng, OUTAGE_KINDS, OUTAGE_WEIGHTS)
+            # outages last 20 seconds or so
+            remaining = int(rng.expovariate(1 / 20.0)) + 1
+        if outage is None:
+            if rng.random() < too_long:
+                rtt = rng.uniform(300, 2000)
+            else:
+                rtt = base_rtt + rng.expovariate(1 / 5.0)
+            fields['rtt'] = format_rtt(rtt, dialect)
+            if epochs:
+                block.append(prefix)
+            block.append(reply % fields)
+            written += 1
+        else:
+            fields['id'] = rng.randint(0, 65535)
+            text = formats[outage] % fields
+            if epochs:
+                text = prefix + text.replace("\n", "\n" + prefix, \
+                        text.count("\n") - 1)
+            block.append(text)
+            written += text.count("\n")
+            remaining -= 1
+            if not remaining:
+                outage = None
+        seq += 1
+        ping += 1
+        if len(block) >= 4096:
+            out.write("".join(block))
+            block = []
+    out.write("".join(block))
+    return written
+
+def weighted_choice(rng, choices, weights):
+    """Pick one of choices, with the given weights."""
+    point = rng.random() * sum(weights)
+    for (choice, weight) in zip(choices, weights):
+        point -= weight
+        if point < 0:
+            return choice
+    return choices[-1]
+
+def main():
+    """main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    parser = argparse.ArgumentParser(\
+            description='Write a synthetic ping log.')
+    parser.add_argument('-n', type=int, nargs='?', default=100000,\
+            help="lines to write (int: default 100000)")
+    parser.add_argument('-o', nargs='?', default='stdout',\
+            help="output file name (default stdout)")
+    parser.add_argument('--dialect', choices=sorted(DIALECTS.keys()),\
+            default='macos', help="which ping to imitate (default macos)")
+    parser.add_argument('--seed', type=int, nargs='?', default=1,\
+            help="random seed (int: default 1)")
+    parser.add_argument('--seq', type=int, nargs='?', default=None,\
+            help="first icmp_seq (int: default where ping starts)")
+    parser.add_argument('--interval', type=int, nargs='?', default=64,\
+            help="pings between timestamps (int: default 64)")
+    parser.add_argument('--outages', type=float, nargs='?', default=5.0,\
+            help="outages per 10000 pings (float: default 5)")
+    parser.add_argument('--epochs', action='store_true',\
+            help="start each line with its time, as Linux ping -D does, " +\
+            "instead of writing timestamp comments")
+    parser.add_argument('-D', type=int, nargs='?',\
+            default=0, help="Debug flag (int: default to 0)")
+    args = parser.parse_args()
+    if args.epochs and args.dialect != 'linux':
+        parser.error("--epochs needs --dialect linux")
+
+    # The log may be going to stdout, so the commentary goes to stderr
+    if args.o == 'stdout':
+        out = sys.stdout
+        notes = sys.stderr
+    else:
+        out = open(args.o, 'w', 1 << 20)
+        notes = sys.stdout
+
+    timestamp = datetime.datetime.isoformat(datetime.datetime.today())
+    notes.write("# generate_pings.py\n")
+    notes.write("# generate_pings.py: start: timestamp: " + timestamp + "\n")
+
+    written = generate(out, args.n, args.dialect, args.seed, args.seq,\
+            interval=args.interval, outage_rate=args.outages,\
+            epochs=args.epochs)
+    out.flush()
+
+    # capture timing information
+    cputime_1 = psutil.Process().cpu_times()
+
+    timestamp = datetime.datetime.isoformat(datetime.datetime.today())
+    notes.write("# generate_pings.py: " + args.dialect + ": lines: " +\
+            str(written) + "\n")
+    notes.write("# generate_pings.py: end: timestamp: " + timestamp + "\n")
+    notes.write("# generate_pings.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S\n")
+    notes.write("# generate_pings.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S\n")
+
+if __name__ == '__main__':
+    main()
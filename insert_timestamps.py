@@ -5,18 +5,37 @@ enhance our analysis.
 
 """
 
+#
+# Roadmap
+#
+# 2026-10-18 [x] Stop at the end of the input, write in batches, and -i
+#                to timestamp every so many seconds instead of records.
+#
+
 import argparse
 import datetime as datetime
 import ConfigParser
 import os
 import psutil
+import select
 import sys
+import time
+
+# Longest that output is held before it is written (seconds)
+FLUSH_LATENCY = 0.25
+
+def monotonic():
+    """Seconds from a clock that is not moved when the time is set."""
+    if hasattr(time, 'monotonic'):
+        return time.monotonic()
+    # elapsed real time, from times(2)
+    return os.times()[4]
 
 def main():
     """main body."""
 
     # capture timing information
-    cputime_0 = psutil.cpu_times()
+    cputime_0 = psutil.Process().cpu_times()
 
     # Self-identification for the run
     # This gives us YYYY-MM-DDTHH:MM:SS+HH:MM
@@ -35,6 +54,8 @@ def main():
             help="do not insert tags at all")
     parser.add_argument('-s', nargs='?',\
             default=64, help="records to skip between timestamps")
+    parser.add_argument('-i', type=float, nargs='?',\
+            default=None, help="seconds between timestamps (instead of -s)")
     parser.add_argument('-t', nargs='?',\
             default=stream_tag, help="tag this stream")
     parser.add_argument('-D', type=int, nargs='?',\
@@ -61,31 +82,75 @@ def main():
         except ConfigParser.NoOptionError:
             timer_interval = 10
 
-    print "# insert_timestamps.py: timer_interval: " + str(timer_interval)
-    
+    timer_seconds = args.i
+    if timer_seconds is None and config.has_option('pinger', 'timer_seconds'):
+        timer_seconds = config.getfloat('pinger', 'timer_seconds')
+
+    if timer_seconds:
+        print "# insert_timestamps.py: timer_seconds: " + str(timer_seconds)
+    else:
+        print "# insert_timestamps.py: timer_interval: " + str(timer_interval)
+    sys.stdout.flush()
+
     # now we stream STDIN to STDOUT, inserting a timestamp comment
-    # every timer_interval rows
+    # every timer_interval rows, or before the first row after each
+    # timer_seconds.  Output is written in batches: when a timestamp
+    # goes in, or once it has waited FLUSH_LATENCY.
 
+    if args.notag:
+        prefix = "# timestamp: "
+    else:
+        prefix = "# timestamp: " + stream_tag + ": "
+    stdin = sys.stdin.fileno()
+    partial = ""
+    pending = []
+    last_flush = monotonic()
+    last_stamp = None
     linenumber = 0
     try:
         while True:
-            if not linenumber % timer_interval:
-                timestamp = datetime.datetime.isoformat(\
-                    datetime.datetime.today())
-                if args.notag:
-                    print "# timestamp: " + str(timestamp)
-                else:
-                    print "# timestamp: " + stream_tag + ": " +\
-                            str(timestamp)
-            print sys.stdin.readline().strip()
-            sys.stdout.flush()
-            linenumber += 1
+            timeout = None
+            if pending:
+                timeout = max(0, last_flush + FLUSH_LATENCY - monotonic())
+            stamped = False
+            if select.select([stdin], [], [], timeout)[0]:
+                data = os.read(stdin, 65536)
+                if not data:
+                    break
+                lines = (partial + data).split("\n")
+                partial = lines.pop()
+                for line in lines:
+                    if timer_seconds:
+                        now = monotonic()
+                        due = last_stamp is None or\
+                                now - last_stamp >= timer_seconds
+                    else:
+                        due = not linenumber % timer_interval
+                    if due:
+                        timestamp = datetime.datetime.isoformat(\
+                            datetime.datetime.today())
+                        pending.append(prefix + str(timestamp))
+                        last_stamp = monotonic()
+                        stamped = True
+                    pending.append(line.strip())
+                    linenumber += 1
+            now = monotonic()
+            if pending and (stamped or now - last_flush >= FLUSH_LATENCY):
+                sys.stdout.write("\n".join(pending) + "\n")
+                sys.stdout.flush()
+                pending = []
+                last_flush = now
     except KeyboardInterrupt:
-        sys.stdout.flush()
         pass
+    if partial.strip():
+        pending.append(partial.strip())
+        linenumber += 1
+    if pending:
+        sys.stdout.write("\n".join(pending) + "\n")
+    sys.stdout.flush()
 
     # capture timing information
-    cputime_1 = psutil.cpu_times()
+    cputime_1 = psutil.Process().cpu_times()
 
     # wrapping up - display timing data
     timestamp = datetime.datetime.isoformat(\
@@ -94,7 +159,7 @@ def main():
     print "# insert_timestamps.py: User time: " +\
                     str(cputime_1[0] - cputime_0[0]) + " S"
     print "# insert_timestamps.py: System time: " +\
-            str(cputime_1[2] - cputime_0[2]) + " S"
+            str(cputime_1[1] - cputime_0[1]) + " S"
     print "# linenumber: " + str(linenumber)
 
 if __name__ == '__main__':
@@ -12,17 +12,25 @@ import os
 import psutil
 import sys
 
+import LogSegments
+from PingRunner import PingRunner
+
 #
 # Roadmap
 # 
 # 2017-12-25 [ ] Add a headless option (-H) that bypasses the tee
+# 2026-10-18 [x] -r runs the pings from this process (PingRunner), with
+#                the timestamps inserted in-process, rather than printing
+#                a ping | insert_timestamps.py | tee pipeline per host.
+# 2026-10-18 [x] rotate_bytes / rotate_hourly: with -r, rotate the logs
+#                into segments compressed with gzip (or zstd).
 # 
 
 def main():
     """main body."""
 
     # capture timing information
-    cputime_0 = psutil.cpu_times()
+    cputime_0 = psutil.Process().cpu_times()
 
     # Self-identification for the run
     # This gives us YYYY-MM-DDTHH:MM:SS+HH:MM
@@ -35,6 +43,8 @@ def main():
             description='Run pings from a configuration file.')
     parser.add_argument('-c', nargs='?',\
             default='./pinger.cfg', help="configuration file name")
+    parser.add_argument('-r', '--run', action='store_true',\
+            help="run the pings and write the logs from this process")
     parser.add_argument('-D', type=int, nargs='?',\
                     default=0, help="Debug flag (int: default to 0)")
     args = parser.parse_args()
@@ -72,15 +82,29 @@ def main():
 
     destination_directory = os.path.expanduser(destination_directory)
 
-    # timer_interval us used by the insert_timestamps.py program
-    #
-    # try:
-    #     timer_interval = config.getint('pinger', 'timer_interval')
-    # except ConfigParser.NoOptionError:
-    #     timer_interval = 100 
+    # rotation of the logs into compressed segments, with -r
+    try:
+        rotate_bytes = config.getint('pinger', 'rotate_bytes')
+    except ConfigParser.NoOptionError:
+        rotate_bytes = 0
+    try:
+        rotate_hourly = config.getboolean('pinger', 'rotate_hourly')
+    except ConfigParser.NoOptionError:
+        rotate_hourly = False
+    try:
+        compress = config.get('pinger', 'compress')
+    except ConfigParser.NoOptionError:
+        compress = 'gzip'
+
+    # timer_interval is used by the insert_timestamps.py program, or by
+    # PingRunner with -r
+    try:
+        timer_interval = config.getint('pinger', 'timer_interval')
+    except ConfigParser.NoOptionError:
+        timer_interval = 64
 
     print "# pinger.py: host_list: " + str(host_list)
-    # print "# pinger.py: timer_interval: " + str(timer_interval)
+    print "# pinger.py: timer_interval: " + str(timer_interval)
 
     destination_directory += "/" + timestamp
     try:
@@ -90,6 +114,22 @@ def main():
         print "ABORT: mkdir(" + destination_directory + ")"
         exit
 
+    if args.run:
+        runner = PingRunner(host_list, ping_command, destination_directory,\
+                timer_interval, max_bytes=rotate_bytes,\
+                hourly=rotate_hourly, compressor=compress)
+        if rotate_bytes or rotate_hourly:
+            print "# pinger.py: rotate: bytes: " + str(rotate_bytes) +\
+                    " hourly: " + str(rotate_hourly) + " compress: " +\
+                    str(LogSegments.available_compressor(compress))
+        runner.start()
+        print "# pinger.py: logging to: " + destination_directory +\
+                " (Ctrl-C to stop)"
+        runner.run()
+        for host in host_list:
+            print "# pinger.py: " + host + ": lines: " +\
+                    str(runner.lines[host])
+
     final_command = ""
 
     for host in host_list:
@@ -116,12 +156,13 @@ def main():
         cmd = " | ".join(command)
         final_command += cmd + " & "
 
-    print "====="
-    print final_command
-    print "====="
+    if not args.run:
+        print "====="
+        print final_command
+        print "====="
 
     # capture timing information
-    cputime_1 = psutil.cpu_times()
+    cputime_1 = psutil.Process().cpu_times()
 
     # wrapping up - display timing data
     timestamp = datetime.datetime.isoformat(\
@@ -130,7 +171,7 @@ def main():
     print "# pinger.py: User time: " +\
                     str(cputime_1[0] - cputime_0[0]) + " S"
     print "# pinger.py: System time: " +\
-            str(cputime_1[2] - cputime_0[2]) + " S"
+            str(cputime_1[1] - cputime_0[1]) + " S"
 
 if __name__ == '__main__':
     main()
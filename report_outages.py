@@ -0,0 +1,128 @@
+""" report_outages.py
+
+Report on the outage stores that analyze_pings.py --store keeps: the
+downtime per hour, day or month, the longest outages, MTBF and MTTR
+and a histogram of outage durations, for each host, without reading
+any raw log.
+
+"""
+
+#
+# Roadmap
+#
+# 2026-10-18 [x] SLA reports from the outage stores (OutageStore.py).
+#
+
+import argparse
+import numpy as np
+import os
+import psutil
+
+import analyze_pings as ap
+import OutageStore
+import TimeStamp as ts
+
+def seconds(us):
+    """Microseconds as a string of seconds."""
+    return "%.0f S" % (us / 1e6)
+
+def report(store, args):
+    """Print the report for one store."""
+    (start_us, end_us) = store.span(args.from_time, args.to_time)
+    print "Host: " + store.host + ": " + str(len(store.start_us)) +\
+            " intervals, " + str(len(store.down_start)) + " outages"
+    if not len(store.start_us):
+        return
+    print "   from " + ts.format_epoch_us(start_us) + " to " +\
+            ts.format_epoch_us(end_us)
+
+    print "Downtime by " + args.by + ":"
+    (starts, downtime) = store.downtime_by(args.by, start_us, end_us)
+    width = {'hour': 13, 'day': 10, 'month': 7}[args.by]
+    for (start, down) in zip(starts.tolist(), downtime.tolist()):
+        print "   " + ts.format_epoch_us(start)[:width] + ": " + seconds(down)
+    total = store.downtime(start_us, end_us)
+    print "Downtime: " + seconds(total) + " availability: " +\
+            "%.4f%%" % (100.0 - 100.0 * total / max(end_us - start_us, 1))
+    (mtbf, mttr) = store.mtbf_mttr(start_us, end_us)
+    if mtbf is not None:
+        print "MTBF: " + seconds(mtbf) + " MTTR: " + seconds(mttr)
+
+    if args.from_time is not None or args.to_time is not None:
+        print "Outages:"
+        for (start, end, explanation) in store.overlapping(start_us, end_us):
+            print "   " + ts.format_epoch_us(start) + " " +\
+                    seconds(end - start) + " " + explanation
+    print "Longest outages:"
+    for (start, end, explanation) in store.longest(args.longest):
+        print "   " + ts.format_epoch_us(start) + " " +\
+                seconds(end - start) + " " + explanation
+    print "Outage durations:"
+    edges = [float(edge) for edge in args.histogram.split(",")]
+    counts = store.histogram(np.array(edges + [float('inf')]) * 1e6)
+    for (low, high, count) in zip(edges, edges[1:] + [None], counts):
+        if high is None:
+            print "   %6g S and up: %d" % (low, count)
+        else:
+            print "   %6g - %g S: %d" % (low, high, count)
+
+def main():
+    """main body."""
+
+    # capture timing information
+    cputime_0 = psutil.Process().cpu_times()
+
+    ts0 = ts.TimeStamp()
+    print "# report_outages.py"
+    print "# report_outages.py: start: timestamp: " + ts0.get_timestamp()
+
+    parser = argparse.ArgumentParser(\
+            description='Report on the outage stores.')
+    parser.add_argument('--store', nargs='?', default='.',\
+            help="the directory of the stores (default .)")
+    parser.add_argument('--host', action='append', default=None,\
+            help="report on this host (may be repeated; default all)")
+    parser.add_argument('--from', dest='from_time',\
+            type=ap.parse_window_time, default=None,\
+            help="report from this time on (YYYY-MM-DDThh:mm[:ss])")
+    parser.add_argument('--to', dest='to_time',\
+            type=ap.parse_window_time, default=None,\
+            help="report up to this time")
+    parser.add_argument('--by', choices=OutageStore.PERIODS, default='day',\
+            help="downtime per hour, day or month (default day)")
+    parser.add_argument('--longest', type=int, nargs='?', default=10,\
+            help="how many of the longest outages to list " +\
+            "(int: default 10)")
+    parser.add_argument('--histogram', nargs='?', default='0,10,60,300,3600',\
+            help="edges of the outage duration bins, in seconds " +\
+            "(default 0,10,60,300,3600)")
+    parser.add_argument('-D', type=int, nargs='?',\
+            default=0, help="Debug flag (int: default to 0)")
+    args = parser.parse_args()
+    if not os.path.isdir(args.store):
+        parser.error("--store needs a directory")
+
+    hosts = args.host
+    if hosts is None:
+        hosts = sorted(name[:-len(OutageStore.STORE_SUFFIX)] for name in\
+                os.listdir(args.store) if\
+                name.endswith(OutageStore.STORE_SUFFIX))
+    for host in hosts:
+        path = OutageStore.store_path(args.store, host)
+        (store, status) = OutageStore.load_store(path, host)
+        print "# report_outages.py: store: " + path + ": " + status
+        report(store, args)
+
+    # capture timing information
+    cputime_1 = psutil.Process().cpu_times()
+
+    print
+    ts1 = ts.TimeStamp()
+    print "# report_outages.py: end: timestamp: " + ts1.get_timestamp()
+    print "# report_outages.py: User time: " +\
+            str(cputime_1[0] - cputime_0[0]) + " S"
+    print "# report_outages.py: System time: " +\
+            str(cputime_1[1] - cputime_0[1]) + " S"
+
+if __name__ == '__main__':
+    main()